@@ -0,0 +1,110 @@
+# file: bans.py
+# IP bans by address, CIDR range or dotted prefix, with a lookup cheap enough to run on every accepted socket.
+# Changes are written back in the background: batched, and swapped in atomically.
+
+import asyncio
+import ipaddress
+import json
+import os
+import socket
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+SAVE_DELAY = 1.0
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+def parse_entry(entry: str) -> Network:
+    """"203.0.113.7", "203.0.113.0/24", "2001:db8::/32" or a dotted prefix such as "203.0.113." or "10."."""
+    entry = entry.strip()
+    if entry.endswith(".") and "/" not in entry:
+        octets = entry.rstrip(".").split(".")
+        if not 1 <= len(octets) <= 3: raise ValueError(f"'{entry}' is not an IPv4 prefix")
+        entry = ".".join(octets + ["0"] * (4 - len(octets))) + f"/{8 * len(octets)}"
+    return ipaddress.ip_network(entry, strict=False)
+
+def entry_key(network: Network) -> str:
+    """Single addresses are stored as plain addresses, ranges in CIDR notation."""
+    return str(network.network_address) if network.prefixlen == network.max_prefixlen else str(network)
+
+class BanList:
+    """`entries` maps each ban, as written in the file, to its reason. Lookups check one dict per distinct prefix
+    length in use, longest first, so the cost does not grow with the number of bans. Entries that cannot be
+    parsed are kept in the file but never match."""
+    def __init__(self, path: str, entries: Optional[Dict[str, str]] = None, on_error: Callable[[str], Any] = print, save_delay: float = SAVE_DELAY):
+        self.path = path; self.on_error = on_error; self.save_delay = save_delay
+        self.entries: Dict[str, str] = {}
+        # (version, prefix length) -> {network bits: entry key}; _lengths keeps the keys longest prefix first.
+        self._index: Dict[Tuple[int, int], Dict[int, str]] = {}; self._lengths: List[Tuple[int, int]] = []
+        self._dirty = False; self._save_task: Optional[asyncio.Task] = None
+        self._write_lock = threading.Lock(); self._version = 0; self._written_version = 0
+        for entry, reason in (entries or {}).items():
+            try: self._insert(parse_entry(entry), str(reason))
+            except ValueError: self.entries[entry] = str(reason); on_error(f"Ignoring unparseable ban entry '{entry}'.")
+
+    def __len__(self) -> int: return len(self.entries)
+
+    def _insert(self, network: Network, reason: str) -> str:
+        key = entry_key(network); self.entries[key] = reason
+        slot = (network.version, network.prefixlen)
+        if slot not in self._index:
+            self._index[slot] = {}; self._lengths = sorted(self._index, key=lambda s: -s[1])
+        self._index[slot][int(network.network_address) >> (network.max_prefixlen - network.prefixlen)] = key
+        return key
+
+    def add(self, entry: str, reason: str) -> str:
+        """Bans an address or range; returns the entry as stored. Raises ValueError for anything else."""
+        key = self._insert(parse_entry(entry), reason); self._schedule_save(); return key
+
+    def remove(self, entry: str) -> bool:
+        try: network = parse_entry(entry); key = entry_key(network)
+        except ValueError: network, key = None, entry
+        if key not in self.entries: return False
+        del self.entries[key]
+        if network is not None:
+            slot = (network.version, network.prefixlen); table = self._index.get(slot, {})
+            table.pop(int(network.network_address) >> (network.max_prefixlen - network.prefixlen), None)
+            if not table: self._index.pop(slot, None); self._lengths = sorted(self._index, key=lambda s: -s[1])
+        self._schedule_save(); return True
+
+    def lookup(self, address: str) -> Optional[str]:
+        """The reason `address` is banned, or None."""
+        if not self._lengths: return None
+        # inet_pton is several times cheaper than ipaddress.ip_address here.
+        try: version, bits, value = 4, 32, int.from_bytes(socket.inet_pton(socket.AF_INET, address), 'big')
+        except OSError:
+            try: version, bits, value = 6, 128, int.from_bytes(socket.inet_pton(socket.AF_INET6, address.split("%", 1)[0]), 'big')
+            except OSError: return None
+            if value >> 32 == 0xFFFF: version, bits, value = 4, 32, value & 0xFFFFFFFF  # IPv4-mapped
+        for slot_version, length in self._lengths:
+            if slot_version != version: continue
+            key = self._index[(version, length)].get(value >> (bits - length))
+            if key is not None: return self.entries[key]
+        return None
+
+    def _schedule_save(self):
+        self._dirty = True; self._version += 1
+        try: asyncio.get_running_loop()
+        except RuntimeError: self._dirty = False; self._write(self._version, dict(self.entries)); return  # no loop (startup, plugin thread): write now
+        if self._save_task is None or self._save_task.done(): self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self):
+        # Everything changed within save_delay goes out in one write.
+        await asyncio.sleep(self.save_delay)
+        while self._dirty:
+            self._dirty = False; await asyncio.to_thread(self._write, self._version, dict(self.entries))
+
+    async def flush(self):
+        """Writes pending changes now; for shutdown."""
+        if self._save_task is not None and not self._save_task.done(): self._save_task.cancel()
+        if self._dirty: self._dirty = False; await asyncio.to_thread(self._write, self._version, dict(self.entries))
+
+    def _write(self, version: int, entries: Dict[str, str]):
+        temp_path = f"{self.path}.tmp"
+        # Writes can overlap (a shutdown flush during a background save); an older copy never replaces a newer one.
+        with self._write_lock:
+            if version <= self._written_version: return
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f: json.dump(entries, f, indent=4); f.flush(); os.fsync(f.fileno())
+                os.replace(temp_path, self.path); self._written_version = version
+            except OSError as e: self.on_error(f"Could not save to {self.path}: {e}")
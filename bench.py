@@ -0,0 +1,255 @@
+# file: bench.py
+# Micro-benchmarks for the hot paths of index.py. Run: python bench.py [name ...]
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import chatfilter
+import codec
+import events
+import framing
+import index
+import wire
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], None]] = {}
+
+def benchmark(name: str):
+    def register(func): BENCHMARKS[name] = func; return func
+    return register
+
+class FakeWriter:
+    """Stands in for asyncio.StreamWriter; counts bytes instead of touching a socket."""
+    def __init__(self): self.bytes_written = 0; self.frames = 0
+    def write(self, data): self.bytes_written += len(data); self.frames += 1
+    async def drain(self): pass
+    def is_closing(self) -> bool: return False
+    def close(self): pass
+    async def wait_closed(self): pass
+    def get_extra_info(self, name, default=None): return ("127.0.0.1", 0) if name == "peername" else default
+
+def make_server(player_count: int, seed: int = 1) -> index.Server:
+    # Keep the benchmark from creating banned_ips.json next to the server.
+    index.BANNED_IPS_FILE = os.path.join(tempfile.mkdtemp(prefix="tfsmp-bench-"), "banned_ips.json")
+    server = index.Server({"hostAddress": "127.0.0.1", "hostPort": 0, "updateInterval": 0.05})
+    rng = random.Random(seed); plane_types = [p for p in server.state.PlaneTypes if p != "None"]
+    for i in range(player_count):
+        username = f"bench_{i:04d}"; plane_type = rng.choice(plane_types)
+        server.state.add_player(username, FakeWriter(), index.APIPlayer(username, None, server), ("127.0.0.1", 40000 + i), plane_type)
+        position = f"{rng.uniform(-5e4, 5e4):.2f},{rng.uniform(0, 1e4):.2f},{rng.uniform(-5e4, 5e4):.2f}"
+        rotation = f"{rng.uniform(-180, 180):.2f},{rng.uniform(-180, 180):.2f},{rng.uniform(-180, 180):.2f}"
+        server.state.update_player_position(username, {"PositionService": {"Position": position, "PlaneType": plane_type, "Rotation": rotation, "State": {"GearDown": False}}})
+    return server
+
+def world_block(server: index.Server) -> dict:
+    return {
+        "PlayerService": {"Players": server.state.get_all_player_names()},
+        "PositionService": {"Positions": server.state.player_positions, "TimestampFormatted": time.strftime("%H:%M:%S"), "TimestampEpoch": time.mktime(time.localtime()), "CurrentServerTime": time.perf_counter()},
+        "ChatService": {"Chat": server.state.get_chat_string()}
+    }
+
+def attach_send_queues(server: index.Server):
+    # Send queues start their writer task lazily, so they must be created inside the running loop.
+    for username, player_data in server.state.players.items():
+        player_data["sender"] = index.SendQueue(player_data["writer"], lambda reason: None, server.send_backlog_deadline)
+
+def ticks_per_second(run_tick, duration: float, server: index.Server = None) -> float:
+    async def runner():
+        if server is not None: attach_send_queues(server)
+        ticks, start = 0, time.perf_counter()
+        while time.perf_counter() - start < duration: await run_tick(); await asyncio.sleep(0); ticks += 1
+        return ticks / (time.perf_counter() - start)
+    return asyncio.run(runner())
+
+@benchmark("broadcast")
+def bench_broadcast(args: argparse.Namespace):
+    """Ticks/s for the world-state broadcast: one json.dumps and drain per player vs. the encode-once queued tick."""
+    print(f"{'players':>8} {'per-player':>12} {'encode-once':>12} {'speedup':>8}")
+    for count in args.players:
+        server = make_server(count)
+        async def send_per_player(writer: FakeWriter, block: dict):
+            writer.write(index.json.dumps(block).encode('utf-8') + index.PACKET_TERMINATOR); await writer.drain()
+        async def per_player_tick():
+            block = world_block(server)
+            await asyncio.gather(*[send_per_player(p["writer"], block) for p in server.state.players.values()])
+        async def encode_once_tick(): server._broadcast_world_state()
+        before, after = ticks_per_second(per_player_tick, args.duration), ticks_per_second(encode_once_tick, args.duration, server)
+        print(f"{count:>8} {before:>10.1f}/s {after:>10.1f}/s {after / before:>7.1f}x")
+
+def rate(func, duration: float) -> float:
+    calls, start = 0, time.perf_counter()
+    while time.perf_counter() - start < duration: func(); calls += 1
+    return calls / (time.perf_counter() - start)
+
+def assert_round_trip(sent: list, received: list):
+    """Vectors survive within float32 precision; everything else exactly."""
+    for index_, (a, b) in enumerate(zip(sent, received)):
+        if isinstance(a, str) and a.count(",") == 2 and index_ != 3:
+            assert all(abs(x - y) <= 1e-3 * max(1.0, abs(x)) for x, y in zip(wire.parse_vector3(a), wire.parse_vector3(b))), (a, b)
+        elif isinstance(a, float): assert abs(a - b) < 1e-9, (a, b)
+        else: assert a == b, (a, b)
+
+@benchmark("wire")
+def bench_wire(args: argparse.Namespace):
+    """Snapshot and position packet size/throughput for the JSON and binary protocols, with round-trip checks."""
+    print(f"{'players':>8} {'json bytes':>11} {'bin bytes':>10} {'json enc':>10} {'bin enc':>10} {'bin cached':>10} {'json dec':>10} {'bin dec':>10}")
+    for count in args.players:
+        server = make_server(count); plane_types = server.state.PlaneTypes; players = server.state.get_all_player_names()
+        positions = server.state.player_positions; encoder = wire.SnapshotEncoder(plane_types, server.state.player_table)
+        json_frame = index.Server.encode_frame({"PlayerService": {"Players": players}, "PositionService": {"Positions": positions}})
+        binary_frame = encoder.encode(players, positions)
+        decoded = wire.decode_snapshot(memoryview(binary_frame)[5:], plane_types)
+        assert decoded["PlayerService"]["Players"] == players
+        for username, entry in positions.items(): assert_round_trip(entry, decoded["PositionService"]["Positions"][username])
+        assert index.json.loads(json_frame[:-1])["PositionService"]["Positions"] == index.json.loads(index.json.dumps(positions))
+        json_enc = rate(lambda: index.Server.encode_frame({"PlayerService": {"Players": players}, "PositionService": {"Positions": positions}}), args.duration / 4)
+        # A tick where every player moved but kept their State: each receive time changes, so every record is repacked.
+        moving = wire.SnapshotEncoder(plane_types, server.state.player_table); moving.encode(players, positions)
+        def move_all():
+            for entry in positions.values(): entry[-1] = -entry[-1]
+            return moving.encode(players, positions)
+        bin_enc = rate(move_all, args.duration / 4)
+        # Shared encoder: a tick where nobody sent a new position since the last one.
+        bin_cached = rate(lambda: encoder.encode(players, positions), args.duration / 4)
+        json_dec = rate(lambda: index.json.loads(json_frame[:-1]), args.duration / 4)
+        bin_dec = rate(lambda: wire.decode_snapshot(memoryview(binary_frame)[5:], plane_types), args.duration / 4)
+        print(f"{count:>8} {len(json_frame):>11} {len(binary_frame):>10} {json_enc:>8.0f}/s {bin_enc:>8.0f}/s {bin_cached:>8.0f}/s {json_dec:>8.0f}/s {bin_dec:>8.0f}/s")
+    print("tradeoff: binary frames are ~3x smaller, but a moved player's record is packed in Python while JSON is encoded in C, so a\n"
+          "tick where everyone moved costs ~3-4x the CPU of JSON ('bin enc'). The record is packed once per move and reused by every\n"
+          "frame until the next one ('bin cached'), whereas JSON re-encodes it per frame. 'bin dec' produces the same strings as JSON\n"
+          "and most of it is formatting the floats.")
+    block = {"Position": "123.4,2000,-55.1", "Rotation": "1.5,-90,0", "PlaneType": "C-400", "State": server.state.get_default_state()}
+    json_packet = index.json.dumps({"PositionService": block}).encode('utf-8') + index.PACKET_TERMINATOR
+    binary_packet = wire.encode_position(block, plane_types)
+    decoded = wire.decode_client_message(memoryview(binary_packet)[4:], plane_types)["PositionService"]
+    assert_round_trip([block["Position"], block["PlaneType"], block["Rotation"], block["State"]], [decoded["Position"], decoded["PlaneType"], decoded["Rotation"], decoded["State"]])
+    json_in = rate(lambda: server.state.update_player_position("bench_0000", index.json.loads(json_packet[:-1])), args.duration / 4)
+    bin_in = rate(lambda: server.state.update_player_position("bench_0000", wire.decode_client_message(memoryview(binary_packet)[4:], plane_types)), args.duration / 4)
+    print(f"position packet: json {len(json_packet)} B, {json_in:.0f}/s decoded+applied; binary {len(binary_packet)} B, {bin_in:.0f}/s decoded+applied")
+
+@benchmark("chatfilter")
+def bench_chatfilter(args: argparse.Namespace):
+    """Messages/s for the old per-word `in` scan vs. the compiled automaton, with a 10k-word list."""
+    rng = random.Random(7); letters = "abcdefghijklmnopqrstuvwxyzăâđêôơư"
+    words = {"".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(10000)}
+    path = os.path.join(tempfile.mkdtemp(prefix="tfsmp-bench-"), "chatfilter.txt")
+    with open(path, "w", encoding="utf-8") as f: f.write("\n".join(sorted(words)) + "\n")
+    vocabulary = ["xin", "chào", "mọi", "người", "bay", "đi", "đâu", "hạ", "cánh", "sân", "bay", "nào", "ok", "lên", "đường"]
+    messages = [" ".join(rng.choice(vocabulary) for _ in range(rng.randint(5, 25)))[:150] for _ in range(200)]
+    start = time.perf_counter(); chat_filter = chatfilter.ChatFilter(path, whole_word=False); chat_filter.load()
+    build = time.perf_counter() - start
+    lowered = chat_filter.words
+    def naive(message: str):
+        message_lower = message.lower()
+        return any(word in message_lower for word in lowered)
+    for message in messages: assert bool(chat_filter.find(message)) == naive(message), message
+    before = rate(lambda: [naive(m) for m in messages], args.duration) * len(messages)
+    after = rate(lambda: [chat_filter.filter(m) for m in messages], args.duration) * len(messages)
+    chat_filter.configure(whole_word=True, fold=True, mask=True)
+    folded = rate(lambda: [chat_filter.filter(m) for m in messages], args.duration) * len(messages)
+    print(f"{len(words)} words, automaton built in {build * 1000:.0f} ms")
+    print(f"per-word scan: {before:.0f} msg/s; automaton: {after:.0f} msg/s ({after / before:.1f}x); whole-word+fold+mask: {folded:.0f} msg/s")
+
+@benchmark("codec")
+def bench_codec(args: argparse.Namespace):
+    """Per-backend cost of the hot JSON paths: decode+validate+apply one position packet, encode one world frame."""
+    selected = codec.BACKEND
+    print(f"{'codec':>8} {'players':>8} {'packet in':>12} {'world frame':>12} {'frame bytes':>12}")
+    try:
+        for name in codec.AVAILABLE:
+            for count in args.players:
+                server = make_server(count); state = server.state; names = state.get_all_player_names()
+                codec.use(name)  # after make_server: Server() applies its own jsonCodec setting
+                packet = codec.dumps({"PositionService": {"Position": "123.4,2000,-55.1", "Rotation": "1.5,-90,0", "PlaneType": "C-400", "State": {"GearDown": False}}})
+                blocks = {"PlayerService": {"Players": names}, "PositionService": {"Positions": state.player_positions}, "ChatService": {"Chat": state.get_chat_string()}}
+                frame, _ = index.Server.encode_services(blocks); assert frame == index.Server.encode_frame(blocks)
+                inbound = rate(lambda: state.update_player_position("bench_0000", codec.loads(memoryview(packet))), args.duration / 4)
+                outbound = rate(lambda: index.Server.encode_services(blocks), args.duration / 4)
+                print(f"{name:>8} {count:>8} {inbound:>10.0f}/s {outbound:>10.0f}/s {len(frame):>12}")
+    finally: codec.use(selected)
+
+def read_chunks(packet: bytes, per_read: int, reads: int, aligned: bool = False) -> List[bytes]:
+    """`reads` socket reads of `per_read` packets each, offset by half a packet so every read ends mid-packet
+    unless `aligned`, where every read is exactly whole packets."""
+    stream = packet * (per_read * reads); size = len(packet) * per_read; half = 0 if aligned else len(packet) // 2
+    return ([stream[:half]] if half else []) + [stream[i:i + size] for i in range(half, len(stream), size)]
+
+@benchmark("framing")
+def bench_framing(args: argparse.Namespace):
+    """Packets/s for inbound framing: bytes += and split per packet vs. the framer, 1-64 packets per read
+    ("1 whole": one complete packet per read, the usual case for a game client)."""
+    block = {"Position": "123.4,2000,-55.1", "Rotation": "1.5,-90,0", "PlaneType": "C-400", "State": {"GearDown": False}}
+    json_packet = index.json.dumps({"PositionService": block}).encode('utf-8') + index.PACKET_TERMINATOR
+    binary_packet = wire.encode_position(block, list(index.PLANE_TYPES))
+    def split_loop(chunks: List[bytes]) -> int:
+        buffer, count = b"", 0
+        for data in chunks:
+            buffer += data
+            while index.PACKET_TERMINATOR in buffer: packet, buffer = buffer.split(index.PACKET_TERMINATOR, 1); count += 1
+        return count
+    def slice_loop(chunks: List[bytes]) -> int:
+        buffer, count, header = b"", 0, wire.FRAME_LENGTH
+        for data in chunks:
+            buffer += data
+            while len(buffer) >= header.size:
+                (length,) = header.unpack_from(buffer)
+                if len(buffer) < header.size + length: break
+                body, buffer = buffer[header.size:header.size + length], buffer[header.size + length:]; count += 1
+        return count
+    def framer_loop(chunks: List[bytes], framer) -> int:
+        count = 0
+        for data in chunks:
+            for packet in framer.feed(data): count += 1
+        return count
+    print(f"{'per read':>8} {'json split':>12} {'json framer':>12} {'speedup':>8} {'bin slice':>12} {'bin framer':>12} {'speedup':>8}")
+    for label, per_read, aligned in (("1 whole", 1, True), ("1", 1, False), ("4", 4, False), ("16", 16, False), ("64", 64, False)):
+        reads = max(1, 4096 // per_read); row = []
+        for packet, old, new in ((json_packet, split_loop, lambda c: framer_loop(c, framing.TerminatorFramer(index.PACKET_TERMINATOR, 1 << 20))),
+                                 (binary_packet, slice_loop, lambda c: framer_loop(c, framing.LengthPrefixedFramer(wire.FRAME_LENGTH, 1 << 20)))):
+            chunks = read_chunks(packet, per_read, reads, aligned); expected = per_read * reads
+            assert old(chunks) == new(chunks) == expected
+            before, after = rate(lambda: old(chunks), args.duration / 4) * expected, rate(lambda: new(chunks), args.duration / 4) * expected
+            row += [before, after]
+        print(f"{label:>8} {row[0]:>10.0f}/s {row[1]:>10.0f}/s {row[1] / row[0]:>7.1f}x {row[2]:>10.0f}/s {row[3]:>10.0f}/s {row[3] / row[2]:>7.1f}x")
+
+@benchmark("events")
+def bench_events(args: argparse.Namespace):
+    """Position packets/s through dispatch plus the tick's DataReceived delivery: a task per packet vs. coalesced per tick."""
+    print(f"{'players':>8} {'subscribers':>12} {'per packet':>12} {'coalesced':>12} {'speedup':>8}")
+    packet = {"PositionService": {"Position": "123.4,2000,-55.1", "Rotation": "1.5,-90,0", "PlaneType": "C-400"}}
+    for count in args.players:
+        for subscribers in (0, 1):
+            server = make_server(count); state = server.state; names = state.get_all_player_names()
+            async def callback(player, entry): pass
+            old_event = events.Event("DataReceived")
+            for _ in range(subscribers): old_event.connect(callback); server.api.DataReceived.connect(callback)
+            # Two packets per player per tick, as with 40 Hz clients on the default 20 Hz tick.
+            async def per_packet_tick():
+                for _ in range(2):
+                    for username in names:
+                        state.update_player_position(username, packet)
+                        asyncio.create_task(old_event.invoke(state.get_api_player(username), state.player_positions.get(username)))
+                await asyncio.sleep(0)
+            async def coalesced_tick():
+                for _ in range(2):
+                    for username in names: await server._dispatch_packet(username, packet)
+                server.api.DataReceived.flush(); await asyncio.sleep(0)
+            before, after = ticks_per_second(per_packet_tick, args.duration / 2) * 2 * count, ticks_per_second(coalesced_tick, args.duration / 2) * 2 * count
+            print(f"{count:>8} {subscribers:>12} {before:>10.0f}/s {after:>10.0f}/s {after / before:>7.1f}x")
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="TFSMP server micro-benchmarks")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all). Available: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--players", type=int, nargs="+", default=[50, 200, 500], help="simulated player counts")
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds spent per measurement")
+    args = parser.parse_args(argv)
+    for name in args.names or list(BENCHMARKS):
+        if name not in BENCHMARKS: parser.error(f"unknown benchmark '{name}'")
+        index.bold(f"== {name} =="); BENCHMARKS[name](args)
+
+if __name__ == "__main__":
+    main()
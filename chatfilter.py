@@ -2,52 +2,172 @@
 
 import os
 import pathlib
+import unicodedata
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import serverlog
 
 # Lấy đường dẫn đến thư mục chứa file này
 script_directory = pathlib.Path(__file__).parent.resolve()
 filter_file_path = os.path.join(script_directory, "chatfilter.txt")
+# Danh sách riêng cho khớp không dấu: cả từ lẫn tin nhắn đều được bỏ dấu trước khi so.
+fold_file_path = os.path.join(script_directory, "chatfilter_fold.txt")
 
 banned_words = set()
 
-def load_filter_words():
-    """Tải danh sách các từ cấm từ file chatfilter.txt."""
-    global banned_words
-    banned_words.clear()
-    try:
-        if not os.path.exists(filter_file_path):
-            print(f"[WARN] File 'chatfilter.txt' không tồn tại. Tạo file mẫu.")
-            with open(filter_file_path, "w", encoding='utf-8') as f:
-                f.write("# Thêm các từ cấm vào đây, mỗi từ trên một dòng.\n")
-                f.write("tucam1\n")
-                f.write("tucam2\n")
-            return
-
-        with open(filter_file_path, "r", encoding='utf-8') as f:
+class _CharMap(dict):
+    """Bảng str.translate tự điền dần; mỗi ký tự luôn map sang đúng một ký tự để giữ nguyên vị trí."""
+    def __init__(self, convert): super().__init__(); self._convert = convert
+    def __missing__(self, codepoint):
+        mapped = self._convert(chr(codepoint))
+        self[codepoint] = mapped if len(mapped) == 1 else chr(codepoint)
+        return self[codepoint]
+
+def _fold_char(ch: str) -> str:
+    if ch == 'đ': return 'd'
+    base = unicodedata.normalize('NFD', ch)[0]
+    return base if base.isascii() else ch
+
+_LOWER = _CharMap(str.lower)
+_FOLD = _CharMap(_fold_char)
+
+def normalize(text: str) -> str:
+    """Chữ thường, dạng NFC. Độ dài bằng đúng chuỗi NFC gốc để có thể che (mask) theo vị trí."""
+    return unicodedata.normalize('NFC', text).translate(_LOWER)
+
+def fold_diacritics(text: str) -> str:
+    """Bỏ dấu tiếng Việt ("địt" -> "dit"), giữ nguyên độ dài chuỗi."""
+    return text.translate(_FOLD)
+
+def _is_word_char(ch: str) -> bool: return ch.isalnum() or ch == '_'
+
+class Automaton:
+    """Máy Aho-Corasick đã biên dịch: quét một lần qua tin nhắn cho mọi từ cấm, không phụ thuộc số lượng từ."""
+    def __init__(self, words):
+        self.goto: List[Dict[str, int]] = [{}]; self.fail: List[int] = [0]; self.out: List[Tuple[int, ...]] = [()]
+        for word in words:
+            state = 0
+            for ch in word:
+                nxt = self.goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto); self.goto[state][ch] = nxt
+                    self.goto.append({}); self.fail.append(0); self.out.append(())
+                state = nxt
+            if len(word) not in self.out[state]: self.out[state] += (len(word),)
+        # Duyệt theo chiều rộng để dựng liên kết fail và gộp output của hậu tố.
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt); f = self.fail[state]
+                while f and ch not in self.goto[f]: f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] += self.out[self.fail[nxt]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        goto, fail, out = self.goto, self.fail, self.out; state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]: state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                for length in out[state]: yield i - length + 1, i + 1
+
+class ChatFilter:
+    """Bộ lọc chat: khớp chuỗi con hoặc nguyên từ, tuỳ chọn bỏ dấu, che từ cấm thay vì chặn cả tin nhắn.
+
+    Từ trong `path` được khớp đúng như viết (kể cả dấu), nên "cac" không bắt nhầm "các". Khi bật fold,
+    các từ trong `fold_path` (không bắt buộc có) được bỏ dấu rồi khớp với tin nhắn đã bỏ dấu, nên
+    "buồi" trong danh sách đó bắt được cả "buoi" lẫn "buồi"."""
+    def __init__(self, path: str = filter_file_path, whole_word: bool = False, fold: bool = False, mask: bool = False, fold_path: str = fold_file_path):
+        self.path = path; self.fold_path = fold_path; self.whole_word = whole_word; self.fold = fold; self.mask = mask
+        self._automaton: Optional[Automaton] = None; self._words = frozenset(); self._mtime: Optional[Tuple[Any, Any]] = None
+        self._fold_automaton: Optional[Automaton] = None; self._fold_words = frozenset()
+
+    @property
+    def words(self) -> frozenset: return self._words
+
+    @property
+    def fold_words(self) -> frozenset: return self._fold_words
+
+    def configure(self, whole_word: Optional[bool] = None, fold: Optional[bool] = None, mask: Optional[bool] = None):
+        if whole_word is not None: self.whole_word = whole_word
+        if fold is not None: self.fold = fold
+        if mask is not None: self.mask = mask
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[float, int]]:
+        try: stat = os.stat(path); return stat.st_mtime, stat.st_size
+        except OSError: return None
+
+    def _file_signature(self) -> Optional[Tuple[Any, Any]]:
+        signature = self._stat(self.path)
+        return None if signature is None else (signature, self._stat(self.fold_path))
+
+    @staticmethod
+    def _read_words(path: str) -> frozenset:
+        with open(path, "r", encoding='utf-8') as f:
             # Đọc file, chuyển thành chữ thường, loại bỏ khoảng trắng và dòng trống/comment
-            words = [line.strip().lower() for line in f if line.strip() and not line.startswith('#')]
+            return frozenset(normalize(line.strip()) for line in f if line.strip() and not line.startswith('#'))
+
+    def load(self) -> bool:
+        """Đọc file và biên dịch máy mới; chỉ thay thế bộ lọc đang dùng (một phép gán) khi đã dựng xong."""
+        global banned_words
+        try:
+            if not os.path.exists(self.path):
+                serverlog.emit("warn", f"File '{os.path.basename(self.path)}' không tồn tại. Tạo file mẫu.")
+                with open(self.path, "w", encoding='utf-8') as f:
+                    f.write("# Thêm các từ cấm vào đây, mỗi từ trên một dòng.\n")
+                    f.write("tucam1\n")
+                    f.write("tucam2\n")
+            signature = self._file_signature(); words = self._read_words(self.path)
+            fold_words = frozenset(fold_diacritics(w) for w in self._read_words(self.fold_path)) if os.path.exists(self.fold_path) else frozenset()
+            automaton, fold_automaton = Automaton(words), Automaton(fold_words)
+            self._automaton, self._words, self._fold_automaton, self._fold_words, self._mtime = automaton, words, fold_automaton, fold_words, signature
             banned_words = set(words)
-        print(f"[INFO] Đã tải {len(banned_words)} từ cấm từ chatfilter.txt.")
+            serverlog.emit("info", f"Đã tải {len(words)} từ cấm từ {os.path.basename(self.path)}.")
+            if fold_words: serverlog.emit("info", f"Đã tải {len(fold_words)} từ cấm không dấu từ {os.path.basename(self.fold_path)}.")
+            return True
+        except Exception as e:
+            serverlog.emit("error", f"Không thể tải file {os.path.basename(self.path)}: {e}")
+            return False
+
+    def reload_if_changed(self) -> bool:
+        """Tải lại khi mtime/kích thước một trong hai file thay đổi. Chạy được trong thread riêng (asyncio.to_thread)."""
+        signature = self._file_signature()
+        if signature is None or signature == self._mtime: return False
+        return self.load()
+
+    def find(self, message: str) -> List[Tuple[int, int]]:
+        """Các đoạn [start, end) chứa từ cấm, tính trên dạng NFC của tin nhắn."""
+        automaton, fold_automaton = self._automaton, self._fold_automaton if self.fold and self._fold_words else None
+        if automaton is None or (not self._words and fold_automaton is None): return []
+        text = normalize(message); spans = set(automaton.iter_matches(text))
+        if fold_automaton is not None: spans.update(fold_automaton.iter_matches(fold_diacritics(text)))
+        if self.whole_word:
+            spans = {(s, e) for s, e in spans if (s == 0 or not _is_word_char(text[s - 1])) and (e == len(text) or not _is_word_char(text[e]))}
+        return sorted(spans)
 
-    except Exception as e:
-        print(f"[ERROR] Không thể tải file chatfilter.txt: {e}")
+    def filter(self, message: str) -> Tuple[bool, str]:
+        """(True, tin nhắn) nếu sạch hoặc đã được che; (False, lý do) nếu bị chặn."""
+        spans = self.find(message)
+        if not spans: return (True, message)
+        if not self.mask: return (False, "Message contains banned words.")
+        chars = list(unicodedata.normalize('NFC', message))
+        for start, end in spans: chars[start:end] = '*' * (end - start)
+        return (True, "".join(chars))
+
+chat_filter = ChatFilter()
+
+def load_filter_words():
+    """Tải danh sách các từ cấm từ file chatfilter.txt."""
+    chat_filter.load()
 
 def filterstring(message: str):
     """
     Kiểm tra một chuỗi tin nhắn có chứa từ cấm hay không.
     Trả về: (True, message) nếu sạch, (False, message) nếu chứa từ cấm.
+    Khi bật chế độ che (mask), từ cấm được thay bằng '*' và trả về (True, tin nhắn đã che).
     """
-    if not banned_words:
-        return (True, message)
-
-    message_lower = message.lower()
-
-    for word in banned_words:
-        if word in message_lower:
-            # Tìm thấy từ cấm
-            return (False, "Message contains banned words.")
-
-    # Không tìm thấy từ cấm nào
-    return (True, message)
+    return chat_filter.filter(message)
 
 # Tải danh sách từ cấm ngay khi module này được import
 load_filter_words()
\ No newline at end of file
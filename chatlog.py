@@ -0,0 +1,37 @@
+# file: chatlog.py
+# Chat history as a bounded ring buffer with a sequence number, so clients can be sent only what is new.
+
+from collections import deque
+from itertools import islice
+from typing import Deque, Dict, List, Optional
+
+class ChatLog:
+    """Keeps the last `capacity` messages; `seq` counts every message ever added (0 means none yet).
+
+    Lines are formatted once when added and full renders are cached until the next message, so a quiet
+    server does no chat work per tick. `messages` holds the {"sender", "message"} dicts, oldest first."""
+    def __init__(self, capacity: int):
+        self.seq = 0
+        self.messages: Deque[Dict[str, str]] = deque(maxlen=capacity)
+        self._lines: Deque[str] = deque(maxlen=capacity)
+        self._rendered: Dict[int, str] = {}
+
+    def __len__(self) -> int: return len(self._lines)
+
+    def append(self, sender: str, message: str) -> int:
+        self.messages.append({"sender": sender, "message": message}); self._lines.append(f"[{sender}] {message}")
+        self.seq += 1; self._rendered.clear()
+        return self.seq
+
+    def render(self, count: int) -> str:
+        """The last `count` lines joined with newlines, cached per count until the next message."""
+        text = self._rendered.get(count)
+        if text is None: text = self._rendered[count] = "\n".join(islice(self._lines, max(0, len(self._lines) - count), None))
+        return text
+
+    def lines_since(self, seq: int, limit: int) -> Optional[List[str]]:
+        """Formatted lines added after `seq`, or None when a client that far behind needs a full refresh instead
+        (`seq` predates the buffer, is unknown, or more than `limit` lines are missing)."""
+        missing = self.seq - seq
+        if seq < 0 or missing < 0 or missing > min(limit, len(self._lines)): return None
+        return list(islice(self._lines, len(self._lines) - missing, None))
@@ -0,0 +1,60 @@
+# file: codec.py
+# JSON encode/decode for every packet path, plus compiled validators for the fields checked per packet.
+# Uses orjson or msgspec when installed and the stdlib json module otherwise; use() switches at startup.
+
+import json
+import re
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try: import orjson
+except ImportError: orjson = None
+try: import msgspec
+except ImportError: msgspec = None
+
+Vector3 = Tuple[float, float, float]
+
+def _stdlib_loads(data: Any) -> Any: return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+def _stdlib_dumps(obj: Any) -> bytes: return json.dumps(obj).encode('utf-8')
+
+# name: (loads, dumps, decode errors, item separator, key separator) -- separators as the backend writes them,
+# so frames assembled from separately encoded blocks are byte-identical to dumps() of the whole object.
+_BACKENDS: Dict[str, Tuple[Callable[[Any], Any], Callable[[Any], bytes], Tuple[type, ...], bytes, bytes]] = {
+    "json": (_stdlib_loads, _stdlib_dumps, (ValueError,), b", ", b": "),
+}
+if orjson is not None:
+    _BACKENDS["orjson"] = (orjson.loads, lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS), (ValueError,), b",", b":")
+if msgspec is not None:
+    _BACKENDS["msgspec"] = (msgspec.json.decode, msgspec.json.Encoder().encode, (ValueError, msgspec.DecodeError), b",", b":")
+
+AVAILABLE = tuple(_BACKENDS)
+BACKEND = ""
+loads: Callable[[Any], Any] = _stdlib_loads
+dumps: Callable[[Any], bytes] = _stdlib_dumps
+DECODE_ERRORS: Tuple[type, ...] = (ValueError,)
+ITEM_SEPARATOR, KEY_SEPARATOR = b", ", b": "
+
+def use(name: str = "auto") -> str:
+    """Selects the backend ("auto", "orjson", "msgspec" or "json"); an unavailable one falls back to auto. Returns the name in use.
+
+    loads() accepts bytes or a memoryview, dumps() returns UTF-8 bytes. orjson/msgspec write compact JSON
+    with raw UTF-8, the stdlib backend keeps json.dumps' spacing and \\u escapes."""
+    global BACKEND, loads, dumps, DECODE_ERRORS, ITEM_SEPARATOR, KEY_SEPARATOR
+    if name not in _BACKENDS: name = next(n for n in ("orjson", "msgspec", "json") if n in _BACKENDS)
+    BACKEND = name; loads, dumps, DECODE_ERRORS, ITEM_SEPARATOR, KEY_SEPARATOR = _BACKENDS[name]
+    return name
+
+use()
+
+_VECTOR3 = re.compile(r'(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?)')
+_USERNAME = re.compile(r'[a-zA-Z0-9_]{3,20}')
+
+WORLD_LIMIT = 1e7  # metres (or degrees); coordinates beyond it are rejected, as are the ones that parse to inf
+
+def checked_vector3(v3: Any) -> Optional[Vector3]:
+    """Validates and parses an "x,y,z" string in one pass; None if it is not one or a component is out of bounds."""
+    match = _VECTOR3.fullmatch(v3) if type(v3) is str else None
+    if not match: return None
+    x, y, z = float(match[1]), float(match[2]), float(match[3])
+    return (x, y, z) if -WORLD_LIMIT <= x <= WORLD_LIMIT and -WORLD_LIMIT <= y <= WORLD_LIMIT and -WORLD_LIMIT <= z <= WORLD_LIMIT else None
+
+def valid_username(username: Any) -> bool: return type(username) is str and _USERNAME.fullmatch(username) is not None
@@ -0,0 +1,161 @@
+# file: compression.py
+# Optional per-connection stream compression of everything the server sends after the welcome, negotiated at login.
+# Each connection gets its own raw DEFLATE stream (or zstd, when the zstandard package is installed) flushed after
+# every frame, so the client decodes each frame as it arrives and the stream's window keeps the previous snapshots:
+# repeated keys, names and plane types cost a few bits. A preset dictionary trained from recorded traffic
+# (compression.dict) does the same for the first frames. Train one from a flight recording with
+#   python compression.py Recordings/20260101-120000 --output compression.dict
+
+import argparse
+import heapq
+import os
+import sys
+import time
+import zlib
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import codec
+import metrics
+import recorder
+import wire
+
+try: import zstandard
+except ImportError: zstandard = None
+
+DICTIONARY_FILE = "compression.dict"
+DICTIONARY_SIZE = 32768  # DEFLATE can only reach back 32 KiB, so a larger dictionary would not help zlib
+ALGORITHMS = ("zstd", "zlib") if zstandard is not None else ("zlib",)
+DEFAULT_LEVELS = {"zlib": 1, "zstd": 3}
+SAMPLE_INTERVAL = 1.0
+_GRAM = 8
+_SEGMENT = 48
+
+def dictionary_id(dictionary: bytes) -> int:
+    """What clients send as CompressionDictionary to show they hold the same dictionary; 0 for none."""
+    return zlib.adler32(dictionary) if dictionary else 0
+
+def load_dictionary(path: str) -> bytes:
+    """The dictionary file's bytes, or b"" (streams without a preset dictionary) if it does not exist."""
+    if not os.path.exists(path): return b""
+    with open(path, "rb") as f: return f.read()[-DICTIONARY_SIZE:]
+
+def negotiate(offered: Any, allowed: Sequence[str]) -> Optional[str]:
+    """The client's first choice that is allowed and available; `offered` is a name or a list in preference order."""
+    if isinstance(offered, str): offered = [offered]
+    if not isinstance(offered, list): return None
+    return next((name for name in offered if name in allowed and name in ALGORITHMS), None)
+
+class StreamCompressor:
+    """One connection's outbound stream; compress() returns the bytes to write for one frame, flushed to a boundary
+    the client can decode up to. Input and output sizes and CPU time are added to the compression metrics."""
+    __slots__ = ("algorithm", "_compress", "_flush", "bytes_in", "bytes_out")
+    def __init__(self, algorithm: str, level: Optional[int] = None, dictionary: bytes = b""):
+        self.algorithm = algorithm; self.bytes_in = 0; self.bytes_out = 0
+        level = DEFAULT_LEVELS[algorithm] if level is None else level
+        if algorithm == "zstd":
+            dict_data = zstandard.ZstdCompressionDict(dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT) if dictionary else None
+            stream = zstandard.ZstdCompressor(level=level, dict_data=dict_data).compressobj()
+            self._compress = stream.compress; flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK; self._flush = lambda: stream.flush(flush_mode)
+        elif algorithm == "zlib":
+            stream = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=dictionary) if dictionary else zlib.compressobj(level, zlib.DEFLATED, -15)
+            self._compress = stream.compress; self._flush = lambda: stream.flush(zlib.Z_SYNC_FLUSH)
+        else: raise ValueError(f"Unknown compression algorithm '{algorithm}'")
+
+    def compress(self, frame: bytes) -> bytes:
+        start = time.perf_counter(); data = self._compress(frame) + self._flush()
+        self.bytes_in += len(frame); self.bytes_out += len(data)
+        metrics.COMPRESSION_SECONDS.inc(time.perf_counter() - start, self.algorithm)
+        metrics.COMPRESSION_INPUT_BYTES.inc(len(frame), self.algorithm); metrics.COMPRESSION_OUTPUT_BYTES.inc(len(data), self.algorithm)
+        return data
+
+_reported: Dict[str, Any] = {}  # algorithm -> (bytes in, bytes out, seconds) at the previous summary()
+
+def summary() -> Optional[str]:
+    """Ratio, volume and CPU time per algorithm since the previous call, for the periodic log; None if nothing was compressed."""
+    parts = []
+    for (algorithm,), bytes_in in list(metrics.COMPRESSION_INPUT_BYTES.values.items()):
+        bytes_out = metrics.COMPRESSION_OUTPUT_BYTES.values.get((algorithm,), 0.0); seconds = metrics.COMPRESSION_SECONDS.values.get((algorithm,), 0.0)
+        last_in, last_out, last_seconds = _reported.get(algorithm, (0.0, 0.0, 0.0)); _reported[algorithm] = (bytes_in, bytes_out, seconds)
+        if bytes_in > last_in:
+            parts.append(f"{algorithm} {(bytes_in - last_in) / max(1.0, bytes_out - last_out):.1f}x ({(bytes_in - last_in) / 1e6:.1f} MB -> {(bytes_out - last_out) / 1e6:.1f} MB, "
+                         f"{(seconds - last_seconds) * 1000:.0f} ms CPU)")
+    return "Compression: " + "; ".join(parts) if parts else None
+
+class StreamDecompressor:
+    """Client side, for tools and tests: feed it what arrives on the socket after the welcome; it returns the frames' bytes."""
+    def __init__(self, algorithm: str, dictionary: bytes = b""):
+        if algorithm == "zstd":
+            dict_data = zstandard.ZstdCompressionDict(dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT) if dictionary else None
+            self._decompress = zstandard.ZstdDecompressor(dict_data=dict_data).decompressobj().decompress
+        elif algorithm == "zlib": self._decompress = (zlib.decompressobj(-15, zdict=dictionary) if dictionary else zlib.decompressobj(-15)).decompress
+        else: raise ValueError(f"Unknown compression algorithm '{algorithm}'")
+    def decompress(self, data: bytes) -> bytes: return self._decompress(data)
+
+def train(samples: Iterable[bytes], size: int = DICTIONARY_SIZE) -> bytes:
+    """Builds a raw-content dictionary: fixed-size segments of the samples, picked greedily by how many samples share
+    the 8-byte substrings they add (each substring counted once), with the most valuable segments placed last,
+    nearest the data, where matches are cheapest to encode."""
+    samples = [bytes(s) for s in samples if len(s) >= _SEGMENT]
+    frequency: Counter = Counter()
+    for sample in samples: frequency.update({sample[i:i + _GRAM] for i in range(len(sample) - _GRAM + 1)})
+    def grams(segment: bytes) -> set: return {segment[i:i + _GRAM] for i in range(len(segment) - _GRAM + 1)}
+    def score(segment: bytes, covered: set) -> int: return sum(frequency[g] for g in grams(segment) if g not in covered and frequency[g] > 1)
+    segments = {sample[i:i + _SEGMENT] for sample in samples for i in range(0, len(sample) - _SEGMENT + 1, _SEGMENT // 2)}
+    heap = [(-score(segment, set()), segment) for segment in segments]; heapq.heapify(heap)
+    covered: set = set(); chosen: List[bytes] = []; total = 0
+    while heap and total + _SEGMENT <= size:
+        _, segment = heapq.heappop(heap); current = score(segment, covered)
+        if current <= 0: continue
+        # Lazy greedy: a stale score only ever drops, so re-queue unless it still beats the next best.
+        if heap and current < -heap[0][0]: heapq.heappush(heap, (-current, segment)); continue
+        chosen.append(segment); covered |= grams(segment); total += len(segment)
+    return b"".join(reversed(chosen))
+
+def recording_samples(directory: str, interval: float = SAMPLE_INTERVAL) -> List[bytes]:
+    """Rebuilds what the server sent from a flight recording: every `interval` seconds one full JSON snapshot, one
+    binary snapshot and the chat history frame, in both protocols' framing."""
+    terminator = b'\x1C'; samples: List[bytes] = []
+    recording = recorder.Recording(directory)
+    try:
+        encoder = wire.SnapshotEncoder(recording.plane_types)
+        names: Dict[int, str] = {}; entries: Dict[str, List[Any]] = {}; chat: List[str] = []; next_sample = None
+        for record in recording.records():
+            kind = record["Type"]
+            if kind == recorder.REC_JOIN:
+                names[record["Player"]] = record["Username"]; entries.setdefault(record["Username"], ["0,2000,0", record["PlaneType"] or "None", "0,0,0", wire.state_from_flags(0, 0, -1, "0,0,0")])
+            elif kind == recorder.REC_LEAVE: entries.pop(names.pop(record["Player"], ""), None)
+            elif kind == recorder.REC_POSITION and record["Player"] in names:
+                entries[names[record["Player"]]] = [wire.format_vector3(*record["Position"]) or "0,0,0", record["PlaneType"] or "None", wire.format_vector3(*record["Rotation"]) or "0,0,0",
+                                                    wire.state_from_flags(record["Flags"], record["VTOLAngle"], record["LiveryId"], "0,0,0")]
+            elif kind == recorder.REC_CHAT: chat = (chat + [f"[{record['Sender']}] {record['Message']}"])[-40:]
+            if next_sample is None: next_sample = record["Time"] + interval
+            if record["Time"] >= next_sample and entries:
+                next_sample = record["Time"] + interval; epoch = float(int(record["Time"]))
+                block = {"Positions": entries, "TimestampFormatted": time.strftime("%H:%M:%S", time.localtime(record["Time"])), "TimestampEpoch": epoch, "CurrentServerTime": record["Time"] % 100000}
+                samples.append(codec.dumps({"PlayerService": {"Players": list(entries)}, "PositionService": block}) + terminator)
+                samples.append(encoder.encode(list(entries), entries, (), 0, 0, False, record["Time"] % 100000, epoch))
+                if chat: samples.append(codec.dumps({"ChatService": {"Chat": "\n".join(chat)}}) + terminator)
+    finally: recording.close()
+    return samples
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Train the TFSMP compression dictionary from flight recordings")
+    parser.add_argument("recordings", nargs="+", help="recording directories (made with recordDirectory)")
+    parser.add_argument("--output", default=DICTIONARY_FILE); parser.add_argument("--size", type=int, default=DICTIONARY_SIZE)
+    parser.add_argument("--interval", type=float, default=SAMPLE_INTERVAL, help="seconds of recording between samples")
+    args = parser.parse_args(argv)
+    try: samples = [sample for directory in args.recordings for sample in recording_samples(directory, args.interval)]
+    except (OSError, ValueError) as e: print(f"Could not read recording: {e}"); sys.exit(1)
+    if not samples: print("No samples: the recordings have no players in them."); sys.exit(1)
+    dictionary = train(samples, args.size)
+    with open(args.output, "wb") as f: f.write(dictionary)
+    plain = sum(len(s) for s in samples)
+    for algorithm in ALGORITHMS:
+        # Each sample on a fresh stream: the dictionary's effect alone, without the window of earlier frames.
+        without = sum(len(StreamCompressor(algorithm).compress(s)) for s in samples); packed = sum(len(StreamCompressor(algorithm, None, dictionary).compress(s)) for s in samples)
+        print(f"{algorithm}: {plain / without:.2f}x without the dictionary, {plain / packed:.2f}x with it (single frames)")
+    print(f"Wrote {len(dictionary)} bytes from {len(samples)} samples to {args.output} (id {dictionary_id(dictionary)}).")
+
+if __name__ == "__main__":
+    main()
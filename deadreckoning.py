@@ -0,0 +1,74 @@
+# file: deadreckoning.py
+# Server-side dead reckoning for delta clients: a player's entry is re-published only when the position a client
+# extrapolates from the last published entry drifts too far from the real one, or on a slow heartbeat.
+
+from typing import Any, Dict, List, Optional
+
+DEFAULT_THRESHOLD = 2.0
+# Allowed position error per PlaneType; people and ground vehicles move slowly, so small errors show.
+PLANE_THRESHOLDS = {"InPerson": 0.25, "4x4": 0.5, "APC": 0.5, "FuelTruck": 0.5, "8x8": 0.5, "Flatbed": 0.5}
+ROTATION_THRESHOLD = 5.0
+HEARTBEAT = 1.0
+MIN_SAMPLE_INTERVAL = 0.001
+
+class _Published:
+    __slots__ = ("version", "table_version", "checked", "recv_time", "position", "velocity", "rotation", "plane_type", "state", "sent")
+
+class DeadReckoning:
+    """Clients extrapolate each published entry as position + velocity * (server time - receive time), with the
+    velocity taken from the entry's previous position and receive time. update() runs the same extrapolation
+    against every player's latest data and returns versions that change only when an entry is re-published:
+    when the error exceeds the threshold for its PlaneType, the rotation turns by more than
+    `rotation_threshold` degrees, the plane type or state changes, or `heartbeat` seconds have passed since
+    an update was last held back. `entries` holds the published copies that delta frames are built from."""
+    def __init__(self, player_table: Any, player_positions: Dict[str, List[Any]], thresholds: Optional[Dict[str, float]] = None,
+                 default_threshold: float = DEFAULT_THRESHOLD, rotation_threshold: float = ROTATION_THRESHOLD, heartbeat: float = HEARTBEAT):
+        self.player_table = player_table; self.player_positions = player_positions
+        self.thresholds = {**PLANE_THRESHOLDS, **(thresholds or {})}; self.default_threshold = default_threshold
+        self.rotation_threshold = rotation_threshold; self.heartbeat = heartbeat
+        self.entries: Dict[str, List[Any]] = {}; self._published: Dict[str, _Published] = {}; self._clock = 0
+        self.published = 0; self.suppressed = 0
+
+    def threshold(self, plane_type: Any) -> float: return self.thresholds.get(plane_type, self.default_threshold)
+
+    def _publish(self, username: str, entry: List[Any], table_version: int, slot: int, now: float) -> int:
+        table = self.player_table; i = slot * 3; recv_time, previous_recv_time = table.recv_time[slot], table.previous_recv_time[slot]
+        position, previous = table.position[i:i + 3], table.previous_position[i:i + 3]
+        interval = recv_time - previous_recv_time
+        published = self._published.get(username) or _Published(); self._clock += 1
+        published.version = self._clock; published.table_version = table_version; published.checked = published.recv_time = recv_time
+        published.position = tuple(position); published.rotation = tuple(table.rotation[i:i + 3]); published.sent = now
+        # Matches what a client computes from the entry; no history (a fresh player) means standing still.
+        published.velocity = tuple((p - q) / interval for p, q in zip(position, previous)) if interval > MIN_SAMPLE_INTERVAL and len(entry) >= 8 else (0.0, 0.0, 0.0)
+        published.plane_type = entry[1]; published.state = dict(entry[3])
+        self._published[username] = published; self.entries[username] = [entry[0], entry[1], entry[2], published.state, *entry[4:]]
+        self.published += 1; return published.version
+
+    def update(self, table_versions: Dict[str, int], now: float) -> Dict[str, int]:
+        """`table_versions` is PlayerTable.versions_snapshot(); `now` is on the same clock as the receive times."""
+        table, positions, published_by_name = self.player_table, self.player_positions, self._published
+        slots, recv_times, position, rotation = table.slots, table.recv_time, table.position, table.rotation
+        rotation_threshold = self.rotation_threshold; versions: Dict[str, int] = {}
+        for username, table_version in table_versions.items():
+            entry = positions.get(username); slot = slots.get(username)
+            if entry is None or slot is None: continue
+            published = published_by_name.get(username)
+            if published is None: versions[username] = self._publish(username, entry, table_version, slot, now); continue
+            recv_time = recv_times[slot]; pending = table_version != published.table_version
+            # Nothing new has arrived since the last check, and no held-back update is due for its heartbeat.
+            if recv_time == published.checked and not (pending and now - published.sent >= self.heartbeat): versions[username] = published.version; continue
+            published.checked = recv_time
+            republish = entry[1] != published.plane_type or entry[3] != published.state or (pending and now - published.sent >= self.heartbeat)
+            if not republish:
+                i = slot * 3; elapsed = recv_time - published.recv_time; (px, py, pz), (vx, vy, vz) = published.position, published.velocity
+                dx, dy, dz = position[i] - px - vx * elapsed, position[i + 1] - py - vy * elapsed, position[i + 2] - pz - vz * elapsed
+                limit = self.threshold(entry[1])
+                republish = dx * dx + dy * dy + dz * dz > limit * limit or any(
+                    abs((current - last + 180.0) % 360.0 - 180.0) > rotation_threshold for current, last in zip(rotation[i:i + 3], published.rotation))
+            if republish: versions[username] = self._publish(username, entry, table_version, slot, now)
+            else:
+                versions[username] = published.version
+                if pending: self.suppressed += 1
+        if len(published_by_name) > len(versions):
+            for username in [u for u in published_by_name if u not in versions]: del published_by_name[username]; self.entries.pop(username, None)
+        return versions
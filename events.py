@@ -0,0 +1,107 @@
+# file: events.py
+# Plugin events: nothing is allocated without subscribers, sync callbacks run on a bounded thread pool,
+# and per-packet events are coalesced to one delivery per tick.
+
+import asyncio
+import os
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+PLUGIN_CALLBACK_TIMEOUT = 1.0
+
+def plugin_name(callback) -> str:
+    # Plugins are exec'd with FilePath in their globals, so a callback defined in main.py carries its folder.
+    file_path = getattr(callback, "__globals__", {}).get("FilePath")
+    return os.path.basename(file_path) if file_path else getattr(callback, "__qualname__", repr(callback))
+
+class _Subscriber:
+    __slots__ = ("callback", "plugin", "is_async", "batched", "running")
+    def __init__(self, callback: Callable, batched: bool):
+        self.callback = callback; self.plugin = plugin_name(callback); self.is_async = asyncio.iscoroutinefunction(callback)
+        self.batched = batched; self.running = False
+
+class Event:
+    """connect(cb) subscribes cb(*args); connect(cb, batched=True) subscribes cb(list of args tuples) instead.
+
+    Coroutine callbacks are awaited concurrently on the loop. Plain callbacks run on `executor` (a bounded pool
+    shared by all events) and are given up on after `timeout` seconds; a sync callback still stuck in an earlier
+    call is skipped rather than queued behind itself. Every call is timed into the plugin metrics."""
+    def __init__(self, name: str = "", executor: Optional[Executor] = None, timeout: float = PLUGIN_CALLBACK_TIMEOUT):
+        self.name = name; self.executor = executor; self.timeout = timeout; self._subscribers: List[_Subscriber] = []
+
+    @property
+    def has_subscribers(self) -> bool: return bool(self._subscribers)
+
+    def connect(self, callback: Callable, batched: bool = False): self._subscribers.append(_Subscriber(callback, batched))
+
+    def fire(self, *args) -> Optional[asyncio.Task]:
+        """Schedules invoke(*args) without waiting for it; a no-op when nobody is subscribed."""
+        return asyncio.create_task(self.invoke(*args)) if self._subscribers else None
+
+    async def invoke(self, *args):
+        if self._subscribers: await self._deliver([args])
+
+    async def invoke_many(self, calls: List[Tuple]):
+        """Delivers several argument tuples at once; batched subscribers get them in a single call."""
+        if self._subscribers and calls: await self._deliver(calls)
+
+    async def _deliver(self, calls: List[Tuple]):
+        tasks = []
+        for subscriber in self._subscribers:
+            if subscriber.is_async:
+                if subscriber.batched: tasks.append(self._timed(subscriber, subscriber.callback(calls), 1))
+                else: tasks.extend(self._timed(subscriber, subscriber.callback(*args), 1) for args in calls)
+            else: tasks.append(self._threaded(subscriber, calls))
+        if tasks: await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _timed(self, subscriber: _Subscriber, coroutine, calls: int):
+        start = time.perf_counter()
+        try: await coroutine
+        except Exception: metrics.PLUGIN_CALLBACK_ERRORS.inc(1, subscriber.plugin, self.name); raise
+        finally:
+            metrics.PLUGIN_CALLBACK_SECONDS.inc(time.perf_counter() - start, subscriber.plugin, self.name); metrics.PLUGIN_CALLBACK_CALLS.inc(calls, subscriber.plugin, self.name)
+
+    async def _threaded(self, subscriber: _Subscriber, calls: List[Tuple]):
+        if subscriber.running: metrics.PLUGIN_CALLBACK_SKIPPED.inc(len(calls), subscriber.plugin, self.name); return
+        # One pool job per subscriber and delivery, however many calls it carries.
+        def run() -> Tuple[float, int]:
+            start, errors = time.perf_counter(), 0
+            try:
+                if subscriber.batched:
+                    try: subscriber.callback(calls)
+                    except Exception: errors += 1
+                else:
+                    for args in calls:
+                        try: subscriber.callback(*args)
+                        except Exception: errors += 1
+                return time.perf_counter() - start, errors
+            finally: subscriber.running = False
+        subscriber.running = True; start = time.perf_counter()
+        future = asyncio.get_running_loop().run_in_executor(self.executor, run)
+        try: elapsed, errors = await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # The thread cannot be interrupted; it stays marked as running until the call returns.
+            elapsed, errors = time.perf_counter() - start, 0; metrics.PLUGIN_CALLBACK_TIMEOUTS.inc(1, subscriber.plugin, self.name)
+        metrics.PLUGIN_CALLBACK_SECONDS.inc(elapsed, subscriber.plugin, self.name)
+        metrics.PLUGIN_CALLBACK_CALLS.inc(1 if subscriber.batched else len(calls), subscriber.plugin, self.name)
+        if errors: metrics.PLUGIN_CALLBACK_ERRORS.inc(errors, subscriber.plugin, self.name)
+
+class CoalescedEvent(Event):
+    """post(key, *args) keeps only the latest args per key; flush(), called once per tick, delivers them.
+
+    A flush while the previous delivery is still running leaves the posts pending, so slow plugins see
+    fewer, fresher updates instead of a growing backlog of tasks."""
+    def __init__(self, name: str = "", executor: Optional[Executor] = None, timeout: float = PLUGIN_CALLBACK_TIMEOUT):
+        super().__init__(name, executor, timeout)
+        self._pending: Dict[Any, Tuple] = {}; self._delivery: Optional[asyncio.Task] = None
+
+    def post(self, key: Any, *args):
+        if self._subscribers: self._pending[key] = args
+
+    def flush(self) -> Optional[asyncio.Task]:
+        if not self._pending or (self._delivery is not None and not self._delivery.done()): return None
+        calls = list(self._pending.values()); self._pending.clear()
+        self._delivery = asyncio.create_task(self._deliver(calls)); return self._delivery
@@ -0,0 +1,108 @@
+# file: framing.py
+# Incremental inbound framing: small reads are split into bytes packets, large packets are framed in one reusable bytearray.
+
+import struct
+from abc import ABC, abstractmethod
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+# Above this many bytes (a partial packet plus the next read) framing goes through the buffer, so a large packet is
+# not rejoined and rescanned on every read.
+FAST_PATH_LIMIT = 65536
+
+class Framer(ABC):
+    """feed() copies a read into the buffer and returns every complete packet as a memoryview slice of it.
+
+    The buffer has a fixed capacity and is never resized while views exist: unread bytes are moved to the
+    front only when a read would not fit, and a partial packet is not rescanned from its start on the next
+    read, so a large packet costs one copy in however many reads it spans. Small data (the usual case for a
+    game client: a few packets per read, one of them possibly split across two reads) skips the buffer: a
+    partial packet is kept as bytes and joined with the next read, and packets are handed out as bytes
+    slices, which for client-sized packets are cheaper than views. The packets must be iterated
+    before the next feed(), and views are only valid until then; decoders that keep data must copy it. More
+    than `max_size` unframed bytes, or a declared packet length above it, raises ConnectionAbortedError
+    while iterating."""
+    def __init__(self, max_size: int, capacity: int = 0):
+        self.max_size = max_size
+        self._buffer = bytearray(capacity or 2 * max_size + 8192); self._view = memoryview(self._buffer)
+        self._start = 0; self._end = 0; self._scan = 0; self._fast_limit = min(max_size, FAST_PATH_LIMIT)
+        # The unframed tail of the last read while the buffer is unused.
+        self._tail = b""
+
+    def __len__(self) -> int: return self._end - self._start + len(self._tail)
+
+    def feed(self, data: bytes) -> Iterable[Union[memoryview, bytes]]:
+        if self._start == self._end:
+            chunk = self._tail + data
+            if len(chunk) <= self._fast_limit:
+                split = self._split(chunk)
+                if split is not None: packets, self._tail = split; return packets
+            self._tail = b""; data = chunk
+        self._copy(data); return self._frames()
+
+    def _copy(self, data: bytes):
+        size = len(data); pending = self._end - self._start
+        if self._end + size > len(self._buffer):
+            unread = bytes(self._view[self._start:self._end])
+            if pending + size > len(self._buffer):
+                # Earlier views keep the old buffer alive, so a bigger one is allocated instead of resizing.
+                self._buffer = bytearray(max(2 * len(self._buffer), pending + size)); self._view = memoryview(self._buffer)
+            self._buffer[:pending] = unread; self._scan -= self._start; self._start = 0; self._end = pending
+        self._buffer[self._end:self._end + size] = data; self._end += size
+
+    @abstractmethod
+    def _split(self, chunk: bytes) -> Optional[Tuple[List[bytes], bytes]]:
+        """(complete packets, unframed rest) of `chunk`, or None to leave it to the buffer."""
+
+    @abstractmethod
+    def _frames(self) -> Iterator[memoryview]:
+        """Every complete packet in the buffer, as views of it."""
+
+    def _finish(self):
+        if self._start == self._end: self._start = self._end = self._scan = 0
+        elif self._end - self._start > self.max_size: raise ConnectionAbortedError("Buffer size limit exceeded.")
+
+class TerminatorFramer(Framer):
+    """Packets end with `terminator` (the JSON protocol's 0x1C); the terminator is not part of the packet."""
+    def __init__(self, terminator: bytes, max_size: int, capacity: int = 0):
+        super().__init__(max_size, capacity); self.terminator = terminator
+
+    def _split(self, chunk: bytes) -> Optional[Tuple[List[bytes], bytes]]:
+        packets = chunk.split(self.terminator); return packets, packets.pop()
+
+    def _frames(self) -> Iterator[memoryview]:
+        buffer, view, terminator = self._buffer, self._view, self.terminator; step = len(terminator)
+        while True:
+            end = buffer.find(terminator, self._scan, self._end)
+            if end < 0: break
+            start = self._start; self._start = self._scan = end + step
+            yield view[start:end]
+        self._scan = max(self._start, self._end - step + 1); self._finish()
+
+class LengthPrefixedFramer(Framer):
+    """Packets are a `header` length (struct with one unsigned field) followed by that many bytes."""
+    def __init__(self, header: struct.Struct, max_size: int, capacity: int = 0):
+        super().__init__(max_size, capacity); self.header = header; self._unpack_from = header.unpack_from; self._header_size = header.size
+
+    def _split(self, chunk: bytes) -> Optional[Tuple[List[bytes], bytes]]:
+        unpack_from, header_size, size = self._unpack_from, self._header_size, len(chunk)
+        if size < header_size: return [], chunk
+        (length,) = unpack_from(chunk); end = header_size + length
+        if end == size and length <= self.max_size: return [chunk[header_size:]], b""
+        packets = []; start = 0
+        while end <= size:
+            if length > self.max_size: return None
+            packets.append(chunk[start + header_size:end]); start = end
+            if size - start < header_size: break
+            (length,) = unpack_from(chunk, start); end = start + header_size + length
+        return (packets, chunk[start:]) if length <= self.max_size else None
+
+    def _frames(self) -> Iterator[memoryview]:
+        buffer, view, header = self._buffer, self._view, self.header; header_size = header.size
+        while self._end - self._start >= header_size:
+            (length,) = header.unpack_from(buffer, self._start)
+            if length > self.max_size: raise ConnectionAbortedError("Buffer size limit exceeded.")
+            body_start = self._start + header_size; body_end = body_start + length
+            if body_end > self._end: break
+            self._start = self._scan = body_end
+            yield view[body_start:body_end]
+        self._finish()
@@ -1,53 +1,109 @@
 import asyncio
 import json
+import math
 import os
+import signal
 import time
 import sys
 import pathlib
 import re
-from typing import Dict, Any, Optional, Tuple, List, Set
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Tuple, List, Set, Union
 
 from colorama import Fore, Style, init
 
+import bans
+import chatfilter
+import chatlog
+import codec
+import compression
+import deadreckoning
+import events
+import framing
+import metrics
+import playerindex
+import pluginhost
+import ratelimit
+import recorder
+import serverlog
+import shard
+import timerwheel
+import udp
+import wire
+from playertable import PlayerTable
+from sendqueue import SendQueue
+from spatial import SpatialGrid, parse_vector3
+from ticker import TickScheduler
+
 init(autoreset=True)
 script_directory = pathlib.Path(__file__).parent.resolve()
 version = "1.0 HoyuFS re-coded"
 
-def log(message): print(f"{Fore.CYAN}[LOG] {message}")
-def debug(message): print(f"{Fore.WHITE}[DEBUG] {message}")
-def warn(message): print(f"{Fore.YELLOW}[WARN] {message}")
-def error(message): print(f"{Fore.RED}[ERROR] {message}")
-def green(message): print(f"{Fore.GREEN}{Style.BRIGHT}{message}")
-def bold(message): print(f"{Style.BRIGHT}{message}")
+# Queued and written by serverlog's background thread; `key` groups repeated warnings that differ in detail.
+def log(message, key=None): serverlog.emit("log", message, key)
+def debug(message, key=None): serverlog.emit("debug", message, key)
+def warn(message, key=None): serverlog.emit("warn", message, key)
+def error(message, key=None): serverlog.emit("error", message, key)
+def green(message): serverlog.emit("green", message)
+def bold(message): serverlog.emit("bold", message)
 
 PACKET_TERMINATOR = b'\x1C'
+# A JSON packet whose only top-level key is PositionService, with at most one nested object (State). Matched on the
+# packet's bytes or memoryview without copying; braces inside strings are not parsed, so an odd packet can only be
+# misjudged into coalescing its own sender's updates.
+POSITION_ONLY_PACKET = re.compile(rb'\s*\{\s*"PositionService"\s*:\s*\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}\s*\}\s*')
 MAX_BUFFER_SIZE = 16384
 MAX_CHAT_MESSAGES = 100
+CHAT_HISTORY_LINES = 40
 CHAT_SPAM_DELAY = 2.0
 SEND_TIMEOUT = 1.0
+SEND_BACKLOG_DEADLINE = 5.0
 SHUTDOWN_TIMEOUT = 5.0
 BANNED_IPS_FILE = os.path.join(script_directory, "banned_ips.json")
 PLAYER_REAP_DELAY = 3.0
-
-class Event:
-    def __init__(self): self._callbacks = []
-    def connect(self, callback): self._callbacks.append(callback)
-    async def invoke(self, *args, **kwargs):
-        tasks = [cb(*args, **kwargs) for cb in self._callbacks if asyncio.iscoroutinefunction(cb)]
-        if tasks: await asyncio.gather(*tasks, return_exceptions=True)
+HANDSHAKE_TIMEOUT = 10.0
+POSITION_TIMEOUT = 0.0
+IDLE_TIMEOUT = 60.0
+DELTA_KEYFRAME_INTERVAL = 3.0
+GRID_CELL_SIZE = 2000.0
+INTEREST_FAR_INTERVAL = 1.0
+CHAT_FILTER_RELOAD_INTERVAL = 5.0
+TICK_SUMMARY_INTERVAL = 60.0
+PLANE_TYPES = ("C-400", "HC-400", "MC-400", "RL-42", "RL-72", "E-42", "XV-40", "PV-40", "InPerson", "4x4", "APC", "FuelTruck", "8x8", "Flatbed", "None")
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+PLUGIN_THREADS = 4
+CONNECT_RATE = 2.0
+CONNECT_BURST = 10
+HANDSHAKE_RATE = 1.0
+HANDSHAKE_BURST = 5
+INBOUND_PACKET_RATE = 120.0
+INBOUND_PACKET_BURST = 240
+INBOUND_BYTE_RATE = 65536.0
+INBOUND_BYTE_BURST = 131072
+INBOUND_KICK_AFTER = 10.0
+INBOUND_MAX_THROTTLE = 1.0
 
 class ServerState:
-    def __init__(self):
+    def __init__(self, grid_cell_size: float = GRID_CELL_SIZE):
         self.players: Dict[str, Dict[str, Any]] = {}
         self.player_positions: Dict[str, List[Any]] = {}
-        self.player_last_recv_time: Dict[str, float] = {}
-        self.chat_messages: List[Dict[str, str]] = []
+        # Numeric state (parsed vectors, receive times, change versions) lives in the table; player_positions keeps the wire format.
+        self.player_table = PlayerTable()
+        self.spatial_grid = SpatialGrid(grid_cell_size)
+        # Players by IP address and plane type, plus position queries over the grid; see playerindex.PlayerQueries.
+        self.index = playerindex.PlayerIndex(self.spatial_grid, self.player_table.get_position)
+        # Messages carry a sequence number; each tick a client is sent only what it has not seen, if anything.
+        self.chat_log = chatlog.ChatLog(MAX_CHAT_MESSAGES); self.chat_messages = self.chat_log.messages
         self.last_msg_timestamps: Dict[str, float] = {}
         self.last_msg_contents: Dict[str, str] = {}
         self.disconnecting_players: Set[str] = set()
-        self.PlaneTypes = ["C-400", "HC-400", "MC-400", "RL-42", "RL-72", "E-42", "XV-40", "PV-40", "InPerson", "4x4", "APC", "FuelTruck", "8x8", "Flatbed", "None"]
+        # Sharded mode: players owned by other workers, kept in player_positions/table/grid like local ones but never sent to.
+        self.remote_players: Set[str] = set()
+        self.PlaneTypes = list(PLANE_TYPES); self._plane_type_set = frozenset(self.PlaneTypes)
         self._default_state_template = {"Eng1":True, "Eng2":True, "Eng3":True, "Eng4":True, "GearDown":True, "SigL":True, "MainL":False, "VTOLAngle":0, "PV40Color":"0,0,0", "LiveryId":-1}
-        self.banned_ips: Dict[str, str] = self._load_json_file(BANNED_IPS_FILE, {})
+        # Addresses, CIDR ranges and dotted prefixes; changes are saved in the background.
+        self.bans = bans.BanList(BANNED_IPS_FILE, self._load_json_file(BANNED_IPS_FILE, {}), on_error=error); self.banned_ips = self.bans.entries
 
     def _load_json_file(self, file_path: str, default: Any) -> Any:
         if not os.path.exists(file_path):
@@ -63,58 +119,88 @@ class ServerState:
         except IOError as e: error(f"Could not save to {file_path}: {e}")
 
     def ban_ip(self, ip_address: str, reason: str):
-        self.banned_ips[ip_address] = reason
-        self._save_json_file(BANNED_IPS_FILE, self.banned_ips)
-        log(f"IP address '{ip_address}' has been banned. Reason: {reason}")
+        """Bans an address, a CIDR range ("203.0.113.0/24") or a dotted prefix ("203.0.113."); ValueError for anything else."""
+        entry = self.bans.add(ip_address, reason)
+        log(f"IP address '{entry}' has been banned. Reason: {reason}")
 
     def unban_ip(self, ip_address: str) -> bool:
-        if ip_address in self.banned_ips:
-            del self.banned_ips[ip_address]
-            self._save_json_file(BANNED_IPS_FILE, self.banned_ips)
+        if self.bans.remove(ip_address):
             log(f"IP address '{ip_address}' has been unbanned."); return True
         return False
 
-    def is_ip_banned(self, ip_address: str) -> Optional[str]: return self.banned_ips.get(ip_address)
+    def is_ip_banned(self, ip_address: str) -> Optional[str]: return self.bans.lookup(ip_address)
     
-    def add_chat_message(self, author: str, message: str):
-        new_message = {"sender": author, "message": message}
-        self.chat_messages.append(new_message)
-        if len(self.chat_messages) > MAX_CHAT_MESSAGES: self.chat_messages.pop(0)
+    def add_chat_message(self, author: str, message: str) -> int: return self.chat_log.append(author, message)
 
     def get_default_state(self) -> Dict[str, Any]: return self._default_state_template.copy()
-    def add_player(self, username: str, writer: asyncio.StreamWriter, api_player: 'APIPlayer', addr: Tuple[str, int], plane_type: str):
-        self.players[username] = {"writer": writer, "api_player": api_player, "address": addr}
+    def add_player(self, username: str, writer: asyncio.StreamWriter, api_player: 'APIPlayer', addr: Tuple[str, int], plane_type: str, delta_mode: bool = False, protocol: int = wire.PROTOCOL_JSON, sender: Optional[SendQueue] = None, incremental_chat: bool = False, dead_reckoning: bool = False):
+        # "delta" holds the last snapshot sequence the client acknowledged; None means full snapshots every tick.
+        # A "reckoned" delta client extrapolates positions itself and is sent only the dead-reckoning updates.
+        # "chat_seq" is the last chat sequence queued to the client; -1 forces a full refresh on the first tick.
+        self.players[username] = {"writer": writer, "api_player": api_player, "address": addr, "delta": {"acked": None, "keyframe_time": 0.0, "reckoned": dead_reckoning} if delta_mode else None, "protocol": protocol, "sender": sender,
+                                  "chat_seq": -1, "incremental_chat": incremental_chat}
         self.player_positions[username] = ["0,2000,0", plane_type, "0,0,0", self.get_default_state()]
-        self.player_last_recv_time[username] = time.perf_counter(); self.disconnecting_players.discard(username)
+        spawn_position = parse_vector3("0,2000,0"); self.player_table.add(username, spawn_position, (0.0, 0.0, 0.0), time.perf_counter())
+        self.spatial_grid.update(username, spawn_position); self.index.track(username, addr[0] if addr else None, plane_type)
+        self.disconnecting_players.discard(username); self.remote_players.discard(username)
+    def update_remote_player(self, username: str, entry: List[Any]):
+        """Sharded mode: stores another worker's player entry as received (the previous values and receive times included)."""
+        if username in self.players or not (isinstance(entry, list) and len(entry) >= 4): return
+        position = codec.checked_vector3(entry[0]); rotation = codec.checked_vector3(entry[2])
+        if position is None or rotation is None: return
+        if len(entry) >= 8:
+            previous_position = codec.checked_vector3(entry[4]) or position; previous_rotation = codec.checked_vector3(entry[5]) or rotation
+            previous_recv_time, recv_time = float(entry[6] or 0.0), float(entry[7])
+        else: previous_position, previous_rotation, previous_recv_time, recv_time = position, rotation, time.perf_counter(), time.perf_counter()
+        self.remote_players.add(username); self.player_positions[username] = entry
+        self.player_table.load(username, position, rotation, previous_position, previous_rotation, previous_recv_time, recv_time)
+        self.spatial_grid.update(username, position); self.index.plane_types.set(username, entry[1] if isinstance(entry[1], str) else None)
+    def remove_remote_player(self, username: str):
+        if username not in self.remote_players: return
+        self.remote_players.discard(username); self.player_positions.pop(username, None)
+        self.player_table.remove(username); self.spatial_grid.remove(username); self.index.remove(username)
     def remove_player_fully(self, username: str):
         self.players.pop(username, None); self.player_positions.pop(username, None)
-        self.player_last_recv_time.pop(username, None); self.last_msg_timestamps.pop(username, None)
+        self.player_table.remove(username); self.spatial_grid.remove(username); self.index.remove(username)
+        self.last_msg_timestamps.pop(username, None)
         self.last_msg_contents.pop(username, None); self.disconnecting_players.discard(username)
         log(f"Fully reaped player data for {username}.")
     def get_api_player(self, username: str) -> Optional['APIPlayer']:
         player_data = self.players.get(username)
         return player_data.get("api_player") if player_data else None
     def get_player_by_ip(self, ip_address: str) -> List['APIPlayer']:
-        return [p_data["api_player"] for p_data in self.players.values() if p_data.get("address") and p_data["address"][0] == ip_address]
-    def get_all_player_names(self) -> List[str]: return list(self.players.keys())
+        return [self.players[u]["api_player"] for u in self.index.addresses.get(ip_address) if u in self.players]
+    def get_all_player_names(self) -> List[str]: return [*self.players, *self.remote_players]
     def update_player_position(self, username: str, data: dict):
         ownBlock = data.get("PositionService")
         if not (ownBlock and isinstance(ownBlock, dict) and "Position" in ownBlock and "PlaneType" in ownBlock): return
-        if not self._validate_vector3(ownBlock["Position"]) or not self._validate_plane_type(ownBlock["PlaneType"]): return
+        # Validated and parsed in one pass; the floats go straight into the player table.
+        position = codec.checked_vector3(ownBlock["Position"])
+        if position is None or not self._validate_plane_type(ownBlock["PlaneType"]): return
         player_data = self.player_positions.get(username)
-        if not player_data: return
-        old_position, old_rotation, persistent_state = player_data[0], player_data[2], player_data[3]
-        old_recv_time = self.player_last_recv_time.get(username, time.perf_counter())
-        incoming_state_update = ownBlock.get("State", {});
+        if not player_data or username not in self.player_table: return
+        old_position, old_plane_type, old_rotation, persistent_state = player_data[0], player_data[1], player_data[2], player_data[3]
+        old_recv_time = self.player_table.get_recv_time(username)
+        # Everything is validated before anything is stored; a rotation that fails keeps the previous one.
+        new_rotation_str = ownBlock.get("Rotation", old_rotation)
+        rotation = codec.checked_vector3(new_rotation_str) if new_rotation_str != old_rotation else None
+        if rotation is None: new_rotation_str = old_rotation; rotation = self.player_table.get_rotation(username)
+        incoming_state_update = ownBlock.get("State", {}); state_changed = False
         if isinstance(incoming_state_update, dict):
             for key, value in incoming_state_update.items():
                 if key in persistent_state and type(value) is type(persistent_state.get(key)):
                     if isinstance(value, str) and len(value) > 100: continue
-                    persistent_state[key] = value
-        new_rotation_str = ownBlock.get("Rotation", old_rotation)
-        if not self._validate_vector3(new_rotation_str): new_rotation_str = old_rotation
-        current_time = time.perf_counter(); self.player_last_recv_time[username] = current_time
-        self.player_positions[username] = [ownBlock["Position"], ownBlock["PlaneType"], new_rotation_str, persistent_state, old_position, old_rotation, old_recv_time, current_time]
+                    if persistent_state[key] != value: persistent_state[key] = value; state_changed = True
+        # Only visible changes bump the version, so parked aircraft drop out of delta snapshots.
+        changed = state_changed or ownBlock["Position"] != old_position or ownBlock["PlaneType"] != old_plane_type or new_rotation_str != old_rotation
+        current_time = time.perf_counter()
+        self.player_table.update(username, position, rotation, current_time, changed)
+        self.spatial_grid.update(username, position)
+        if ownBlock["PlaneType"] != old_plane_type: self.index.plane_types.set(username, ownBlock["PlaneType"])
+        # Update the wire entry in place instead of building a new list per packet.
+        if len(player_data) < 8: player_data.extend((None, None, None, None))
+        player_data[0], player_data[1], player_data[2] = ownBlock["Position"], ownBlock["PlaneType"], new_rotation_str
+        player_data[4], player_data[5], player_data[6], player_data[7] = old_position, old_rotation, old_recv_time, current_time
     def validate_chat_message(self, author: str, message: str) -> Tuple[bool, str]:
         if author not in self.last_msg_timestamps: self.last_msg_timestamps[author] = 0
         if author not in self.last_msg_contents: self.last_msg_contents[author] = ""
@@ -122,34 +208,53 @@ class ServerState:
         if message.strip().lower() == self.last_msg_contents.get(author, "").strip().lower(): return False, "Không lặp lại tin nhắn giống nhau!"
         self.last_msg_timestamps[author] = time.time(); self.last_msg_contents[author] = message
         return True, ""
-    def get_chat_string(self, count=40) -> str:
-        formatted_lines = [f"[{msg['sender']}] {msg['message']}" for msg in self.chat_messages[-count:]]
-        return "\n".join(formatted_lines)
-    def _validate_vector3(self, v3: str) -> bool: return bool(re.match(r'^-?\d+(\.\d+)?,-?\d+(\.\d+)?,-?\d+(\.\d+)?$', str(v3)))
-    def _validate_plane_type(self, pt: str) -> bool: return pt in self.PlaneTypes
+    def get_chat_string(self, count=CHAT_HISTORY_LINES) -> str: return self.chat_log.render(count)
+    def _validate_vector3(self, v3: str) -> bool: return codec.checked_vector3(v3) is not None
+    def _validate_plane_type(self, pt: str) -> bool: return type(pt) is str and pt in self._plane_type_set
     @staticmethod
-    def validate_username(u: str) -> bool: return bool(re.match(r'^[a-zA-Z0-9_]{3,20}$', str(u)))
+    def validate_username(u: str) -> bool: return codec.valid_username(u)
 
 class APIPlayer:
-    def __init__(self, username: str, writer: asyncio.StreamWriter, server_instance: 'Server'):
-        self.Username = username; self._writer = writer; self._server = server_instance
+    def __init__(self, username: str, writer: asyncio.StreamWriter, server_instance: 'Server', protocol: int = wire.PROTOCOL_JSON):
+        self.Username = username; self._writer = writer; self._server = server_instance; self._protocol = protocol
     def IsConnected(self) -> bool: return not self._writer.is_closing()
     async def Kick(self, message="Bạn đã bị kick."):
         kick_message = {"Message": "Connection validated", "!!VoscriptPluginData": [f"PopupWindow(Đã ngắt kết nối khỏi máy chủ: {message},Đóng)"]}
         if not self._writer.is_closing():
-            await self._server.send_data_unprotected(self._writer, kick_message); self._writer.close()
+            player_data = self._server.state.players.get(self.Username); sender = player_data.get("sender") if player_data and player_data["writer"] is self._writer else None
+            if sender is not None and not sender.closed:
+                # Queued behind the frames already pending, so it arrives after them and continues a compressed stream.
+                sender.put(self._server.encode_frame(kick_message, self._protocol), last=True); await sender.wait_closed(SEND_TIMEOUT)
+            else: await self._server.send_data_unprotected(self._writer, kick_message, self._protocol)
+            self._writer.close()
 
-class TFSMPAPI:
-    def __init__(self, server_instance: 'Server'):
-        self._server = server_instance; self.PlayerConnected = Event(); self.PlayerDisconnected = Event(); self.DataReceived = Event()
+class TFSMPAPI(playerindex.PlayerQueries):
+    def __init__(self, server_instance: 'Server', executor: Optional[ThreadPoolExecutor] = None, callback_timeout: float = events.PLUGIN_CALLBACK_TIMEOUT):
+        # DataReceived is coalesced: subscribers get each player's latest entry once per tick, not every packet.
+        self._server = server_instance; self._index = server_instance.state.index
+        self.PlayerConnected = events.Event("PlayerConnected", executor, callback_timeout); self.PlayerDisconnected = events.Event("PlayerDisconnected", executor, callback_timeout)
+        self.DataReceived = events.CoalescedEvent("DataReceived", executor, callback_timeout)
     @property
     def PlayerData(self) -> Dict[str, List[Any]]: return self._server.state.player_positions
     @property
     def Players(self) -> Dict[str, Dict[str, Any]]: return self._server.state.players
     def GetAPIPlayer(self, username: str) -> Optional[APIPlayer]: return self._server.state.get_api_player(username)
+    @property
+    def TickStats(self) -> Dict[str, Any]:
+        """Tick, Interval, Duration and Lateness (seconds) of the last tick, plus total Overruns and Skipped ticks."""
+        return self._server.tick_scheduler.stats()
+    def SendChat(self, message: str, sender: str = "Server"):
+        message = str(message)[:150]
+        if self._server.shard: self._server.shard.chat(sender, message)
+        else: self._server.state.add_chat_message(sender, message)
+        if self._server.recorder: self._server.recorder.chat(sender, message)
 
 class PluginManager:
-    def __init__(self, api_instance: TFSMPAPI): self.api = api_instance
+    def __init__(self, api_instance: TFSMPAPI, isolation: Any = False, supervisor: Optional[pluginhost.PluginSupervisor] = None):
+        # isolation: False, True (every plugin) or a list of plugin folder names to run in worker processes.
+        self.api = api_instance; self.isolation = isolation; self.supervisor = supervisor or pluginhost.PluginSupervisor(api_instance, warn=warn)
+    def is_isolated(self, pluginFolder: str) -> bool:
+        return self.isolation is True or (isinstance(self.isolation, list) and pluginFolder in self.isolation)
     async def LoadAllPlugins(self):
         totalPlugins, successPlugins = 0, 0
         pluginsFolder = os.path.join(script_directory, "ServersidePlugins")
@@ -160,36 +265,149 @@ class PluginManager:
             debug(f"Loading plugin {pluginFolder}..."); totalPlugins += 1
             mainscript = os.path.join(pluginsFolder, pluginFolder, "main.py")
             if not os.path.exists(mainscript): error(f"Failed to load plugin {pluginFolder}: No main.py."); continue
+            if self.is_isolated(pluginFolder):
+                self.supervisor.add(pluginFolder, os.path.join(pluginsFolder, pluginFolder)); successPlugins += 1; continue
             try:
                 with open(mainscript, "r", encoding='utf-8') as pf: plugincontent = pf.read()
                 globals_dict = {"PrimaryAPI": self.api, "FilePath": os.path.join(pluginsFolder, pluginFolder)}
                 await asyncio.to_thread(exec, plugincontent, globals_dict); successPlugins += 1
             except Exception as e: error(f"Failed to execute plugin {pluginFolder}: {e}")
+        if self.supervisor.workers:
+            try: await self.supervisor.start(); debug(f"Isolated plugins running in worker processes: {', '.join(self.supervisor.workers)}")
+            except OSError as e: error(f"Could not start plugin workers: {e}")
         green(f"{successPlugins}/{totalPlugins} plugins loaded successfully.")
+    async def shutdown(self):
+        if self.supervisor.workers: await self.supervisor.stop()
+
+def configure_logging(config: Dict[str, Any]):
+    # logLevel: debug, info, warn or error. logFile adds JSON lines, rotated at logFileMaxBytes with logFileBackups copies;
+    # identical warnings (or ones sharing a key) are written at most once per logRepeatInterval seconds.
+    try:
+        log_file = config.get("logFile")
+        serverlog.configure(config.get("logLevel", "debug"), config.get("logConsole", True), os.path.join(script_directory, log_file) if log_file else None,
+                            config.get("logFileMaxBytes", serverlog.FILE_MAX_BYTES), config.get("logFileBackups", serverlog.FILE_BACKUPS), config.get("logRepeatInterval", serverlog.REPEAT_INTERVAL))
+    except (ValueError, OSError) as e: error(f"Logging settings ignored: {e}")
 
 class Server:
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], shard_link: Optional[shard.ShardLink] = None):
+        configure_logging(config)
+        # In sharded mode this process is one worker: names, chat and other workers' players go through the link.
+        self.shard = shard_link; self._shard_lost = asyncio.Event()
         self.config = config; self.host = config.get("hostAddress", "0.0.0.0"); self.port = config.get("hostPort", 12345)
-        self.update_interval = config.get("updateInterval", 0.05); self.state = ServerState()
-        self.api = TFSMPAPI(self); self.plugin_manager = PluginManager(self.api)
+        self.update_interval = config.get("updateInterval", 0.05); self.state = ServerState(config.get("gridCellSize", GRID_CELL_SIZE))
+        self.send_backlog_deadline = config.get("sendBacklogDeadline", SEND_BACKLOG_DEADLINE)
+        # Per-IP token buckets: connectRate limits accepted sockets, handshakeRate login attempts (0 disables either).
+        self.connect_limiter = ratelimit.RateLimiter(config.get("connectRate", CONNECT_RATE), config.get("connectBurst", CONNECT_BURST))
+        self.handshake_limiter = ratelimit.RateLimiter(config.get("handshakeRate", HANDSHAKE_RATE), config.get("handshakeBurst", HANDSHAKE_BURST))
+        # Per-connection inbound budgets: decoded packets and bytes per second (0 disables either). A client over budget
+        # has its reads paused and its non-position packets shed; one still over after inboundKickAfter seconds is kicked.
+        self.inbound_budget = (config.get("inboundPacketRate", INBOUND_PACKET_RATE), config.get("inboundPacketBurst", INBOUND_PACKET_BURST),
+                               config.get("inboundByteRate", INBOUND_BYTE_RATE), config.get("inboundByteBurst", INBOUND_BYTE_BURST))
+        self.inbound_kick_after = config.get("inboundKickAfter", INBOUND_KICK_AFTER); self._inbound_reported = (0.0, 0.0, 0.0, 0.0)
+        self.tick_scheduler = TickScheduler(self.update_interval, observe=metrics.TICK_SECONDS.observe)
+        # Handshake, idle and reap timeouts share one wheel turned by the tick, so they fire within one update interval.
+        # positionTimeout (seconds, 0 = off, the default) drops players that stop sending positions (ghost aircraft);
+        # idleTimeout (default 60, like the old read timeout) drops those that send nothing at all.
+        self.timers = timerwheel.TimerWheel(self.update_interval)
+        self.handshake_timeout = config.get("handshakeTimeout", HANDSHAKE_TIMEOUT)
+        self.position_timeout = config.get("positionTimeout", POSITION_TIMEOUT); self.idle_timeout = config.get("idleTimeout", IDLE_TIMEOUT)
+        self.reap_delay = config.get("reapDelay", PLAYER_REAP_DELAY)
+        self.tick_summary_interval = config.get("tickSummaryInterval", TICK_SUMMARY_INTERVAL); self._last_tick_summary = time.perf_counter()
+        # interestRadius > 0 limits most ticks to nearby aircraft for delta clients; everyone is still sent every interestFarInterval
+        # seconds. Clients without delta replace their whole set each frame, so they always get everyone.
+        self.interest_radius = config.get("interestRadius", 0)
+        self._interest_reach = math.ceil(self.interest_radius / self.state.spatial_grid.cell_size) if self.interest_radius > 0 else 0
+        self._interest_far_every = max(1, round(config.get("interestFarInterval", INTEREST_FAR_INTERVAL) / self.update_interval))
+        self.delta_keyframe_interval = config.get("deltaKeyframeInterval", DELTA_KEYFRAME_INTERVAL)
+        self._snapshot_seq = 0
+        self._snapshot_history: Dict[int, Dict[str, int]] = {}
+        self._snapshot_history_length = max(2, int(self.delta_keyframe_interval / self.update_interval) + 2)
+        self._snapshot_encoder = wire.SnapshotEncoder(self.state.PlaneTypes, self.state.player_table)
+        # deadReckoning lets delta clients that ask for it receive a player's update only when their extrapolation of it
+        # would be off by more than deadReckoningThresholds[PlaneType] (default deadReckoningThreshold), or on a heartbeat.
+        self.dead_reckoning: Optional[deadreckoning.DeadReckoning] = None; self._reckoned_history: Dict[int, Dict[str, int]] = {}
+        if config.get("deadReckoning", False):
+            self.dead_reckoning = deadreckoning.DeadReckoning(self.state.player_table, self.state.player_positions, config.get("deadReckoningThresholds"),
+                                                              config.get("deadReckoningThreshold", deadreckoning.DEFAULT_THRESHOLD), config.get("deadReckoningRotation", deadreckoning.ROTATION_THRESHOLD),
+                                                              config.get("deadReckoningHeartbeat", deadreckoning.HEARTBEAT))
+        # Published entries are copies, not the live ones the table-backed encoder caches by identity.
+        self._reckoned_encoder = wire.SnapshotEncoder(self.state.PlaneTypes)
+        # chatfilter.txt matches as written; chatFilterFoldDiacritics (off by default) adds chatfilter_fold.txt, matched without accents.
+        self.chat_filter = chatfilter.chat_filter
+        self.chat_filter.configure(whole_word=config.get("chatFilterWholeWord", True), fold=config.get("chatFilterFoldDiacritics", False), mask=config.get("chatFilterMask", True))
+        self.chat_filter_reload_interval = config.get("chatFilterReloadInterval", CHAT_FILTER_RELOAD_INTERVAL)
+        self.json_codec = codec.use(config.get("jsonCodec", "auto"))
+        # A client listing algorithms in "Compression" at login gets everything after the welcome as one compressed
+        # stream, using the first one `compression` allows (true = all available, false = none). compressionDictionary
+        # is the preset dictionary; it is used when the client's CompressionDictionary matches its id.
+        allowed = config.get("compression", True)
+        self.compression_algorithms = list(compression.ALGORITHMS) if allowed is True else list(allowed or ())
+        self.compression_level = config.get("compressionLevel")
+        try: self.compression_dictionary = compression.load_dictionary(os.path.join(script_directory, config.get("compressionDictionary", compression.DICTIONARY_FILE)))
+        except OSError as e: error(f"Could not read the compression dictionary: {e}"); self.compression_dictionary = b""
+        self.compression_dictionary_id = compression.dictionary_id(self.compression_dictionary)
+        # Synchronous plugin callbacks share this pool; pluginCallbackTimeout bounds how long one is waited for.
+        self.plugin_executor = ThreadPoolExecutor(max_workers=config.get("pluginThreads", PLUGIN_THREADS), thread_name_prefix="plugin")
+        self.api = TFSMPAPI(self, self.plugin_executor, config.get("pluginCallbackTimeout", events.PLUGIN_CALLBACK_TIMEOUT))
+        # pluginIsolation runs plugins in worker processes fed a snapshot every pluginSnapshotInterval seconds;
+        # pluginCpuBudget is the share of one core each may average before it is paused (0 = unlimited).
+        supervisor = pluginhost.PluginSupervisor(self.api, config.get("pluginSnapshotInterval", pluginhost.SNAPSHOT_INTERVAL), config.get("pluginCpuBudget", pluginhost.CPU_BUDGET), warn)
+        self.plugin_manager = PluginManager(self.api, config.get("pluginIsolation", False), supervisor)
+        # Prometheus text on http://metricsHost:metricsPort/metrics; keep it on localhost or behind a firewall.
+        self.metrics_enabled = config.get("metricsEnabled", False)
+        self.metrics_host = config.get("metricsHost", METRICS_HOST); self.metrics_port = config.get("metricsPort", METRICS_PORT)
         self._tcp_server: Optional[asyncio.Server] = None
+        # udpPort > 0 opens a datagram endpoint for positions and snapshots, used by clients that ask for it at login;
+        # snapshots larger than udpMaxDatagram bytes still go over TCP.
+        self.udp_port = config.get("udpPort", 0); self.udp_max_datagram = config.get("udpMaxDatagram", udp.MAX_DATAGRAM)
+        self.udp: Optional[udp.DatagramEndpoint] = None
+        self._metrics_server: Optional[asyncio.Server] = None
         self._polling_task: Optional[asyncio.Task] = None
-        self._reaper_task: Optional[asyncio.Task] = None
+        self._chat_filter_task: Optional[asyncio.Task] = None
+        # recordDirectory turns on the flight recorder: one subdirectory per server run, replayable with replay.py.
+        self.recorder: Optional[recorder.FlightRecorder] = None
+        if config.get("recordDirectory"):
+            self.recorder = recorder.FlightRecorder(os.path.join(script_directory, config["recordDirectory"], time.strftime("%Y%m%d-%H%M%S")), self.state.PlaneTypes,
+                                                    self.state.player_table, self.state.player_positions, config.get("recordSegmentBytes", recorder.SEGMENT_BYTES),
+                                                    config.get("recordKeyframeInterval", recorder.KEYFRAME_INTERVAL), on_error=error, meta={"UpdateInterval": self.update_interval, "Version": version})
 
     async def start(self):
-        bold(f"TFS Multiplayer Server v{version}\n"); debug("Setting up serverside plugins...")
-        await self.plugin_manager.LoadAllPlugins()
-        self._tcp_server = await asyncio.start_server(self._handle_client, self.host, self.port)
-        self._reaper_task = asyncio.create_task(self._reap_disconnected_players_loop())
+        if self.shard: await self._start_shard()
+        else:
+            bold(f"TFS Multiplayer Server v{version}\n"); debug(f"JSON codec: {self.json_codec}"); debug("Setting up serverside plugins...")
+            await self.plugin_manager.LoadAllPlugins()
+        if self.recorder:
+            try: self.recorder.start(); debug(f"Recording flights to {self.recorder.directory}")
+            except OSError as e: error(f"Could not start the flight recorder: {e}"); self.recorder = None
+        # Shard workers all bind the same port; the kernel spreads new connections across them.
+        self._tcp_server = await asyncio.start_server(self._handle_client, self.host, self.port, reuse_port=bool(self.shard))
+        if self.udp_port:
+            try:
+                _, self.udp = await asyncio.get_running_loop().create_datagram_endpoint(lambda: udp.DatagramEndpoint(self._process_datagram, self.udp_max_datagram), local_addr=(self.host, self.udp_port))
+                debug(f"UDP position channel on {self.host}:{self.udp.port}")
+            except OSError as e: error(f"Could not open the UDP port {self.udp_port}: {e}")
         self._polling_task = asyncio.create_task(self._data_polling_loop())
-        green(f"TCP Server configured on {self.host}:{self.port}")
-        await self._tcp_server.serve_forever()
+        self._chat_filter_task = asyncio.create_task(self._chat_filter_reload_loop())
+        green(f"TCP Server configured on {self.host}:{self.port}" + (f" (shard worker {self.shard.worker_id})" if self.shard else ""))
+        if self.metrics_enabled: await self._start_metrics_server()
+        if self.shard: await self._shard_lost.wait()
+        else: await self._tcp_server.serve_forever()
+
+    async def _start_shard(self):
+        def kick(username: str, message: str):
+            api_player = self.state.get_api_player(username)
+            if api_player: asyncio.create_task(api_player.Kick(message))
+        def closed():
+            if not self._shard_lost.is_set(): warn("Lost the link to the shard coordinator; shutting down."); self._shard_lost.set()
+        await self.shard.start(self.state, self.api.DataReceived, kick, closed)
 
     async def shutdown(self):
         log("Shutting down server gracefully...")
         if self._tcp_server and self._tcp_server.is_serving():
             self._tcp_server.close(); await self._tcp_server.wait_closed(); log("TCP server closed.")
-        tasks_to_cancel = [t for t in [self._polling_task, self._reaper_task] if t and not t.done()]
+        if self._metrics_server: self._metrics_server.close(); await self._metrics_server.wait_closed()
+        if self.udp: self.udp.close()
+        tasks_to_cancel = [t for t in [self._polling_task, self._chat_filter_task] if t and not t.done()]
         for task in tasks_to_cancel: task.cancel()
         if tasks_to_cancel:
             try:
@@ -202,21 +420,85 @@ class Server:
                 await asyncio.wait_for(asyncio.gather(*kick_tasks, return_exceptions=True), timeout=SHUTDOWN_TIMEOUT)
                 log(f"Kicked {len(kick_tasks)} players.")
             except asyncio.TimeoutError: warn(f"Timed out trying to kick players.")
+        await self.plugin_manager.shutdown(); self.plugin_executor.shutdown(wait=False, cancel_futures=True)
+        await self.state.bans.flush()
+        if self.shard: self.shard.close()
+        if self.recorder: await asyncio.to_thread(self.recorder.close); log(f"Flight recording saved: {self.recorder.records} records.")
         log("Graceful shutdown complete.")
 
-    async def send_data_unprotected(self, writer: asyncio.StreamWriter, data_dict: dict):
+    async def _start_metrics_server(self):
+        state = self.state
+        def senders(): return [(u, p["sender"]) for u, p in list(state.players.items()) if p.get("sender") is not None]
+        workers = self.plugin_manager.supervisor.workers
+        for gauge in (
+            metrics.Gauge("tfsmp_players_connected", "Players connected and not disconnecting.", lambda: len(state.players) - len(state.disconnecting_players)),
+            metrics.Gauge("tfsmp_players_disconnecting", "Players waiting for the reaper.", lambda: len(state.disconnecting_players)),
+            metrics.Gauge("tfsmp_timers_pending", "Handshake, idle and reap timers in the timer wheel.", lambda: len(self.timers)),
+            metrics.Gauge("tfsmp_tick_overruns_total", "Ticks that took longer than the update interval.", lambda: self.tick_scheduler.overruns, kind="counter"),
+            metrics.Gauge("tfsmp_tick_skipped_total", "Tick deadlines skipped after an overrun.", lambda: self.tick_scheduler.skipped, kind="counter"),
+            metrics.Gauge("tfsmp_client_send_backlog_bytes", "Bytes waiting in each client's send queue.", lambda: {(u, ): s.pending_bytes for u, s in senders()}, ("player",)),
+            metrics.Gauge("tfsmp_client_snapshots_dropped", "Snapshots superseded before they were written, per client.", lambda: {(u, ): s.snapshots_dropped for u, s in senders()}, ("player",)),
+            metrics.Gauge("tfsmp_plugin_worker_restarts_total", "Isolated plugin worker restarts.", lambda: {(n, ): w.restarts for n, w in workers.items()}, ("plugin",), kind="counter"),
+            metrics.Gauge("tfsmp_plugin_worker_cpu_seconds_total", "CPU time used by isolated plugin workers.", lambda: {(n, ): w.cpu_seconds for n, w in workers.items()}, ("plugin",), kind="counter"),
+            metrics.Gauge("tfsmp_udp_datagrams_received_total", "Datagrams accepted on the UDP channel.", lambda: self.udp.received if self.udp else 0, kind="counter"),
+            metrics.Gauge("tfsmp_udp_datagrams_discarded_total", "Datagrams discarded as out of order or duplicated.", lambda: self.udp.discarded if self.udp else 0, kind="counter"),
+            metrics.Gauge("tfsmp_udp_datagrams_unknown_total", "Datagrams with no valid session token.", lambda: self.udp.unknown if self.udp else 0, kind="counter"),
+            metrics.Gauge("tfsmp_udp_datagrams_sent_total", "Datagrams sent on the UDP channel.", lambda: self.udp.sent if self.udp else 0, kind="counter"),
+            metrics.Gauge("tfsmp_udp_snapshots_oversized_total", "Snapshots sent over TCP because they did not fit in one datagram.", lambda: self.udp.oversized if self.udp else 0, kind="counter"),
+            metrics.Gauge("tfsmp_plugin_worker_throttled_seconds_total", "Time isolated plugin workers spent paused for exceeding their CPU budget.", lambda: {(n, ): w.throttled_seconds for n, w in workers.items()}, ("plugin",), kind="counter"),
+        ): metrics.REGISTRY.register(gauge)
+        if self.dead_reckoning:
+            reckoning = self.dead_reckoning
+            metrics.REGISTRY.register(metrics.Gauge("tfsmp_dead_reckoning_published_total", "Player updates published to dead-reckoning clients.", lambda: reckoning.published, kind="counter"))
+            metrics.REGISTRY.register(metrics.Gauge("tfsmp_dead_reckoning_suppressed_total", "Changed player updates held back because client extrapolation was close enough.", lambda: reckoning.suppressed, kind="counter"))
+        if self.recorder:
+            flight_recorder = self.recorder
+            metrics.REGISTRY.register(metrics.Gauge("tfsmp_recorder_bytes_written_total", "Bytes the flight recorder has written.", lambda: flight_recorder.bytes_written, kind="counter"))
+            metrics.REGISTRY.register(metrics.Gauge("tfsmp_recorder_dropped_bytes_total", "Recorded bytes dropped because the disk fell behind.", lambda: flight_recorder.dropped_bytes, kind="counter"))
+        try:
+            self._metrics_server = await metrics.start_http_server(metrics.REGISTRY, self.metrics_host, self.metrics_port)
+            green(f"Metrics available on http://{self.metrics_host}:{self.metrics_port}/metrics")
+        except OSError as e: error(f"Could not start metrics endpoint on {self.metrics_host}:{self.metrics_port}: {e}")
+
+    @staticmethod
+    def encode_services(blocks: Dict[str, Any]) -> Tuple[bytes, Dict[str, int]]:
+        """Same bytes as encode_frame(blocks), but also returns the encoded size of each service block."""
+        sizes: Dict[str, int] = {}; parts = []
+        for service, block in blocks.items():
+            encoded = codec.dumps(block); sizes[service] = len(encoded)
+            parts.append(codec.dumps(service) + codec.KEY_SEPARATOR + encoded)
+        return b"{" + codec.ITEM_SEPARATOR.join(parts) + b"}" + PACKET_TERMINATOR, sizes
+
+    @staticmethod
+    def encode_frame(data_dict: dict, protocol: int = wire.PROTOCOL_JSON) -> bytes:
+        if protocol == wire.PROTOCOL_BINARY: return wire.encode_json(data_dict)
+        return codec.dumps(data_dict) + PACKET_TERMINATOR
+
+    async def send_data_unprotected(self, writer: asyncio.StreamWriter, data_dict: dict, protocol: int = wire.PROTOCOL_JSON):
+        """Writes directly, bypassing the send queue; for handshake rejections and kicks of connections without one."""
         if writer.is_closing(): return
-        try: message = json.dumps(data_dict).encode('utf-8') + PACKET_TERMINATOR; writer.write(message); await writer.drain()
-        except (ConnectionResetError, BrokenPipeError, OSError): pass
+        frame = self.encode_frame(data_dict, protocol)
+        try: writer.write(frame); await asyncio.wait_for(writer.drain(), timeout=SEND_TIMEOUT)
+        except (ConnectionResetError, BrokenPipeError, OSError, asyncio.TimeoutError): pass
 
     async def send_data(self, username: str, writer: asyncio.StreamWriter, data_dict: dict):
-        if writer.is_closing(): return
-        try:
-            message = json.dumps(data_dict).encode('utf-8') + PACKET_TERMINATOR
-            writer.write(message); await writer.drain()
-        except (ConnectionResetError, BrokenPipeError, OSError) as e:
-            warn(f"Network error for {username} ({type(e).__name__}). Scheduling cleanup."); asyncio.create_task(self._force_cleanup_player(username))
-        except Exception as e: error(f"Unexpected error in send_data for {username}: {e}")
+        player_data = self.state.players.get(username)
+        if not player_data: return
+        try: frame = self.encode_frame(data_dict, player_data["protocol"])
+        except Exception as e: error(f"Unexpected error in send_data for {username}: {e}"); return
+        self.queue_frame(username, frame)
+
+    def queue_frame(self, username: str, frame: bytes, snapshot: bool = False, service: str = "Other"):
+        """Hands an encoded frame to the player's writer task. Snapshots may be superseded; other frames are kept in order."""
+        player_data = self.state.players.get(username)
+        sender = player_data.get("sender") if player_data else None
+        if sender is None: return
+        if snapshot: sender.put_snapshot(frame)
+        else: sender.put(frame)
+        metrics.SENT_BYTES.inc(len(frame), service); metrics.SENT_PACKETS.inc(1, service)
+
+    def _on_send_failure(self, username: str, reason: str):
+        warn(f"Send queue for {username} failed ({reason}). Scheduling cleanup."); asyncio.create_task(self._force_cleanup_player(username))
 
     async def _force_cleanup_player(self, username: str):
         player_data = self.state.players.get(username)
@@ -226,70 +508,229 @@ class Server:
             await self._cleanup_client(username, writer, api_player)
 
     async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
-        addr = writer.get_extra_info('peername'); log(f"Incoming connection from {addr[0]}")
+        addr = writer.get_extra_info('peername')
+        if not self._accept_connection(addr[0], writer): return
+        log(f"Incoming connection from {addr[0]}")
         username = None; api_player = None
         try:
             username, api_player = await self._authenticate_client(reader, writer, addr)
             await self._client_loop(username, reader, writer)
-        except (ConnectionResetError, asyncio.IncompleteReadError, BrokenPipeError, ConnectionAbortedError, asyncio.TimeoutError, json.JSONDecodeError, OSError) as e:
+        except (ConnectionResetError, asyncio.IncompleteReadError, BrokenPipeError, ConnectionAbortedError, asyncio.TimeoutError, OSError, *codec.DECODE_ERRORS) as e:
             error_source = f"{username or addr[0]}"
-            if isinstance(e, ConnectionAbortedError): warn(f"Connection from {error_source} aborted.")
+            if isinstance(e, ConnectionAbortedError): warn(f"Connection from {error_source} aborted.", key="connection-aborted")
             else: log(f"Connection with {error_source} lost: {type(e).__name__}")
         finally: await self._cleanup_client(username, writer, api_player)
     
+    def _accept_connection(self, ip_address: str, writer: asyncio.StreamWriter) -> bool:
+        """Ban and rate checks on a freshly accepted socket, before anything is read or parsed.
+        Rejections are counted, not logged, so a flood cannot fill the log."""
+        ban_reason = self.state.is_ip_banned(ip_address)
+        if ban_reason is not None:
+            metrics.CONNECTIONS_REJECTED.inc(1, "banned")
+            if self.connect_limiter.allow(ip_address):
+                kick_message = f"Địa chỉ IP của bạn đã bị cấm. Lý do: {ban_reason}"
+                writer.write(self.encode_frame({"!!VoscriptPluginData":[f"PopupWindow({kick_message},Đóng)"]})); writer.close()
+            else: writer.transport.abort()
+            return False
+        if not self.connect_limiter.allow(ip_address):
+            metrics.CONNECTIONS_REJECTED.inc(1, "rate_limited"); writer.transport.abort(); return False
+        return True
+
     async def _authenticate_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, addr: Tuple[str, int]) -> Tuple[str, APIPlayer]:
-        try: first_packet = await asyncio.wait_for(reader.readuntil(PACKET_TERMINATOR), timeout=10.0)
-        except asyncio.TimeoutError: raise ConnectionAbortedError("Client did not send initial data in time.")
+        timeout = self.timers.schedule(self.handshake_timeout, writer.transport.abort)
+        try: first_packet = await reader.readuntil(PACKET_TERMINATOR)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            if timeout.fired: raise ConnectionAbortedError("Client did not send initial data in time.")
+            raise
+        finally: timeout.cancel()
         
-        first_data = json.loads(first_packet.rstrip(PACKET_TERMINATOR))
+        first_data = codec.loads(first_packet.rstrip(PACKET_TERMINATOR))
         username, plane_type = first_data.get("Username"), first_data.get("PlaneType"); ip_address = addr[0]
+        delta_mode = first_data.get("Delta") is True; incremental_chat = first_data.get("IncrementalChat") is True
+        # Dead reckoning is a kind of delta mode; a client asking for it gets delta snapshots whether or not it asked.
+        dead_reckoning = self.dead_reckoning is not None and first_data.get("DeadReckoning") is True; delta_mode = delta_mode or dead_reckoning
+        protocol = wire.PROTOCOL_BINARY if first_data.get("Protocol") == wire.PROTOCOL_BINARY else wire.PROTOCOL_JSON
+        use_udp = self.udp is not None and first_data.get("Udp") is True
+        compression_algorithm = compression.negotiate(first_data.get("Compression"), self.compression_algorithms)
+        compression_dictionary = self.compression_dictionary if compression_algorithm and self.compression_dictionary_id and first_data.get("CompressionDictionary") == self.compression_dictionary_id else b""
 
-        ip_ban_reason = self.state.is_ip_banned(ip_address)
-        if ip_ban_reason:
-            kick_message = f"Địa chỉ IP của bạn đã bị cấm. Lý do: {ip_ban_reason}"
-            await self.send_data_unprotected(writer, {"!!VoscriptPluginData":[f"PopupWindow({kick_message},Đóng)"]})
-            raise ConnectionAbortedError(f"Banned IP '{ip_address}' tried to connect. Reason: {ip_ban_reason}")
+        if not self.handshake_limiter.allow(ip_address):
+            metrics.CONNECTIONS_REJECTED.inc(1, "handshake_rate_limited"); raise ConnectionAbortedError(f"Too many handshakes from {ip_address}")
         
         if not username or not self.state.validate_username(username):
             await self.send_data_unprotected(writer, {"!!VoscriptPluginData":["PopupWindow(Ngắt kết nối: Tên người dùng không hợp lệ.,Đóng)"]}); raise ConnectionAbortedError("Invalid username")
         if username in self.state.players:
             await self.send_data_unprotected(writer, {"!!VoscriptPluginData":["PopupWindow(Ngắt kết nối: Tên người dùng này đã có người chơi.,Đóng)"]}); raise ConnectionAbortedError("Username already online")
         if not plane_type or not self.state._validate_plane_type(plane_type): raise ConnectionAbortedError("Invalid plane type")
+        if self.shard and not await self.shard.claim(username, addr, protocol):
+            await self.send_data_unprotected(writer, {"!!VoscriptPluginData":["PopupWindow(Ngắt kết nối: Tên người dùng này đã có người chơi.,Đóng)"]}); raise ConnectionAbortedError("Username already online")
         
-        api_player = APIPlayer(username, writer, self); self.state.add_player(username, writer, api_player, addr, plane_type)
-        log(f"Connection from {addr[0]} accepted as {username}")
+        api_player = APIPlayer(username, writer, self, protocol)
+        sender = SendQueue(writer, lambda reason: self._on_send_failure(username, reason), self.send_backlog_deadline)
+        self.state.add_player(username, writer, api_player, addr, plane_type, delta_mode, protocol, sender, incremental_chat, dead_reckoning)
+        udp_session = self.state.players[username]["udp"] = self.udp.open(username) if use_udp else None
+        options = [label for enabled, label in ((delta_mode, "delta snapshots"), (protocol == wire.PROTOCOL_BINARY, "binary protocol"), (incremental_chat, "incremental chat"),
+                                                (dead_reckoning, "dead reckoning"), (use_udp, "UDP"), (compression_algorithm, f"{compression_algorithm} compression")) if enabled]
+        log(f"Connection from {addr[0]} accepted as {username}" + (f" ({', '.join(options)})" if options else ""))
+        # The welcome is always JSON; a binary client switches framing after reading "Protocol": 2 here.
         welcome_msg = {"Message": "Connection validated", "!!VoscriptPluginData": ["PopupWindow(Chào mừng đến với server!,Đóng)"]}
-        await self.send_data_unprotected(writer, welcome_msg)
-        asyncio.create_task(self.api.PlayerConnected.invoke(api_player)); return username, api_player
+        if delta_mode: welcome_msg["Delta"] = True
+        if protocol == wire.PROTOCOL_BINARY: welcome_msg["Protocol"] = protocol
+        if incremental_chat: welcome_msg["IncrementalChat"] = True
+        if dead_reckoning: welcome_msg["DeadReckoning"] = True
+        # Positions and snapshots move to UDP once the client's first datagram with this token arrives.
+        if udp_session: welcome_msg["Udp"] = {"Port": self.udp.port, "Token": udp_session.token}
+        if compression_algorithm: welcome_msg["Compression"] = {"Algorithm": compression_algorithm, "Dictionary": compression.dictionary_id(compression_dictionary)}
+        # Queued before any tick can see the player, so it always goes out ahead of the first snapshot.
+        sender.put(self.encode_frame(welcome_msg))
+        # The welcome itself is sent as is; compression starts with the next byte (datagrams are never compressed).
+        if compression_algorithm: sender.set_compressor(compression.StreamCompressor(compression_algorithm, self.compression_level, compression_dictionary))
+        self.api.PlayerConnected.fire(api_player); return username, api_player
     
     async def _client_loop(self, username: str, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
-        buffer = b""
+        player_data = self.state.players.get(username)
+        binary = bool(player_data) and player_data["protocol"] == wire.PROTOCOL_BINARY
+        if binary:
+            framer, process = framing.LengthPrefixedFramer(wire.FRAME_LENGTH, MAX_BUFFER_SIZE), self._process_binary_packet
+        else: framer, process = framing.TerminatorFramer(PACKET_TERMINATOR, MAX_BUFFER_SIZE), self._process_incoming_packet
+        # No timer per read: the idle timer compares last_read and the last position time when it fires.
+        if player_data and (self.position_timeout > 0 or self.idle_timeout > 0):
+            player_data["last_read"] = time.perf_counter(); player_data["idle_timer"] = self.timers.schedule(self._idle_delay(), self._check_idle, username, player_data)
+        budget = None
+        if player_data: budget = player_data["inbound"] = ratelimit.InboundBudget(*self.inbound_budget)
         while not writer.is_closing():
             if username in self.state.disconnecting_players: break
-            data = await asyncio.wait_for(reader.read(4096), timeout=60.0)
+            data = await reader.read(4096)
             if not data: break
-            buffer += data
-            if len(buffer) > MAX_BUFFER_SIZE: raise ConnectionAbortedError("Buffer size limit exceeded.")
-            while PACKET_TERMINATOR in buffer:
-                packet, buffer = buffer.split(PACKET_TERMINATOR, 1); await self._process_incoming_packet(username, packet)
+            now = time.monotonic(); over = budget is not None and not budget.read(len(data), now)
+            if player_data: player_data["last_read"] = time.perf_counter()
+            packets = framer.feed(data); latest = None; coalesced = coalesced_bytes = shed = shed_bytes = 0
+            # Only the newest position in a read matters for the next tick; the ones before it are dropped undecoded.
+            # That one is decoded even over budget, so a throttled client still moves once per read.
+            for packet in packets:
+                if self._is_position_packet(packet, binary):
+                    if latest is not None: coalesced += 1; coalesced_bytes += len(latest)
+                    latest = packet
+                elif over or (budget is not None and not budget.packet(now)): over = True; shed += 1; shed_bytes += len(packet)
+                else: await process(username, packet)
+            if latest is not None:
+                if budget is not None and not budget.packet(now): over = True
+                await process(username, latest)
+            if coalesced: metrics.INBOUND_SHED_PACKETS.inc(coalesced, "coalesced"); metrics.INBOUND_SHED_BYTES.inc(coalesced_bytes, "coalesced")
+            if shed: metrics.INBOUND_SHED_PACKETS.inc(shed, "budget"); metrics.INBOUND_SHED_BYTES.inc(shed_bytes, "budget")
+            if budget is None: continue
+            if not over: budget.over_since = None; continue
+            if budget.over_since is None: budget.over_since = now; warn(f"Throttling {username}: over the inbound budget.", key="inbound-throttle")
+            elif self.inbound_kick_after > 0 and now - budget.over_since >= self.inbound_kick_after:
+                warn(f"Kicking {username}: over the inbound budget for {self.inbound_kick_after:g}s."); metrics.INBOUND_KICKS.inc()
+                await player_data["api_player"].Kick("Bạn gửi dữ liệu quá nhanh!"); break
+            # Not reading lets TCP push back on the client instead of the server buffering or decoding its flood.
+            delay = min(budget.delay(), INBOUND_MAX_THROTTLE)
+            if delay > 0: metrics.INBOUND_THROTTLE_SECONDS.inc(delay); await asyncio.sleep(delay)
     
     async def _cleanup_client(self, username: Optional[str], writer: asyncio.StreamWriter, api_player: Optional[APIPlayer]):
         if username and username in self.state.players and username not in self.state.disconnecting_players:
             log(f"Player {username} disconnected. Scheduling for reaping.")
             self.state.disconnecting_players.add(username)
-            if api_player: asyncio.create_task(self.api.PlayerDisconnected.invoke(api_player))
+            player_data = self.state.players[username]
+            if player_data.get("sender"): player_data["sender"].close()
+            if player_data.get("idle_timer"): player_data["idle_timer"].cancel()
+            if player_data.get("udp"): self.udp.close_session(player_data["udp"])
+            self.timers.schedule(self.reap_delay, self._reap_player, username, player_data)
+            if api_player: self.api.PlayerDisconnected.fire(api_player)
+            if self.shard: self.shard.left(username)
         if not writer.is_closing():
             try: writer.close(); await writer.wait_closed()
             except (ConnectionResetError, BrokenPipeError, OSError): pass
     
-    async def _process_incoming_packet(self, username: str, packet: bytes):
+    def _idle_delay(self) -> float: return min(t for t in (self.position_timeout, self.idle_timeout) if t > 0)
+
+    def _check_idle(self, username: str, player_data: Dict[str, Any]):
+        if self.state.players.get(username) is not player_data or username in self.state.disconnecting_players: return
+        now = time.perf_counter(); deadlines = []
+        if self.position_timeout > 0 and username in self.state.player_table:
+            deadlines.append((self.state.player_table.get_recv_time(username) + self.position_timeout, f"no position data for {self.position_timeout:g}s"))
+        if self.idle_timeout > 0: deadlines.append((player_data["last_read"] + self.idle_timeout, f"nothing received for {self.idle_timeout:g}s"))
+        if not deadlines: return
+        deadline, reason = min(deadlines)
+        if now >= deadline:
+            # Aborting ends the pending read at once; _client_loop's cleanup then schedules the reap as usual.
+            log(f"Player {username} timed out ({reason}).")
+            if player_data.get("sender"): player_data["sender"].close()
+            player_data["writer"].transport.abort()
+        else: player_data["idle_timer"] = self.timers.schedule(deadline - now, self._check_idle, username, player_data)
+
+    def _reap_player(self, username: str, player_data: Dict[str, Any]):
+        if self.state.players.get(username) is player_data and username in self.state.disconnecting_players:
+            self.state.remove_player_fully(username)
+            if self.shard: self.shard.reaped(username)
+
+    async def _process_binary_packet(self, username: str, body: memoryview):
+        if username not in self.state.players: return
+        start = time.perf_counter()
+        try: data = wire.decode_client_message(body, self.state.PlaneTypes)
+        except (UnicodeDecodeError, *codec.DECODE_ERRORS) as e: warn(f"Received malformed binary packet from {username}: {e}", key="malformed-binary"); return
+        finally: metrics.DECODE_SECONDS.inc(time.perf_counter() - start, "binary")
+        self._count_received(data, len(body) + wire.FRAME_LENGTH.size)
+        await self._dispatch_packet(username, data)
+
+    async def _process_incoming_packet(self, username: str, packet: memoryview):
         if username not in self.state.players: return
-        try: data = json.loads(packet)
-        except json.JSONDecodeError: warn(f"Received malformed JSON from {username}."); return
-        if "PositionService" in data:
-            self.state.update_player_position(username, data)
+        start = time.perf_counter()
+        try: data = codec.loads(packet)
+        except codec.DECODE_ERRORS: warn(f"Received malformed JSON from {username}.", key="malformed-json"); return
+        finally: metrics.DECODE_SECONDS.inc(time.perf_counter() - start, "json")
+        self._count_received(data, len(packet) + len(PACKET_TERMINATOR))
+        await self._dispatch_packet(username, data)
+
+    @staticmethod
+    def _is_position_packet(packet: Union[bytes, memoryview], binary: bool) -> bool:
+        """Whether a packet carries a position and nothing else, judged from its bytes without decoding it."""
+        if binary: return len(packet) > 0 and packet[0] == wire.MSG_POSITION
+        return POSITION_ONLY_PACKET.fullmatch(packet) is not None
+
+    @staticmethod
+    def _count_received(data: Any, size: int):
+        # A packet carrying both services is counted under PositionService, which dominates inbound traffic.
+        if not isinstance(data, dict): service = "Other"
+        elif "PositionService" in data: service = "PositionService"
+        elif "ChatService" in data: service = "ChatService"
+        else: service = "Other"
+        metrics.RECEIVED_BYTES.inc(size, service); metrics.RECEIVED_PACKETS.inc(1, service)
+
+    def _process_datagram(self, session: udp.UdpSession, frame: memoryview):
+        """One frame from the UDP channel; only PositionService is taken from it."""
+        username = session.username; player_data = self.state.players.get(username)
+        if player_data is None or username in self.state.disconnecting_players: return
+        # Datagrams are shed, not throttled, when over budget: there is no stream to push back on.
+        budget = player_data.get("inbound"); now = time.monotonic()
+        if budget is not None and not (budget.read(len(frame), now) and budget.packet(now)):
+            metrics.INBOUND_SHED_PACKETS.inc(1, "budget"); metrics.INBOUND_SHED_BYTES.inc(len(frame), "budget"); return
+        binary = player_data["protocol"] == wire.PROTOCOL_BINARY; start = time.perf_counter()
+        try:
+            if binary:
+                if len(frame) < wire.FRAME_LENGTH.size or wire.FRAME_LENGTH.unpack_from(frame)[0] != len(frame) - wire.FRAME_LENGTH.size: raise ValueError("bad frame length")
+                data = wire.decode_client_message(frame[wire.FRAME_LENGTH.size:], self.state.PlaneTypes)
+            else: data = codec.loads(frame[:-1] if frame[-1:] == PACKET_TERMINATOR else frame)
+        except (UnicodeDecodeError, *codec.DECODE_ERRORS) as e: warn(f"Received malformed datagram from {username}: {e}", key="malformed-datagram"); return
+        finally: metrics.DECODE_SECONDS.inc(time.perf_counter() - start, "binary" if binary else "json")
+        player_data["last_read"] = time.perf_counter()
+        if isinstance(data, dict) and "PositionService" in data:
+            metrics.RECEIVED_BYTES.inc(len(frame), "PositionService"); metrics.RECEIVED_PACKETS.inc(1, "PositionService")
+            self._handle_position(username, data)
+
+    def _handle_position(self, username: str, data: dict):
+        self._handle_snapshot_ack(username, data.get("PositionService"))
+        self.state.update_player_position(username, data)
+        data_received = self.api.DataReceived
+        if data_received.has_subscribers:
             player_api = self.state.get_api_player(username)
-            if player_api: asyncio.create_task(self.api.DataReceived.invoke(player_api, self.state.player_positions.get(username)))
+            # A copy: the live entry is updated in place, and subscribers on pool threads may keep what they were given.
+            entry = self.state.player_positions.get(username)
+            if player_api and entry: data_received.post(username, player_api, [*entry[:3], dict(entry[3]), *entry[4:]])
+
+    async def _dispatch_packet(self, username: str, data: dict):
+        if "PositionService" in data: self._handle_position(username, data)
         if "ChatService" in data:
             chat_block = data.get("ChatService")
             if chat_block and isinstance(chat_block, dict) and "Pending" in chat_block:
@@ -300,39 +741,192 @@ class Server:
         if not message_clean: return
         is_valid, error_msg = self.state.validate_chat_message(author, message_clean)
         if is_valid:
-            log(f"CHAT: [{author}] {message_clean}"); self.state.add_chat_message(author, message_clean)
+            is_valid, filtered = self.chat_filter.filter(message_clean)
+            if is_valid: message_clean = filtered
+            else: error_msg = "Tin nhắn của bạn chứa từ cấm!"
+        if is_valid:
+            log(f"CHAT: [{author}] {message_clean}")
+            # Sharded: the coordinator orders chat and sends it back to every worker, this one included.
+            if self.shard: self.shard.chat(author, message_clean)
+            else: self.state.add_chat_message(author, message_clean)
+            if self.recorder: self.recorder.chat(author, message_clean)
         else:
             player_data = self.state.players.get(author)
             if player_data and not player_data["writer"].is_closing():
                 error_chat_string = f"[Server] Lỗi: {error_msg}\n" + self.state.get_chat_string()
                 error_packet = {"ChatService": {"Chat": error_chat_string}}
-                await self.send_data_unprotected(player_data["writer"], error_packet)
+                if player_data["incremental_chat"]: error_packet["ChatService"]["ChatSeq"] = self.state.chat_log.seq
+                self.queue_frame(author, self.encode_frame(error_packet, player_data["protocol"]), service="ChatService")
 
     async def _broadcast_packet(self, data_dict: dict):
-        players_snapshot = list(self.state.players.items())
-        tasks = [self.send_data(username, player_data['writer'], data_dict) for username, player_data in players_snapshot]
-        if tasks: await asyncio.gather(*tasks)
+        # Serialize once per protocol; every writer gets the same immutable buffer.
+        frames: Dict[int, bytes] = {}
+        for username, player_data in list(self.state.players.items()):
+            protocol = player_data["protocol"]
+            if protocol not in frames: frames[protocol] = self.encode_frame(data_dict, protocol)
+            self.queue_frame(username, frames[protocol])
+
+    def _handle_snapshot_ack(self, username: str, position_block: Any):
+        player_data = self.state.players.get(username)
+        if not (player_data and player_data.get("delta") and isinstance(position_block, dict)): return
+        ack = position_block.get("Ack")
+        if type(ack) is int and ack in self._snapshot_history and ack > (player_data["delta"]["acked"] or 0): player_data["delta"]["acked"] = ack
+
+    def _record_snapshot(self) -> Tuple[int, Dict[str, int]]:
+        self._snapshot_seq += 1; snapshot = self.state.player_table.versions_snapshot()
+        self._snapshot_history[self._snapshot_seq] = snapshot
+        while len(self._snapshot_history) > self._snapshot_history_length: del self._snapshot_history[next(iter(self._snapshot_history))]
+        if self.dead_reckoning is not None:
+            self._reckoned_history[self._snapshot_seq] = self.dead_reckoning.update(snapshot, time.perf_counter())
+            while len(self._reckoned_history) > self._snapshot_history_length: del self._reckoned_history[next(iter(self._reckoned_history))]
+        return self._snapshot_seq, snapshot
+
+    def _delta_positions(self, base: Dict[str, int], snapshot: Dict[str, int], positions: Optional[Dict[str, List[Any]]] = None) -> Tuple[Dict[str, List[Any]], List[str]]:
+        if positions is None: positions = self.state.player_positions
+        changed = {u: positions[u] for u, v in snapshot.items() if base.get(u) != v and u in positions}
+        return changed, [u for u in base if u not in snapshot]
+
+    def _broadcast_world_state(self):
+        seq, snapshot = self._record_snapshot(); now = time.perf_counter()
+        timestamps = {"TimestampFormatted": time.strftime("%H:%M:%S"), "TimestampEpoch": time.mktime(time.localtime()), "CurrentServerTime": now}
+        common = {"PlayerService": {"Players": self.state.get_all_player_names()}}
+        # Near-only tick: each delta client sees the changes of the players in the grid cells around its own. Full-view clients
+        # replace their whole set with every frame, so a near-only one would make far players vanish until the next far tick.
+        interest_tick = self.interest_radius > 0 and seq % self._interest_far_every != 0; grid = self.state.spatial_grid
+        # Clients sharing a view (protocol, grid cell plus full, keyframe, or the same acked baseline, live or dead-reckoned)
+        # share one encoded frame. Dead-reckoned views are built from the published entries and their versions.
+        reckoned_snapshot = self._reckoned_history.get(seq)
+        frames: Dict[Tuple[int, Any, Any, bool], bytes] = {}; frame_sizes: Dict[Tuple[int, Any, Any, bool], Dict[str, int]] = {}; recipients: Dict[Tuple[int, Any, Any, bool], int] = {}
+        def frame_for(protocol: int, cell: Any, view: Any, reckoned: bool) -> bytes:
+            key = (protocol, cell, view, reckoned)
+            recipients[key] = recipients.get(key, 0) + 1
+            if key not in frames:
+                start = time.perf_counter()
+                if reckoned: positions, history, current, encoder = self.dead_reckoning.entries, self._reckoned_history, reckoned_snapshot, self._reckoned_encoder
+                else: positions, history, current, encoder = self.state.player_positions, self._snapshot_history, snapshot, self._snapshot_encoder
+                removed = []
+                if cell is not None: positions = {u: positions[u] for u in grid.keys_near_cell(cell, self._interest_reach) if u in positions}
+                if view == "full": position_block = {"Positions": positions, **timestamps}
+                elif view == "keyframe": position_block = {"Positions": positions, "Seq": seq, "Keyframe": True, **timestamps}
+                else:
+                    changed, removed = self._delta_positions(history[view], current, positions)
+                    if cell is not None: changed = {u: entry for u, entry in changed.items() if u in positions}
+                    position_block = {"Positions": changed, "Removed": removed, "Seq": seq, "Base": view, **timestamps}
+                if protocol == wire.PROTOCOL_BINARY:
+                    # The binary snapshot carries the player list too, so it is all counted as PositionService.
+                    frames[key] = encoder.encode(common["PlayerService"]["Players"], position_block["Positions"], removed, position_block.get("Seq", 0),
+                                                 view if isinstance(view, int) else 0, view == "keyframe", now, timestamps["TimestampEpoch"])
+                    frame_sizes[key] = {"PositionService": len(frames[key])}
+                else: frames[key], frame_sizes[key] = self.encode_services({"PlayerService": common["PlayerService"], "PositionService": position_block})
+                metrics.ENCODE_SECONDS.inc(time.perf_counter() - start, "binary" if protocol == wire.PROTOCOL_BINARY else "json")
+            return frames[key]
+        # Chat is not part of the snapshot: it goes out as a reliable frame, and only to clients behind chat_log.seq,
+        # so a superseded snapshot cannot lose lines and a quiet server sends no ChatService at all.
+        chat_log = self.state.chat_log; chat_seq = chat_log.seq; chat_frames: Dict[Tuple[int, bool, int], bytes] = {}; chat_sent, chat_bytes = 0, 0
+        def chat_frame_for(protocol: int, incremental: bool, delivered: int) -> bytes:
+            lines = chat_log.lines_since(delivered, CHAT_HISTORY_LINES) if incremental else None
+            key = (protocol, incremental, delivered if lines is not None else -1)
+            if key not in chat_frames:
+                start = time.perf_counter()
+                if lines is not None: chat_frames[key] = self.encode_frame({"ChatService": {"Lines": lines, "ChatSeq": chat_seq}}, protocol)
+                elif incremental: chat_frames[key] = self.encode_frame({"ChatService": {"Chat": chat_log.render(CHAT_HISTORY_LINES), "ChatSeq": chat_seq}}, protocol)
+                elif protocol == wire.PROTOCOL_BINARY: chat_frames[key] = wire.encode_chat(chat_log.render(CHAT_HISTORY_LINES))
+                else: chat_frames[key] = self.encode_frame({"ChatService": {"Chat": chat_log.render(CHAT_HISTORY_LINES)}})
+                metrics.ENCODE_SECONDS.inc(time.perf_counter() - start, "binary" if protocol == wire.PROTOCOL_BINARY else "json")
+            return chat_frames[key]
+        for username, player_data in list(self.state.players.items()):
+            sender = player_data.get("sender")
+            if sender is None or sender.closed: continue
+            delta = player_data.get("delta"); reckoned = delta is not None and delta["reckoned"]
+            # Far ticks resync delta clients with a keyframe, since near ticks withheld far players' changes.
+            if delta is not None and (delta["acked"] not in (self._reckoned_history if reckoned else self._snapshot_history) or now - delta["keyframe_time"] >= self.delta_keyframe_interval or (self.interest_radius > 0 and not interest_tick)):
+                cell, view = None, "keyframe"; delta["keyframe_time"] = now
+            elif delta is None: cell, view = None, "full"
+            else: cell, view = grid.cell_of(username) if interest_tick else None, delta["acked"]
+            frame = frame_for(player_data["protocol"], cell, view, reckoned); udp_session = player_data.get("udp")
+            if udp_session is None or not self.udp.send(udp_session, frame): sender.put_snapshot(frame)
+            if player_data["chat_seq"] != chat_seq:
+                chat_frame = chat_frame_for(player_data["protocol"], player_data["incremental_chat"], player_data["chat_seq"])
+                sender.put(chat_frame); player_data["chat_seq"] = chat_seq; chat_sent += 1; chat_bytes += len(chat_frame)
+        for key, count in recipients.items():
+            for service, size in frame_sizes[key].items(): metrics.SENT_BYTES.inc(size * count, service); metrics.SENT_PACKETS.inc(count, service)
+        if chat_sent: metrics.SENT_BYTES.inc(chat_bytes, "ChatService"); metrics.SENT_PACKETS.inc(chat_sent, "ChatService")
 
     async def _data_polling_loop(self):
-        while True:
-            await asyncio.sleep(self.update_interval)
-            try:
-                if not self.state.players: continue
-                service_block = {
-                    "PlayerService": {"Players": self.state.get_all_player_names()},
-                    "PositionService": {"Positions": self.state.player_positions, "TimestampFormatted": time.strftime("%H:%M:%S"), "TimestampEpoch": time.mktime(time.localtime()), "CurrentServerTime": time.perf_counter()},
-                    "ChatService": {"Chat": self.state.get_chat_string()}
-                }; await self._broadcast_packet(service_block)
-            except Exception as e: error(f"CRITICAL Error in data_polling_loop: {e}")
+        await self.tick_scheduler.run(self._run_tick)
+
+    def _run_tick(self):
+        try: self.timers.advance()
+        except Exception as e: error(f"Error in timer callback: {e}")
+        if self.shard:
+            try: self.shard.apply()
+            except Exception as e: error(f"Shard update error: {e}")
+        try:
+            if self.state.players: self._broadcast_world_state()
+        except Exception as e: error(f"CRITICAL Error in data_polling_loop: {e}")
+        if self.shard:
+            try: self.shard.publish(self._snapshot_history.get(self._snapshot_seq) or self.state.player_table.versions_snapshot())
+            except Exception as e: error(f"Shard publish error: {e}")
+        if self.recorder:
+            try: self.recorder.capture()
+            except Exception as e: error(f"Flight recorder error: {e}")
+        self.api.DataReceived.flush()
+        if self.tick_summary_interval > 0 and time.perf_counter() - self._last_tick_summary >= self.tick_summary_interval:
+            self._last_tick_summary = time.perf_counter(); log(self.tick_scheduler.summary())
+            compression_summary = compression.summary()
+            if compression_summary: log(compression_summary)
+            inbound_summary = self._inbound_summary()
+            if inbound_summary: log(inbound_summary)
     
-    async def _reap_disconnected_players_loop(self):
-        await asyncio.sleep(PLAYER_REAP_DELAY)
+    def _inbound_summary(self) -> Optional[str]:
+        """Packets dropped undecoded, time spent throttled and kicks since the previous call; None if there were none."""
+        current = (metrics.INBOUND_SHED_PACKETS.values.get(("coalesced",), 0.0), metrics.INBOUND_SHED_PACKETS.values.get(("budget",), 0.0),
+                   metrics.INBOUND_THROTTLE_SECONDS.values.get((), 0.0), metrics.INBOUND_KICKS.values.get((), 0.0))
+        coalesced, shed, throttled, kicks = (now - last for now, last in zip(current, self._inbound_reported)); self._inbound_reported = current
+        if not (coalesced or shed or kicks): return None
+        return f"Inbound: {coalesced:.0f} positions coalesced, {shed:.0f} packets shed over budget, {throttled:.1f}s throttled, {kicks:.0f} kicked"
+
+    async def _chat_filter_reload_loop(self):
+        # Stat and rebuild off the event loop; the filter swaps in the new automaton only once it is built.
         while True:
-            await asyncio.sleep(PLAYER_REAP_DELAY)
-            if not self.state.disconnecting_players: continue
-            players_to_reap = list(self.state.disconnecting_players)
-            log(f"Reaper task running. Found {len(players_to_reap)} players to reap.")
-            for username in players_to_reap: self.state.remove_player_fully(username)
+            await asyncio.sleep(self.chat_filter_reload_interval)
+            try: await asyncio.to_thread(self.chat_filter.reload_if_changed)
+            except Exception as e: error(f"Chat filter reload failed: {e}")
+
+def _shard_worker_main(config: Dict[str, Any], worker_id: int, sock: Any):
+    # Ctrl+C reaches the whole process group; workers stop when the coordinator closes their link instead.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    config = dict(config)
+    if config.get("logFile"): root, extension = os.path.splitext(config["logFile"]); config["logFile"] = f"{root}-shard{worker_id}{extension}"
+    config["metricsPort"] = config.get("metricsPort", METRICS_PORT) + worker_id
+    # UDP has no accept step to spread sessions across workers, so each worker gets its own port (given in the welcome).
+    if config.get("udpPort"): config["udpPort"] += worker_id
+    asyncio.run(_shard_worker(config, worker_id, sock))
+
+async def _shard_worker(config: Dict[str, Any], worker_id: int, sock: Any):
+    server = Server(config, shard.ShardLink(sock, worker_id))
+    try: await server.start()
+    finally: await server.shutdown(); serverlog.close()
+
+async def run_sharded(settings: Dict[str, Any], workers: int):
+    """shardWorkers > 1: this process only coordinates; each worker serves hostPort (and metricsPort + its index)."""
+    configure_logging(settings)
+    bold(f"TFS Multiplayer Server v{version} (sharded, {workers} workers)\n")
+    if settings.get("recordDirectory"):
+        warn("The flight recorder is not supported in sharded mode; recordDirectory ignored."); settings = {k: v for k, v in settings.items() if k != "recordDirectory"}
+    coordinator = shard.ShardCoordinator(settings, workers, _shard_worker_main, settings.get("updateInterval", 0.05), warn, log)
+    executor = ThreadPoolExecutor(max_workers=settings.get("pluginThreads", PLUGIN_THREADS), thread_name_prefix="plugin")
+    coordinator.api = shard.ShardAPI(coordinator, executor, settings.get("pluginCallbackTimeout", events.PLUGIN_CALLBACK_TIMEOUT))
+    supervisor = pluginhost.PluginSupervisor(coordinator.api, settings.get("pluginSnapshotInterval", pluginhost.SNAPSHOT_INTERVAL), settings.get("pluginCpuBudget", pluginhost.CPU_BUDGET), warn)
+    plugin_manager = PluginManager(coordinator.api, settings.get("pluginIsolation", False), supervisor)
+    try:
+        await coordinator.start(); debug("Setting up serverside plugins...")
+        await plugin_manager.LoadAllPlugins()
+        await asyncio.Event().wait()
+    finally:
+        log("Stopping shard workers...")
+        await coordinator.stop(); await plugin_manager.shutdown(); executor.shutdown(wait=False, cancel_futures=True)
+        log("Graceful shutdown complete."); serverlog.close()
 
 async def main():
     config_path = os.path.join(script_directory, "config.json")
@@ -343,6 +937,11 @@ async def main():
     except json.JSONDecodeError:
         print(f"{Fore.RED}[ERROR] Corrupted config.json!"); sys.exit(1)
     
+    # shardWorkers > 1 runs that many worker processes sharing hostPort (Linux/BSD SO_REUSEPORT).
+    workers = settings.get("shardWorkers", 1)
+    if workers > 1:
+        if shard.supported(): await run_sharded(settings, workers); return
+        print(f"{Fore.YELLOW}[WARN] shardWorkers needs SO_REUSEPORT, which this platform lacks; running a single process.")
     server = Server(settings)
     try:
         await server.start()
@@ -350,7 +949,7 @@ async def main():
         log("Shutdown initiated by user (Ctrl+C).")
     finally:
         log("Calling shutdown routine...")
-        await server.shutdown()
+        await server.shutdown(); serverlog.close()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,336 @@
+# file: loadgen.py
+# Headless TFSMP clients for load tests and release-to-release benchmarks.
+#   Against a running server:  python loadgen.py --port 12345 --players 100 --duration 30 [--server-pid PID]
+#   (a running server applies its per-IP connectRate/handshakeRate limits; set both to 0 in its config for large runs)
+#   Repeatable benchmark:      python loadgen.py --bench --players 10 100 500 --output results.json
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import struct
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import compression
+import framing
+import index
+import udp
+import wire
+from pluginhost import process_cpu_seconds
+from spatial import parse_vector3
+
+PLANE_TYPES = list(index.PLANE_TYPES)
+FLYABLE_PLANE_TYPES = [p for p in PLANE_TYPES if p != "None"]
+CHAT_LINES = ["xin chào mọi người", "ai bay cùng không?", "hạ cánh ở sân bay nào?", "đang lên độ cao", "ok", "cảm ơn nhé", "bay vòng thêm một lượt"]
+# Runs one server in a child process so its CPU time can be read from /proc separately from the clients'.
+# Like bench.py, it keeps banned_ips.json in a temporary directory.
+SERVER_BOOT = ("import asyncio, json, os, sys, tempfile; import index; "
+               "index.BANNED_IPS_FILE = os.path.join(tempfile.mkdtemp(prefix='tfsmp-load-'), 'banned_ips.json'); "
+               "asyncio.run(index.Server(json.loads(sys.argv[1])).start())")
+CLIENTS_PER_PROCESS = 100
+MAX_PENDING_PROBES = 64
+DICTIONARY = compression.load_dictionary(os.path.join(index.script_directory, compression.DICTIONARY_FILE))
+_VECTOR = struct.Struct('<3f')
+
+class Recorder:
+    """Counters for one load process; only traffic inside the measurement window is counted."""
+    def __init__(self):
+        self.measuring = False; self.latencies: List[float] = []
+        self.connected = 0; self.failed = 0; self.disconnected = 0
+        self.snapshots = 0; self.bytes_received = 0; self.positions_sent = 0; self.chats_sent = 0
+        self.client_snapshots: List[int] = []
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {k: v for k, v in vars(self).items() if k != "measuring"}
+
+class FlightPath:
+    """Constant-speed circle at a fixed altitude; yaw follows the direction of travel."""
+    def __init__(self, rng: random.Random, spread: float):
+        self.cx, self.cz = rng.uniform(-spread, spread), rng.uniform(-spread, spread)
+        self.radius = rng.uniform(300.0, 3000.0); self.altitude = rng.uniform(500.0, 5000.0)
+        self.speed = rng.uniform(60.0, 250.0); self.phase = rng.uniform(0.0, 2 * math.pi); self.direction = rng.choice((1, -1))
+
+    def at(self, t: float) -> Tuple[str, str]:
+        angle = self.phase + self.direction * self.speed * t / self.radius
+        x, z = self.cx + self.radius * math.cos(angle), self.cz + self.radius * math.sin(angle)
+        yaw = (math.degrees(angle) + 90.0 * self.direction) % 360.0
+        return f"{x:.1f},{self.altitude:.1f},{z:.1f}", f"0.0,{yaw:.1f},0.0"
+
+def _position_key(x: float, y: float, z: float) -> Tuple[float, float, float]:
+    # Positions are sent with one decimal; float32 on the binary path is well within that at map scale.
+    return round(x, 1), round(y, 1), round(z, 1)
+
+class LoadClient:
+    """One connection: handshake, positions at `rate` Hz along a FlightPath, occasional chat.
+
+    Latency is measured from sending a position to the first snapshot that carries it back. Snapshots are
+    probed for the client's own entry and Seq instead of fully decoded, so the generator stays cheap per frame."""
+    def __init__(self, number: int, args: argparse.Namespace, recorder: Recorder, rng: random.Random):
+        self.username = f"load_{number:04d}"; self.args = args; self.recorder = recorder; self.rng = rng
+        self.plane_type = rng.choice(FLYABLE_PLANE_TYPES); self.path = FlightPath(rng, args.spread)
+        self.binary = args.protocol == "binary"; self.ack = 0; self.snapshots = 0; self.channel: Optional[udp.ClientChannel] = None
+        self.decompressor: Optional[compression.StreamDecompressor] = None
+        self.pending: Dict[Tuple[float, float, float], float] = {}
+        self._json_probe = json.dumps(self.username).encode('utf-8') + b":"
+        self._binary_probe = bytes((len(self.username),)) + self.username.encode('utf-8')
+
+    async def run(self, stop: asyncio.Event):
+        recorder = self.recorder
+        try: reader, writer = await asyncio.wait_for(asyncio.open_connection(self.args.host, self.args.port, limit=2 ** 24), timeout=10.0)
+        except (OSError, asyncio.TimeoutError): recorder.failed += 1; return
+        tasks: List[asyncio.Task] = []
+        try:
+            hello: Dict[str, Any] = {"Username": self.username, "PlaneType": self.plane_type}
+            if self.args.delta: hello["Delta"] = True
+            if self.args.dead_reckoning: hello["DeadReckoning"] = True
+            if self.binary: hello["Protocol"] = wire.PROTOCOL_BINARY
+            if self.args.udp: hello["Udp"] = True
+            if self.args.compression: hello["Compression"] = [self.args.compression]; hello["CompressionDictionary"] = compression.dictionary_id(DICTIONARY)
+            writer.write(json.dumps(hello).encode('utf-8') + index.PACKET_TERMINATOR); await writer.drain()
+            welcome = json.loads((await asyncio.wait_for(reader.readuntil(index.PACKET_TERMINATOR), timeout=10.0))[:-1])
+            if welcome.get("Message") != "Connection validated": recorder.failed += 1; return
+            if self.args.udp:
+                if "Udp" not in welcome: recorder.failed += 1; return
+                self.channel = await udp.ClientChannel.open(self.args.host, welcome["Udp"]["Port"], welcome["Udp"]["Token"], self._datagram_received)
+            if self.args.compression:
+                if "Compression" not in welcome: recorder.failed += 1; return
+                self.decompressor = compression.StreamDecompressor(welcome["Compression"]["Algorithm"], DICTIONARY if welcome["Compression"]["Dictionary"] else b"")
+            recorder.connected += 1
+            tasks = [asyncio.create_task(self._receive_loop(reader)), asyncio.create_task(self._send_loop(writer)), asyncio.create_task(stop.wait())]
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            if not stop.is_set(): recorder.disconnected += 1
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError): recorder.failed += 1
+        finally:
+            for task in tasks: task.cancel()
+            recorder.client_snapshots.append(self.snapshots)
+            writer.close()
+            if self.channel: self.channel.close()
+
+    async def _send_loop(self, writer: asyncio.StreamWriter):
+        interval = 1.0 / self.args.rate; start = time.perf_counter(); deadline = start
+        next_chat = start + self._chat_delay(); chat_count = 0
+        while True:
+            now = time.perf_counter(); position, rotation = self.path.at(now - start)
+            block: Dict[str, Any] = {"Position": position, "PlaneType": self.plane_type, "Rotation": rotation, "State": {"GearDown": False}}
+            if self.ack: block["Ack"] = self.ack
+            frame = wire.encode_position(block, PLANE_TYPES) if self.binary else json.dumps({"PositionService": block}).encode('utf-8') + index.PACKET_TERMINATOR
+            if self.channel: self.channel.send(frame)
+            else: writer.write(frame)
+            self.pending[_position_key(*parse_vector3(position))] = now
+            if len(self.pending) > MAX_PENDING_PROBES: del self.pending[next(iter(self.pending))]
+            if self.recorder.measuring: self.recorder.positions_sent += 1
+            if self.args.chat_interval > 0 and now >= next_chat:
+                chat_count += 1; line = f"{self.rng.choice(CHAT_LINES)} #{chat_count}"
+                writer.write(wire.encode_chat(line) if self.binary else json.dumps({"ChatService": {"Pending": line}}).encode('utf-8') + index.PACKET_TERMINATOR)
+                next_chat = now + self._chat_delay()
+                if self.recorder.measuring: self.recorder.chats_sent += 1
+            await writer.drain()
+            deadline += interval; delay = deadline - time.perf_counter()
+            if delay > 0: await asyncio.sleep(delay)
+            else: deadline = time.perf_counter()
+
+    def _chat_delay(self) -> float:
+        # Stay above the server's spam delay so chat is measured, not rejected.
+        return max(index.CHAT_SPAM_DELAY + 0.5, self.rng.expovariate(1.0 / self.args.chat_interval)) if self.args.chat_interval > 0 else math.inf
+
+    async def _receive_loop(self, reader: asyncio.StreamReader):
+        if self.decompressor is not None: await self._receive_compressed(reader); return
+        while True:
+            if self.binary:
+                (length,) = wire.FRAME_LENGTH.unpack(await reader.readexactly(wire.FRAME_LENGTH.size))
+                self._frame_received(await reader.readexactly(length), length + wire.FRAME_LENGTH.size)
+            else:
+                body = await reader.readuntil(index.PACKET_TERMINATOR); self._frame_received(body, len(body))
+
+    async def _receive_compressed(self, reader: asyncio.StreamReader):
+        # Wire bytes are counted as they arrive; the frames inside are only probed.
+        framer = framing.LengthPrefixedFramer(wire.FRAME_LENGTH, 2 ** 24) if self.binary else framing.TerminatorFramer(index.PACKET_TERMINATOR, 2 ** 24)
+        while True:
+            data = await reader.read(65536)
+            if not data: return
+            if self.recorder.measuring: self.recorder.bytes_received += len(data)
+            for packet in framer.feed(self.decompressor.decompress(data)): self._frame_received(bytes(packet), 0)
+
+    def _datagram_received(self, frame: memoryview):
+        self._frame_received(bytes(frame[wire.FRAME_LENGTH.size:]) if self.binary else bytes(frame), len(frame) + udp.HEADER.size)
+
+    def _frame_received(self, body: bytes, size: int):
+        if self.binary:
+            is_snapshot = body[:1] == bytes((wire.MSG_SNAPSHOT,))
+            probe = self._probe_binary(body) if is_snapshot else None
+        else:
+            is_snapshot = b'"PositionService"' in body
+            probe = self._probe_json(body) if is_snapshot else None
+        now = time.perf_counter(); recorder = self.recorder
+        if recorder.measuring:
+            recorder.bytes_received += size
+            if is_snapshot: recorder.snapshots += 1; self.snapshots += 1
+        if probe is not None: self._match(probe, now)
+
+    @staticmethod
+    def _skip_space(frame: bytes, offset: int) -> int:
+        # The server may use the stdlib's ", "/": " separators or a compact codec.
+        return offset + 1 if frame[offset:offset + 1] == b" " else offset
+
+    def _probe_json(self, frame: bytes) -> Optional[Tuple[float, float, float]]:
+        seq_at = frame.find(b'"Seq":')
+        if seq_at >= 0:
+            start = end = self._skip_space(frame, seq_at + 6)
+            while frame[end:end + 1].isdigit(): end += 1
+            if end > start: self.ack = int(frame[start:end])
+        at = frame.find(self._json_probe)
+        if at < 0: return None
+        start = self._skip_space(frame, at + len(self._json_probe))
+        if frame[start:start + 2] != b'["': return None
+        start += 2; end = frame.index(b'"', start)
+        return _position_key(*parse_vector3(frame[start:end].decode('ascii')))
+
+    def _probe_binary(self, body: bytes) -> Optional[Tuple[float, float, float]]:
+        seq = int.from_bytes(body[1:5], 'little')
+        if seq: self.ack = seq
+        # Records follow the player list, so the last occurrence of the name is this client's record.
+        at = body.rfind(self._binary_probe)
+        if at < 0: return None
+        offset = at + len(self._binary_probe)
+        if offset + _VECTOR.size > len(body): return None
+        return _position_key(*_VECTOR.unpack_from(body, offset))
+
+    def _match(self, key: Tuple[float, float, float], now: float):
+        sent = self.pending.get(key)
+        if sent is None: return
+        if self.recorder.measuring: self.recorder.latencies.append(now - sent)
+        # Anything sent before this position can no longer be the first echo.
+        for pending_key in list(self.pending):
+            del self.pending[pending_key]
+            if pending_key == key: break
+
+async def run_clients(args: argparse.Namespace, first: int, count: int, measure_start: float, measure_end: float) -> Dict[str, Any]:
+    """Connects `count` clients (ramped over args.ramp seconds), measures between the two wall-clock times, then stops."""
+    recorder = Recorder(); stop = asyncio.Event(); rng = random.Random(args.seed * 100003 + first)
+    clients = [LoadClient(first + i, args, recorder, rng) for i in range(count)]
+    tasks = []
+    for i, client in enumerate(clients):
+        tasks.append(asyncio.create_task(client.run(stop)))
+        if args.ramp > 0: await asyncio.sleep(args.ramp / max(1, count))
+    await asyncio.sleep(max(0.0, measure_start - time.time()))
+    recorder.measuring = True; cpu_start = time.process_time()
+    await asyncio.sleep(max(0.0, measure_end - time.time()))
+    recorder.measuring = False; cpu = time.process_time() - cpu_start
+    stop.set(); await asyncio.gather(*tasks, return_exceptions=True)
+    result = recorder.as_dict(); result["cpu_seconds"] = cpu; return result
+
+def _run_clients_process(args: argparse.Namespace, first: int, count: int, measure_start: float, measure_end: float, results):
+    results.put(asyncio.run(run_clients(args, first, count, measure_start, measure_end)))
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values: return None
+    ordered = sorted(values); return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def run_load(args: argparse.Namespace, players: int, server_pid: Optional[int]) -> Dict[str, Any]:
+    processes = args.processes or max(1, min(os.cpu_count() or 1, math.ceil(players / CLIENTS_PER_PROCESS)))
+    measure_start = time.time() + args.ramp + args.warmup; measure_end = measure_start + args.duration
+    shares = [players // processes + (1 if i < players % processes else 0) for i in range(processes)]
+    firsts = [sum(shares[:i]) for i in range(processes)]
+    context = multiprocessing.get_context("spawn"); results = context.Queue()
+    workers = [context.Process(target=_run_clients_process, args=(args, first, count, measure_start, measure_end, results)) for first, count in zip(firsts, shares) if count]
+    for worker in workers: worker.start()
+    time.sleep(max(0.0, measure_start - time.time())); server_cpu_start = process_cpu_seconds(server_pid) if server_pid else None
+    time.sleep(max(0.0, measure_end - time.time())); server_cpu_end = process_cpu_seconds(server_pid) if server_pid else None
+    # A worker that died never reports; don't wait for it forever.
+    parts = [results.get(timeout=args.ramp + 60.0) for _ in workers]
+    for worker in workers: worker.join()
+    merged: Dict[str, Any] = {"latencies": [], "client_snapshots": []}
+    for part in parts:
+        for key, value in part.items():
+            if isinstance(value, list): merged[key].extend(value)
+            else: merged[key] = merged.get(key, 0) + value
+    latencies, per_client = merged["latencies"], merged["client_snapshots"]; duration = args.duration
+    def ms(value: Optional[float]) -> Optional[float]: return None if value is None else round(value * 1000.0, 3)
+    return {
+        "players": players, "connected": merged["connected"], "failed": merged["failed"], "disconnected": merged["disconnected"],
+        "duration": duration, "load_processes": len(workers),
+        "snapshot_rate": {"mean": merged["snapshots"] / duration / max(1, merged["connected"]),
+                          "min": min(per_client) / duration if per_client else None},
+        "latency_ms": {"samples": len(latencies), "p50": ms(percentile(latencies, 0.50)), "p90": ms(percentile(latencies, 0.90)),
+                       "p99": ms(percentile(latencies, 0.99)), "max": ms(max(latencies) if latencies else None)},
+        "server_cpu_percent": None if server_cpu_start is None or server_cpu_end is None else round(100.0 * (server_cpu_end - server_cpu_start) / duration, 1),
+        "loadgen_cpu_percent": round(100.0 * merged["cpu_seconds"] / duration, 1),
+        "received_bytes_per_s": round(merged["bytes_received"] / duration), "positions_sent_per_s": round(merged["positions_sent"] / duration),
+        "chats_sent": merged["chats_sent"],
+    }
+
+def _free_port() -> int:
+    with socket.socket() as s: s.bind(("127.0.0.1", 0)); return s.getsockname()[1]
+
+def start_server(config: Dict[str, Any]) -> subprocess.Popen:
+    process = subprocess.Popen([sys.executable, "-c", SERVER_BOOT, json.dumps(config)], cwd=index.script_directory,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 15.0
+    while time.time() < deadline:
+        if process.poll() is not None: raise RuntimeError(f"Server exited during startup with code {process.returncode}.")
+        try:
+            with socket.create_connection(("127.0.0.1", config["hostPort"]), timeout=0.5): return process
+        except OSError: time.sleep(0.1)
+    process.kill(); raise RuntimeError("Server did not start listening within 15s.")
+
+def stop_server(process: subprocess.Popen):
+    process.terminate()
+    try: process.wait(timeout=5.0)
+    except subprocess.TimeoutExpired: process.kill(); process.wait()
+
+def print_result(result: Dict[str, Any]):
+    latency, snapshots = result["latency_ms"], result["snapshot_rate"]
+    cpu = "n/a" if result["server_cpu_percent"] is None else f"{result['server_cpu_percent']:.1f}%"
+    print(f"{result['players']:>7} {result['connected']:>9} {result['failed'] + result['disconnected']:>6} {snapshots['mean']:>9.1f}/s "
+          f"{latency['p50'] if latency['p50'] is not None else float('nan'):>8.1f} {latency['p99'] if latency['p99'] is not None else float('nan'):>8.1f} "
+          f"{cpu:>8} {result['loadgen_cpu_percent']:>7.1f}% {result['received_bytes_per_s'] / 1e6:>8.2f}")
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="TFSMP headless load generator")
+    parser.add_argument("--host", default="127.0.0.1"); parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--players", type=int, nargs="+", default=[100], help="client counts; one run per count")
+    parser.add_argument("--duration", type=float, default=20.0, help="measured seconds per run")
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds over which clients connect")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds between the last connect and measuring")
+    parser.add_argument("--rate", type=float, default=20.0, help="PositionService updates per client per second")
+    parser.add_argument("--chat-interval", type=float, default=15.0, help="mean seconds between chat lines per client (0 = no chat)")
+    parser.add_argument("--protocol", choices=("json", "binary"), default="json"); parser.add_argument("--delta", action="store_true", help="request delta snapshots")
+    parser.add_argument("--dead-reckoning", action="store_true", help="request dead-reckoned delta snapshots (--bench turns deadReckoning on)")
+    parser.add_argument("--udp", action="store_true", help="send positions and receive snapshots over the UDP channel (--bench opens udpPort)")
+    parser.add_argument("--compression", choices=compression.ALGORITHMS, help="ask for a compressed stream (with compression.dict when present)")
+    parser.add_argument("--spread", type=float, default=20000.0, help="flight path centres are spread over +-spread on X and Z")
+    parser.add_argument("--processes", type=int, default=0, help=f"client processes (default: one per {CLIENTS_PER_PROCESS} clients)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--server-pid", type=int, help="sample this process's CPU time (Linux /proc)")
+    parser.add_argument("--bench", action="store_true", help="start a fresh local server per run instead of connecting to --host/--port")
+    parser.add_argument("--server-config", default="{}", help="JSON merged into the benchmark server's config")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    report = {"version": index.version, "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+              "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "options": {k: v for k, v in vars(args).items() if k not in ("output",)}, "runs": []}
+    print(f"{'players':>7} {'connected':>9} {'lost':>6} {'snapshots':>11} {'p50 ms':>8} {'p99 ms':>8} {'server':>8} {'loadgen':>8} {'MB/s in':>8}")
+    for players in args.players:
+        server = None
+        if args.bench:
+            args.host, args.port = "127.0.0.1", _free_port()
+            server = start_server({"hostAddress": "127.0.0.1", "hostPort": args.port, "updateInterval": 0.05, "tickSummaryInterval": 0, "connectRate": 0, "handshakeRate": 0, "deadReckoning": args.dead_reckoning,
+                                   **({"udpPort": _free_port()} if args.udp else {}), **json.loads(args.server_config)})
+        try: result = run_load(args, players, server.pid if server else args.server_pid)
+        finally:
+            if server: stop_server(server)
+        report["runs"].append(result); print_result(result)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# file: metrics.py
+# Lightweight in-process counters rendered as Prometheus text, plus an optional local HTTP endpoint.
+
+import asyncio
+import math
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+Labels = Tuple[str, ...]
+
+def _escape(value: str) -> str: return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra: pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if math.isinf(value): return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+class Counter:
+    kind = "counter"
+    def __init__(self, name: str, doc: str, labelnames: Sequence[str] = ()):
+        self.name = name; self.doc = doc; self.labelnames = tuple(labelnames); self.values: Dict[Labels, float] = {}
+    def inc(self, amount: float = 1.0, *labels: str): self.values[labels] = self.values.get(labels, 0.0) + amount
+    def samples(self) -> List[str]: return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in self.values.items()]
+
+class Gauge:
+    """Evaluated at scrape time: `read()` returns a number, or a {label values: number} dict.
+    Pass kind="counter" when `read()` exposes a running total kept elsewhere."""
+    def __init__(self, name: str, doc: str, read: Callable[[], Union[float, Dict[Labels, float]]], labelnames: Sequence[str] = (), kind: str = "gauge"):
+        self.name = name; self.doc = doc; self.read = read; self.labelnames = tuple(labelnames); self.kind = kind
+    def samples(self) -> List[str]:
+        value = self.read()
+        if not isinstance(value, dict): value = {(): value}
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in value.items()]
+
+class Histogram:
+    kind = "histogram"
+    def __init__(self, name: str, doc: str, buckets: Sequence[float]):
+        self.name = name; self.doc = doc; self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.counts = [0] * len(self.buckets); self.sum = 0.0; self.count = 0
+    def observe(self, value: float):
+        self.sum += value; self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound: self.counts[i] += 1; break
+    def samples(self) -> List[str]:
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count; lines.append(f'{self.name}_bucket{{le="{_format_value(bound)}"}} {cumulative}')
+        return lines + [f"{self.name}_sum {_format_value(self.sum)}", f"{self.name}_count {self.count}"]
+
+class Registry:
+    def __init__(self): self.metrics: Dict[str, Union[Counter, Gauge, Histogram]] = {}
+    def register(self, metric):
+        self.metrics[metric.name] = metric; return metric
+    def unregister(self, name: str): self.metrics.pop(name, None)
+    def render(self) -> str:
+        out = []
+        for metric in list(self.metrics.values()):
+            out.append(f"# HELP {metric.name} {metric.doc}"); out.append(f"# TYPE {metric.name} {metric.kind}"); out.extend(metric.samples())
+        return "\n".join(out) + "\n"
+
+REGISTRY = Registry()
+
+TICK_SECONDS = REGISTRY.register(Histogram("tfsmp_tick_duration_seconds", "Time spent in one world tick.", (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)))
+SENT_BYTES = REGISTRY.register(Counter("tfsmp_sent_bytes_total", "Bytes handed to client send queues, by service (dropped snapshots included).", ("service",)))
+SENT_PACKETS = REGISTRY.register(Counter("tfsmp_sent_packets_total", "Frames handed to client send queues, by service.", ("service",)))
+RECEIVED_BYTES = REGISTRY.register(Counter("tfsmp_received_bytes_total", "Bytes of inbound packets, by service.", ("service",)))
+RECEIVED_PACKETS = REGISTRY.register(Counter("tfsmp_received_packets_total", "Inbound packets, by service.", ("service",)))
+CONNECTIONS_REJECTED = REGISTRY.register(Counter("tfsmp_connections_rejected_total", "Connections refused before login, by reason.", ("reason",)))
+ENCODE_SECONDS = REGISTRY.register(Counter("tfsmp_encode_seconds_total", "Time spent encoding outbound frames, by protocol.", ("protocol",)))
+DECODE_SECONDS = REGISTRY.register(Counter("tfsmp_decode_seconds_total", "Time spent decoding inbound packets, by protocol.", ("protocol",)))
+COMPRESSION_INPUT_BYTES = REGISTRY.register(Counter("tfsmp_compression_input_bytes_total", "Bytes given to per-connection compressors, by algorithm.", ("algorithm",)))
+COMPRESSION_OUTPUT_BYTES = REGISTRY.register(Counter("tfsmp_compression_output_bytes_total", "Compressed bytes written, by algorithm.", ("algorithm",)))
+COMPRESSION_SECONDS = REGISTRY.register(Counter("tfsmp_compression_seconds_total", "CPU time spent compressing outbound frames, by algorithm.", ("algorithm",)))
+INBOUND_SHED_PACKETS = REGISTRY.register(Counter("tfsmp_inbound_shed_packets_total", "Inbound packets dropped without decoding, by reason (coalesced: superseded by a later position in the same read; budget: over the connection's budget).", ("reason",)))
+INBOUND_SHED_BYTES = REGISTRY.register(Counter("tfsmp_inbound_shed_bytes_total", "Bytes of inbound packets dropped without decoding, by reason.", ("reason",)))
+INBOUND_THROTTLE_SECONDS = REGISTRY.register(Counter("tfsmp_inbound_throttle_seconds_total", "Time reads were paused on connections over their inbound budget."))
+INBOUND_KICKS = REGISTRY.register(Counter("tfsmp_inbound_kicks_total", "Clients kicked for staying over their inbound budget."))
+PLUGIN_CALLBACK_SECONDS = REGISTRY.register(Counter("tfsmp_plugin_callback_seconds_total", "Wall time spent in plugin event callbacks.", ("plugin", "event")))
+PLUGIN_CALLBACK_CALLS = REGISTRY.register(Counter("tfsmp_plugin_callback_calls_total", "Plugin event callback invocations.", ("plugin", "event")))
+PLUGIN_CALLBACK_ERRORS = REGISTRY.register(Counter("tfsmp_plugin_callback_errors_total", "Plugin event callbacks that raised.", ("plugin", "event")))
+PLUGIN_CALLBACK_TIMEOUTS = REGISTRY.register(Counter("tfsmp_plugin_callback_timeouts_total", "Synchronous plugin callbacks given up on after the callback timeout.", ("plugin", "event")))
+PLUGIN_CALLBACK_SKIPPED = REGISTRY.register(Counter("tfsmp_plugin_callback_skipped_total", "Calls skipped because the synchronous callback was still busy.", ("plugin", "event")))
+
+async def start_http_server(registry: Registry, host: str, port: int) -> asyncio.Server:
+    """Serves registry.render() on GET /metrics. Meant for localhost scraping, not the open internet."""
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5.0)
+            while True:
+                header = await asyncio.wait_for(reader.readline(), timeout=5.0)
+                if header in (b"\r\n", b"\n", b""): break
+            parts = request_line.split()
+            if len(parts) >= 2 and parts[0] == b"GET" and parts[1].split(b"?")[0] in (b"/", b"/metrics"):
+                status, body = "200 OK", registry.render().encode('utf-8')
+            else: status, body = "404 Not Found", b"Not Found\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('ascii') + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, OSError): pass
+        finally: writer.close()
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,123 @@
+# file: playerindex.py
+# Secondary indexes over the players (by IP address, by plane type, by position through the spatial grid), kept up
+# to date as players join, move, change aircraft and leave, and the read-only query surface plugins use instead of
+# looping over PlayerData and Players.
+
+import math
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, Optional, Union
+
+import codec
+from spatial import SpatialGrid, Vector3
+
+CELL_SIZE = 2000.0
+_EMPTY: FrozenSet[str] = frozenset()
+
+def entry_position(entry: Any) -> Optional[Vector3]:
+    """The position of a wire-format PlayerData entry, or None if it has none that parses."""
+    return codec.checked_vector3(entry[0]) if isinstance(entry, list) and entry else None
+
+def _vector(value: Union[Vector3, str]) -> Vector3:
+    if isinstance(value, str):
+        parsed = codec.checked_vector3(value)
+        if parsed is None: raise ValueError(f"Invalid position '{value}'")
+        return parsed
+    x, y, z = value; return float(x), float(y), float(z)
+
+class ReverseIndex:
+    """One value per key, and the set of keys holding each value. The sets are frozensets replaced on change
+    (changes are rare: a join, a new aircraft), so a lookup hands out the stored set itself: no copy, and it never
+    changes under a plugin thread reading it while the loop moves on."""
+    __slots__ = ("_values", "_keys")
+    def __init__(self): self._values: Dict[str, Any] = {}; self._keys: Dict[Any, FrozenSet[str]] = {}
+
+    def set(self, key: str, value: Any):
+        """None removes the key."""
+        old = self._values.get(key)
+        if old == value: return
+        if old is not None: self._discard(key, old)
+        if value is None: return
+        self._values[key] = value; self._keys[value] = self._keys.get(value, _EMPTY) | {key}
+
+    def remove(self, key: str):
+        old = self._values.get(key)
+        if old is not None: self._discard(key, old)
+
+    def _discard(self, key: str, value: Any):
+        del self._values[key]; remaining = self._keys.get(value, _EMPTY) - {key}
+        if remaining: self._keys[value] = remaining
+        else: self._keys.pop(value, None)
+
+    def get(self, value: Any) -> FrozenSet[str]: return self._keys.get(value, _EMPTY)
+    def value_of(self, key: str) -> Any: return self._values.get(key)
+    def counts(self) -> Dict[Any, int]: return {value: len(keys) for value, keys in list(self._keys.items())}
+
+class PlayerIndex:
+    """The IP and plane type indexes, plus position queries over `grid` (owned and updated by the caller) with
+    `position_of(username)` for the exact test on the grid's candidates."""
+    def __init__(self, grid: SpatialGrid, position_of: Callable[[str], Optional[Vector3]]):
+        self.grid = grid; self.position_of = position_of; self.addresses = ReverseIndex(); self.plane_types = ReverseIndex()
+
+    def track(self, username: str, ip_address: Optional[str], plane_type: Optional[str]):
+        self.addresses.set(username, ip_address); self.plane_types.set(username, plane_type)
+
+    def track_entry(self, username: str, entry: Any):
+        """For indexes over wire-format entries (sharded and isolated plugin views): plane type and grid cell from one entry."""
+        position = entry_position(entry)
+        if position is None: return
+        self.plane_types.set(username, entry[1] if isinstance(entry[1], str) else None); self.grid.update(username, position)
+
+    def remove(self, username: str):
+        self.addresses.remove(username); self.plane_types.remove(username)
+
+    def near(self, position: Vector3, radius: float) -> List[str]:
+        x, y, z = position; radius_sq = radius * radius; found = []
+        for username in self.grid.keys_in_box((x - radius, y - radius, z - radius), (x + radius, y + radius, z + radius)):
+            other = self.position_of(username)
+            if other is None: continue
+            distance_sq = (other[0] - x) ** 2 + (other[1] - y) ** 2 + (other[2] - z) ** 2
+            if distance_sq <= radius_sq: found.append((distance_sq, username))
+        found.sort(); return [username for _, username in found]
+
+    def in_box(self, minimum: Vector3, maximum: Vector3) -> List[str]:
+        found = []
+        for username in self.grid.keys_in_box(minimum, maximum):
+            p = self.position_of(username)
+            if p is not None and minimum[0] <= p[0] <= maximum[0] and minimum[1] <= p[1] <= maximum[1] and minimum[2] <= p[2] <= maximum[2]: found.append(username)
+        return found
+
+def entry_index(entries: Callable[[], Mapping[str, Any]], cell_size: float = CELL_SIZE) -> PlayerIndex:
+    """A PlayerIndex with its own grid, for views that only hold wire-format entries; feed it with track_entry()."""
+    return PlayerIndex(SpatialGrid(cell_size), lambda username: entry_position(entries().get(username)))
+
+class PlayerQueries:
+    """The query surface of TFSMPAPI (and of every object plugins get as PrimaryAPI). The class mixing it in sets
+    `_index` and provides PlayerData and Players. Everything returned is read-only and costs what the answer costs,
+    not a pass over every player:
+
+        PlayersByIP("203.0.113.7")          -> frozenset of usernames connected from that address
+        PlayersByPlaneType("C-400")         -> frozenset of usernames flying it
+        PlaneTypeCounts()                   -> {plane type: players}
+        PlayersNear("100,2000,-50", 5000)   -> usernames within the radius, nearest first ("x,y,z" or a tuple)
+        PlayersInBox(minimum, maximum)      -> usernames inside the axis-aligned box
+        GetPosition(username)               -> (x, y, z), or None
+        PlayerDataView / PlayersView        -> live read-only mappings over PlayerData and Players
+
+    Sets from the first two are safe to keep: the server replaces them rather than changing them."""
+    _index: PlayerIndex
+    PlayerData: Dict[str, List[Any]]
+    Players: Dict[str, Dict[str, Any]]
+
+    def PlayersByIP(self, ip_address: str) -> FrozenSet[str]: return self._index.addresses.get(ip_address)
+    def PlayersByPlaneType(self, plane_type: str) -> FrozenSet[str]: return self._index.plane_types.get(plane_type)
+    def PlaneTypeCounts(self) -> Dict[str, int]: return self._index.plane_types.counts()
+    def PlayersNear(self, position: Union[Vector3, str], radius: float) -> List[str]:
+        radius = float(radius)
+        if not radius >= 0 or math.isinf(radius): raise ValueError(f"Invalid radius {radius}")
+        return self._index.near(_vector(position), radius)
+    def PlayersInBox(self, minimum: Union[Vector3, str], maximum: Union[Vector3, str]) -> List[str]: return self._index.in_box(_vector(minimum), _vector(maximum))
+    def GetPosition(self, username: str) -> Optional[Vector3]: return self._index.position_of(username)
+    @property
+    def PlayerDataView(self) -> Mapping[str, List[Any]]: return MappingProxyType(self.PlayerData)
+    @property
+    def PlayersView(self) -> Mapping[str, Dict[str, Any]]: return MappingProxyType(self.Players)
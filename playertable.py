@@ -0,0 +1,92 @@
+# file: playertable.py
+# Struct-of-arrays store for the numeric part of every player's state.
+
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+Vector3 = Tuple[float, float, float]
+
+class PlayerTable:
+    """Fixed-layout columns indexed by slot; a username keeps its slot until it is removed, then the slot is reused.
+
+    position/previous_position/rotation/previous_rotation hold 3 floats per slot, the time columns one
+    perf_counter value per slot and `versions` a table-wide change counter, so a reused slot never repeats a version."""
+    def __init__(self, capacity: int = 64):
+        self.capacity = 0; self.slots: Dict[str, int] = {}; self.names: List[Optional[str]] = []; self._free: List[int] = []
+        self.position = array('d'); self.previous_position = array('d'); self.rotation = array('d'); self.previous_rotation = array('d')
+        self.previous_recv_time = array('d'); self.recv_time = array('d'); self.versions = array('Q'); self._clock = 0
+        self._grow(capacity)
+
+    def __len__(self) -> int: return len(self.slots)
+    def __contains__(self, username: str) -> bool: return username in self.slots
+
+    def _grow(self, capacity: int):
+        extra = capacity - self.capacity
+        for column in (self.position, self.previous_position, self.rotation, self.previous_rotation): column.extend(array('d', [0.0]) * (3 * extra))
+        for column in (self.previous_recv_time, self.recv_time): column.extend(array('d', [0.0]) * extra)
+        self.versions.extend(array('Q', [0]) * extra); self.names.extend([None] * extra)
+        self._free.extend(range(capacity - 1, self.capacity - 1, -1)); self.capacity = capacity
+
+    def add(self, username: str, position: Vector3, rotation: Vector3, recv_time: float) -> int:
+        slot = self.slots.get(username)
+        if slot is None:
+            if not self._free: self._grow(self.capacity * 2)
+            slot = self._free.pop(); self.slots[username] = slot; self.names[slot] = username
+        i = slot * 3
+        self.position[i:i + 3] = self.previous_position[i:i + 3] = array('d', position)
+        self.rotation[i:i + 3] = self.previous_rotation[i:i + 3] = array('d', rotation)
+        self.previous_recv_time[slot] = self.recv_time[slot] = recv_time; self._clock += 1; self.versions[slot] = self._clock
+        return slot
+
+    def load(self, username: str, position: Vector3, rotation: Vector3, previous_position: Vector3, previous_rotation: Vector3, previous_recv_time: float, recv_time: float) -> int:
+        """Stores a complete row received from elsewhere (another shard), adding the player if needed; always a change."""
+        slot = self.slots.get(username)
+        if slot is None: slot = self.add(username, position, rotation, recv_time)
+        i = slot * 3
+        self.position[i:i + 3] = array('d', position); self.rotation[i:i + 3] = array('d', rotation)
+        self.previous_position[i:i + 3] = array('d', previous_position); self.previous_rotation[i:i + 3] = array('d', previous_rotation)
+        self.previous_recv_time[slot] = previous_recv_time; self.recv_time[slot] = recv_time; self._clock += 1; self.versions[slot] = self._clock
+        return slot
+
+    def remove(self, username: str):
+        slot = self.slots.pop(username, None)
+        if slot is None: return
+        self.names[slot] = None; self._free.append(slot)
+
+    def update(self, username: str, position: Vector3, rotation: Vector3, recv_time: float, changed: bool):
+        """Shifts current values into the previous columns and stores the new ones in place."""
+        slot = self.slots[username]; i = slot * 3
+        self.previous_position[i:i + 3] = self.position[i:i + 3]; self.previous_rotation[i:i + 3] = self.rotation[i:i + 3]
+        self.position[i], self.position[i + 1], self.position[i + 2] = position
+        self.rotation[i], self.rotation[i + 1], self.rotation[i + 2] = rotation
+        self.previous_recv_time[slot] = self.recv_time[slot]; self.recv_time[slot] = recv_time
+        if changed: self._clock += 1; self.versions[slot] = self._clock
+
+    def get_position(self, username: str) -> Optional[Vector3]:
+        slot = self.slots.get(username)
+        if slot is None: return None
+        i = slot * 3; return self.position[i], self.position[i + 1], self.position[i + 2]
+
+    def get_rotation(self, username: str) -> Optional[Vector3]:
+        slot = self.slots.get(username)
+        if slot is None: return None
+        i = slot * 3; return self.rotation[i], self.rotation[i + 1], self.rotation[i + 2]
+
+    def get_recv_time(self, username: str) -> Optional[float]:
+        slot = self.slots.get(username)
+        return None if slot is None else self.recv_time[slot]
+
+    def get_vectors(self, username: str) -> Optional[Tuple[float, ...]]:
+        """Position, rotation, previous position, previous rotation (3 floats each), then previous and current receive time."""
+        slot = self.slots.get(username)
+        if slot is None: return None
+        # Indexed one by one: slicing would build four temporary arrays per call, and snapshots call this per player.
+        i = slot * 3; position, rotation, previous_position, previous_rotation = self.position, self.rotation, self.previous_position, self.previous_rotation
+        return (position[i], position[i + 1], position[i + 2], rotation[i], rotation[i + 1], rotation[i + 2],
+                previous_position[i], previous_position[i + 1], previous_position[i + 2], previous_rotation[i], previous_rotation[i + 1], previous_rotation[i + 2],
+                self.previous_recv_time[slot], self.recv_time[slot])
+
+    def versions_snapshot(self) -> Dict[str, int]:
+        """One pass over the live slots; used as the baseline for delta snapshots."""
+        names, versions = self.names, self.versions
+        return {names[slot]: versions[slot] for slot in self.slots.values()}
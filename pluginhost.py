@@ -0,0 +1,291 @@
+# file: pluginhost.py
+# Isolated plugins: each one runs in its own worker process against a periodically refreshed snapshot of the
+# server, so a slow or crashing plugin cannot stall the tick. Frames on the worker socket are length-prefixed JSON.
+
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+
+import codec
+import events
+import framing
+import playerindex
+import wire
+from sendqueue import SendQueue
+
+SNAPSHOT_INTERVAL = 0.25
+CPU_BUDGET = 0.5
+CHECK_INTERVAL = 1.0
+MAX_THROTTLE = 3.0
+QUEUE_DEADLINE = 10.0
+RESTART_BACKOFF_MIN = 1.0
+RESTART_BACKOFF_MAX = 30.0
+RESTART_BACKOFF_RESET = 60.0
+MAX_FRAME_SIZE = 1 << 24
+REAP_TIMEOUT = 0.5
+WORKER_NICE = 5
+FORWARDED_EVENTS = ("PlayerConnected", "PlayerDisconnected", "DataReceived")
+
+_CONTEXT = multiprocessing.get_context("spawn")
+
+async def reap(process: multiprocessing.Process, timeout: float = REAP_TIMEOUT) -> bool:
+    """Stops `process` without blocking the loop: SIGTERM, then SIGKILL if it has not exited after `timeout` seconds.
+    Returns whether it was reaped."""
+    if process.is_alive(): process.terminate()
+    await asyncio.to_thread(process.join, timeout)
+    if process.is_alive(): process.kill(); await asyncio.to_thread(process.join, timeout)
+    return not process.is_alive()
+
+def process_cpu_seconds(pid: int) -> Optional[float]:
+    """utime + stime of a process from /proc (Linux only); None when unavailable."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f: fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError): return None
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    payload = codec.dumps(message); return wire.FRAME_LENGTH.pack(len(payload)) + payload
+
+async def _read_messages(reader: asyncio.StreamReader, handle: Callable[[Dict[str, Any]], Any]):
+    framer = framing.LengthPrefixedFramer(wire.FRAME_LENGTH, MAX_FRAME_SIZE)
+    while True:
+        data = await reader.read(65536)
+        if not data: return
+        for packet in framer.feed(data):
+            message = codec.loads(packet)
+            if isinstance(message, dict): handle(message)
+
+class PluginWorker:
+    """Server-side handle for one isolated plugin: its process, an outbound SendQueue (snapshots latest-wins,
+    events in order) and the commands it sends back. A worker that exits, stops reading or closes its socket
+    is restarted with exponential backoff; one whose main.py fails to load is not."""
+    def __init__(self, supervisor: 'PluginSupervisor', name: str, folder: str):
+        self.supervisor = supervisor; self.name = name; self.folder = folder
+        self.process: Optional[multiprocessing.Process] = None; self.sender: Optional[SendQueue] = None
+        self.events: FrozenSet[str] = frozenset(); self.failed = False
+        self.restarts = 0; self.cpu_seconds = 0.0; self.throttled_seconds = 0.0
+        self._backoff = RESTART_BACKOFF_MIN; self._restart_at: Optional[float] = None; self._started_at = 0.0
+        self._cpu_sample: Optional[tuple] = None; self._paused: Optional[asyncio.TimerHandle] = None
+        self._writer: Optional[asyncio.StreamWriter] = None; self._reader_task: Optional[asyncio.Task] = None
+        self._reap_task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool: return self.process is not None
+
+    async def start(self):
+        server_socket, worker_socket = socket.socketpair()
+        self.process = _CONTEXT.Process(target=_worker_main, args=(self.name, self.folder, worker_socket), name=f"plugin-{self.name}", daemon=True)
+        self.process.start(); worker_socket.close()
+        reader, self._writer = await asyncio.open_connection(sock=server_socket)
+        self.sender = SendQueue(self._writer, lambda reason: self._stopped(f"send queue failed: {reason}"), QUEUE_DEADLINE)
+        self._reader_task = asyncio.create_task(self._read(reader))
+        self._started_at = time.perf_counter(); self._restart_at = None; self.events = frozenset()
+        cpu = process_cpu_seconds(self.process.pid); self._cpu_sample = (self._started_at, cpu) if cpu is not None else None
+
+    def send(self, frame: bytes, snapshot: bool = False):
+        if self.sender is None: return
+        if snapshot: self.sender.put_snapshot(frame)
+        else: self.sender.put(frame)
+
+    async def _read(self, reader: asyncio.StreamReader):
+        try: await _read_messages(reader, self._handle)
+        except (ConnectionError, OSError, *codec.DECODE_ERRORS) as e: self._stopped(f"{type(e).__name__} on worker socket"); return
+        self._stopped("worker socket closed")
+
+    def _handle(self, message: Dict[str, Any]):
+        kind, api = message.get("Type"), self.supervisor.api
+        if kind == "Ready":
+            self.events = frozenset(e for e in message.get("Events", ()) if e in FORWARDED_EVENTS); self.supervisor.forward(self.events)
+        elif kind == "Failed":
+            self.failed = True; self.supervisor.warn(f"Failed to execute plugin {self.name}: {message.get('Error')}")
+        elif kind == "Kick":
+            api_player = api.GetAPIPlayer(str(message.get("Username")))
+            if api_player: asyncio.create_task(api_player.Kick(str(message.get("Message", "Bạn đã bị kick."))))
+        elif kind == "Chat": api.SendChat(str(message.get("Message", "")), str(message.get("Sender", "Server")))
+
+    def _stopped(self, reason: str):
+        if self.process is None: return
+        self._teardown()
+        if self.failed or self.supervisor.stopping: return
+        if time.perf_counter() - self._started_at >= RESTART_BACKOFF_RESET: self._backoff = RESTART_BACKOFF_MIN
+        self.supervisor.warn(f"Plugin {self.name} worker stopped ({reason}); restarting in {self._backoff:g}s.")
+        self._restart_at = time.perf_counter() + self._backoff; self._backoff = min(2 * self._backoff, RESTART_BACKOFF_MAX)
+
+    def _teardown(self):
+        process, self.process = self.process, None
+        if self._paused is not None:
+            # A stopped process would hold SIGTERM pending until the kill.
+            self._paused.cancel(); self._paused = None
+            if process is not None and process.is_alive(): os.kill(process.pid, signal.SIGCONT)
+        if self.sender is not None: self.sender.close(); self.sender = None
+        if self._reader_task is not None and self._reader_task is not asyncio.current_task(): self._reader_task.cancel()
+        if self._writer is not None: self._writer.close(); self._writer = None
+        if process is not None: self._reap_task = asyncio.create_task(self._reap(process))
+
+    async def _reap(self, process: multiprocessing.Process):
+        if not await reap(process): self.supervisor.warn(f"Plugin {self.name} worker (pid {process.pid}) did not exit after SIGKILL.")
+
+    async def check(self, now: float):
+        """Restarts a due worker, notices exits, and throttles one that used more than its CPU budget."""
+        if self.process is None:
+            if self._restart_at is not None and now >= self._restart_at:
+                self.restarts += 1
+                try: await self.start()
+                except OSError as e: self._restart_at = None; self.supervisor.warn(f"Could not restart plugin {self.name}: {e}")
+            return
+        if not self.process.is_alive(): self._stopped(f"exit code {self.process.exitcode}"); return
+        if self._paused is not None or self._cpu_sample is None: return
+        cpu = process_cpu_seconds(self.process.pid)
+        if cpu is None: return
+        last_time, last_cpu = self._cpu_sample; used, elapsed = cpu - last_cpu, now - last_time
+        self.cpu_seconds += used; self._cpu_sample = (now, cpu)
+        budget = self.supervisor.cpu_budget
+        if budget > 0 and elapsed > 0 and used > budget * elapsed and hasattr(signal, "SIGSTOP"):
+            # Stop the process long enough to bring this window's average back to the budget.
+            pause = min(MAX_THROTTLE, used / budget - elapsed)
+            os.kill(self.process.pid, signal.SIGSTOP); self.throttled_seconds += pause
+            self._paused = asyncio.get_running_loop().call_later(pause, self._resume)
+
+    def _resume(self):
+        self._paused = None
+        if self.process is not None and self.process.is_alive():
+            os.kill(self.process.pid, signal.SIGCONT); cpu = process_cpu_seconds(self.process.pid)
+            self._cpu_sample = (time.perf_counter(), cpu) if cpu is not None else None
+
+    async def stop(self):
+        process = self.process
+        if process is None: return
+        if self._paused is not None and process.is_alive(): os.kill(process.pid, signal.SIGCONT)
+        # Closing the socket is the worker's signal to exit; it is killed if it does not.
+        if self._writer is not None: self._writer.close()
+        await asyncio.to_thread(process.join, 2.0)
+        self._teardown()
+        if self._reap_task is not None: await self._reap_task
+
+class PluginSupervisor:
+    """Runs isolated plugins. Every `snapshot_interval` seconds one snapshot of PlayerData, Players and TickStats
+    is encoded and offered to every worker; server events a worker subscribed to are forwarded as they fire.
+    `cpu_budget` is the share of one core each worker may average (0 disables throttling)."""
+    def __init__(self, api: Any, snapshot_interval: float = SNAPSHOT_INTERVAL, cpu_budget: float = CPU_BUDGET, warn: Callable[[str], Any] = print):
+        self.api = api; self.snapshot_interval = snapshot_interval; self.cpu_budget = cpu_budget; self.warn = warn
+        self.workers: Dict[str, PluginWorker] = {}; self.stopping = False
+        self._forwarded: set = set(); self._task: Optional[asyncio.Task] = None
+
+    def add(self, name: str, folder: str): self.workers[name] = PluginWorker(self, name, folder)
+
+    async def start(self):
+        for worker in self.workers.values(): await worker.start()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self.stopping = True
+        if self._task is not None: self._task.cancel()
+        await asyncio.gather(*(worker.stop() for worker in self.workers.values()), return_exceptions=True)
+
+    async def _run(self):
+        next_check = time.perf_counter() + CHECK_INTERVAL
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            try:
+                running = [w for w in self.workers.values() if w.running]
+                if running:
+                    frame = encode_message(self._snapshot())
+                    for worker in running: worker.send(frame, snapshot=True)
+                now = time.perf_counter()
+                if now >= next_check:
+                    next_check = now + CHECK_INTERVAL
+                    for worker in list(self.workers.values()): await worker.check(now)
+            except Exception as e: self.warn(f"Plugin supervisor error: {e}")
+
+    def _snapshot(self) -> Dict[str, Any]:
+        players = {u: {"Address": list(p["address"]) if p.get("address") else None, "Protocol": p.get("protocol"), "Connected": p["api_player"].IsConnected()}
+                   for u, p in list(self.api.Players.items())}
+        return {"Type": "Snapshot", "PlayerData": self.api.PlayerData, "Players": players, "TickStats": self.api.TickStats}
+
+    def forward(self, names: FrozenSet[str]):
+        """Subscribes to the server events some worker wants, once each; usernames stand in for player objects."""
+        for name in names - self._forwarded:
+            self._forwarded.add(name); event = getattr(self.api, name)
+            if name == "DataReceived":
+                async def forward_data(calls, name=name): self._broadcast(name, [[player.Username, entry] for player, entry in calls])
+                event.connect(forward_data, batched=True)
+            else:
+                async def forward_player(player, name=name): self._broadcast(name, [[player.Username]])
+                event.connect(forward_player)
+
+    def _broadcast(self, name: str, calls: List[List[Any]]):
+        workers = [w for w in self.workers.values() if w.running and name in w.events]
+        if not workers: return
+        frame = encode_message({"Type": "Event", "Name": name, "Calls": calls})
+        for worker in workers: worker.send(frame)
+
+# -- worker process side --------------------------------------------------------------------------------
+
+class RemotePlayer:
+    def __init__(self, username: str, api: 'RemoteAPI'): self.Username = username; self._api = api
+    def IsConnected(self) -> bool:
+        info = self._api.Players.get(self.Username); return bool(info and info["connected"])
+    async def Kick(self, message="Bạn đã bị kick."): self._api._command({"Type": "Kick", "Username": self.Username, "Message": message})
+
+class RemoteAPI(playerindex.PlayerQueries):
+    """PrimaryAPI inside a worker: the same names as TFSMPAPI, read from the latest snapshot. PlayerData and Players
+    are copies replaced on every refresh; writing to them changes nothing on the server. The query indexes are
+    rebuilt from each snapshot. Kick and SendChat are sent to the server as commands."""
+    def __init__(self, writer: asyncio.StreamWriter):
+        self._writer = writer
+        self.PlayerConnected = events.Event("PlayerConnected"); self.PlayerDisconnected = events.Event("PlayerDisconnected"); self.DataReceived = events.Event("DataReceived")
+        self._player_data: Dict[str, List[Any]] = {}; self._players: Dict[str, Dict[str, Any]] = {}; self._tick_stats: Dict[str, Any] = {}
+        self._index = playerindex.entry_index(lambda: self._player_data)
+    @property
+    def PlayerData(self) -> Dict[str, List[Any]]: return self._player_data
+    @property
+    def Players(self) -> Dict[str, Dict[str, Any]]: return self._players
+    @property
+    def TickStats(self) -> Dict[str, Any]: return self._tick_stats
+    def GetAPIPlayer(self, username: str) -> Optional[RemotePlayer]:
+        info = self._players.get(username); return info["api_player"] if info else None
+    def SendChat(self, message: str, sender: str = "Server"): self._command({"Type": "Chat", "Message": message, "Sender": sender})
+
+    def _command(self, message: Dict[str, Any]):
+        if not self._writer.is_closing(): self._writer.write(encode_message(message))
+
+    def _player(self, username: str) -> RemotePlayer:
+        info = self._players.get(username); return info["api_player"] if info else RemotePlayer(username, self)
+
+    def _handle(self, message: Dict[str, Any]):
+        if message.get("Type") == "Snapshot":
+            self._player_data = message.get("PlayerData") or {}; self._tick_stats = message.get("TickStats") or {}
+            self._players = {u: {"address": tuple(p["Address"]) if p.get("Address") else None, "protocol": p.get("Protocol"), "connected": p.get("Connected"), "api_player": self._player(u)}
+                             for u, p in (message.get("Players") or {}).items()}
+            self._index = playerindex.entry_index(lambda: self._player_data)
+            for username, info in self._players.items(): self._index.addresses.set(username, info["address"][0] if info["address"] else None)
+            for username, entry in self._player_data.items(): self._index.track_entry(username, entry)
+        elif message.get("Type") == "Event" and message.get("Name") in FORWARDED_EVENTS:
+            name, calls = message["Name"], message.get("Calls") or []
+            if name == "DataReceived":
+                for username, entry in calls: self._player_data[username] = entry; self._index.track_entry(username, entry)
+                calls = [(self._player(username), entry) for username, entry in calls]
+            else: calls = [(self._player(username),) for (username,) in calls]
+            asyncio.create_task(getattr(self, name).invoke_many(calls))
+
+def _worker_main(name: str, folder: str, sock: socket.socket):
+    try: os.nice(WORKER_NICE)
+    except (AttributeError, OSError): pass
+    try: asyncio.run(_worker(name, folder, sock))
+    except KeyboardInterrupt: pass
+
+async def _worker(name: str, folder: str, sock: socket.socket):
+    reader, writer = await asyncio.open_connection(sock=sock)
+    api = RemoteAPI(writer)
+    try:
+        with open(os.path.join(folder, "main.py"), "r", encoding='utf-8') as pf: plugincontent = pf.read()
+        exec(plugincontent, {"PrimaryAPI": api, "FilePath": folder})
+    except Exception as e:
+        writer.write(encode_message({"Type": "Failed", "Error": f"{type(e).__name__}: {e}"})); await writer.drain(); writer.close(); return
+    writer.write(encode_message({"Type": "Ready", "Events": [n for n in FORWARDED_EVENTS if getattr(api, n).has_subscribers]}))
+    try: await _read_messages(reader, api._handle)
+    except (ConnectionError, OSError): pass
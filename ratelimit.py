@@ -0,0 +1,67 @@
+# file: ratelimit.py
+# Token buckets: one per connection, or keyed by address for accept-time limits.
+
+import time
+from typing import Dict, Hashable, Optional
+
+MAX_KEYS = 65536
+
+class TokenBucket:
+    """Holds up to `burst` tokens, refilled at `rate` per second; take() spends them if there are enough."""
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+    def __init__(self, rate: float, burst: float, now: Optional[float] = None):
+        self.rate = rate; self.burst = burst; self.tokens = burst; self.stamp = time.monotonic() if now is None else now
+
+    def refill(self, now: float):
+        if now > self.stamp: self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate); self.stamp = now
+
+    def take(self, cost: float = 1.0, now: Optional[float] = None) -> bool:
+        self.refill(time.monotonic() if now is None else now)
+        if self.tokens < cost: return False
+        self.tokens -= cost; return True
+
+    def spend(self, cost: float = 1.0, now: Optional[float] = None) -> bool:
+        """Takes `cost` even if that leaves the bucket in debt (at most `burst` deep); False if it could not cover it."""
+        self.refill(time.monotonic() if now is None else now)
+        covered = self.tokens >= cost; self.tokens = max(-self.burst, self.tokens - cost); return covered
+
+    def debt_seconds(self) -> float: return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+class RateLimiter:
+    """A token bucket per key (an IP address, say); rate <= 0 disables the limit. Buckets that have refilled
+    completely are forgotten once more than `max_keys` are held, so a flood of one-off keys stays bounded."""
+    def __init__(self, rate: float, burst: float, max_keys: int = MAX_KEYS):
+        self.rate = rate; self.burst = max(1.0, burst); self.max_keys = max_keys; self.buckets: Dict[Hashable, TokenBucket] = {}
+
+    @property
+    def enabled(self) -> bool: return self.rate > 0
+
+    def allow(self, key: Hashable, now: Optional[float] = None) -> bool:
+        if self.rate <= 0: return True
+        now = time.monotonic() if now is None else now
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.max_keys: self._prune(now)
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst, now)
+        return bucket.take(1.0, now)
+
+    def _prune(self, now: float):
+        idle = self.burst / self.rate
+        for key in [k for k, b in self.buckets.items() if now - b.stamp >= idle]: del self.buckets[key]
+        # Everyone is active: drop the oldest half rather than grow without bound.
+        if len(self.buckets) >= self.max_keys:
+            for key in sorted(self.buckets, key=lambda k: self.buckets[k].stamp)[:len(self.buckets) // 2]: del self.buckets[key]
+
+class InboundBudget:
+    """One connection's allowance for what it sends: packets (that get decoded) and bytes per second, each with a
+    burst; a rate <= 0 leaves that side unlimited. Spending past empty runs up a debt, and delay() is how long
+    reading should pause for the connection to be back within its rates. `over_since` is kept by the caller."""
+    __slots__ = ("packets", "bytes", "over_since")
+    def __init__(self, packet_rate: float, packet_burst: float, byte_rate: float, byte_burst: float, now: Optional[float] = None):
+        self.packets = TokenBucket(packet_rate, max(1.0, packet_burst), now) if packet_rate > 0 else None
+        self.bytes = TokenBucket(byte_rate, max(1.0, byte_burst), now) if byte_rate > 0 else None
+        self.over_since: Optional[float] = None
+
+    def read(self, size: int, now: Optional[float] = None) -> bool: return self.bytes is None or self.bytes.spend(size, now)
+    def packet(self, now: Optional[float] = None) -> bool: return self.packets is None or self.packets.spend(1.0, now)
+    def delay(self) -> float: return max(bucket.debt_seconds() if bucket is not None else 0.0 for bucket in (self.packets, self.bytes))
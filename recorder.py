@@ -0,0 +1,267 @@
+# file: recorder.py
+# Flight recorder: positions, joins/leaves and chat as fixed-size 64-byte records in segment files written by a
+# background thread, with a per-segment keyframe index that readers memory-map for time-range queries.
+#
+# A recording is a directory: meta.json, then 00000.rec/00000.idx, 00001.rec/00001.idx, ... Every segment starts with
+# a SEGMENT record and a keyframe (KEYFRAME, then JOIN + POSITION for every player), so each one replays on its own.
+# Records carry a type, flags, a player id (assigned at JOIN, reused after LEAVE) and a wall-clock time.
+
+import bisect
+import collections
+import json
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import wire
+
+RECORD_SIZE = 64
+FORMAT_VERSION = 1
+SEGMENT_BYTES = 64 * 1024 * 1024
+KEYFRAME_INTERVAL = 10.0
+FLUSH_INTERVAL = 0.5
+MAX_PENDING_CHUNKS = 256
+NO_PLAYER = 0xFFFF
+MAX_USERNAME_BYTES = 32
+CHAT_CHUNK_BYTES = 51
+
+REC_SEGMENT, REC_KEYFRAME, REC_JOIN, REC_LEAVE, REC_POSITION, REC_CHAT = 1, 2, 3, 4, 5, 6
+FLAG_MORE = 0x01  # chat text continues in the next record
+
+HEADER = struct.Struct('<BBHd')                   # type, flags, player id, epoch seconds
+_SEGMENT = struct.Struct('<BBHdII44x')             # + format version, segment number
+_KEYFRAME = struct.Struct('<BBHdI48x')             # + players in the keyframe
+_JOIN = struct.Struct('<BBHdB32s19x')              # + plane type index, username
+_LEAVE = struct.Struct('<BBHd52x')
+_POSITION = struct.Struct('<BBHd3f3fBBii18x')      # + position, rotation, plane type index, state flags, VTOLAngle, LiveryId
+_CHAT = struct.Struct('<BBHdB51s')                 # + chunk length, "sender\x00message" UTF-8 chunk
+_INDEX = struct.Struct('<dI')                      # keyframe time, record number within the segment
+assert all(layout.size == RECORD_SIZE for layout in (_SEGMENT, _KEYFRAME, _JOIN, _LEAVE, _POSITION, _CHAT))
+
+def _int32(value: Any) -> int:
+    try: return min(max(int(value), -2 ** 31), 2 ** 31 - 1)
+    except (TypeError, ValueError): return 0
+
+class FlightRecorder:
+    """capture() is called once per tick and records joins, leaves and every player whose PlayerTable version
+    changed, plus the chat received since the last tick. Records are packed into a buffer on the event loop that is
+    handed to the writer thread every `flush_interval` seconds. If the disk falls behind, chunks are dropped
+    (counted in dropped_bytes) and a new segment is started so the recording stays consistent."""
+    def __init__(self, directory: str, plane_types: Sequence[str], player_table: Any, player_positions: Dict[str, List[Any]],
+                 segment_bytes: int = SEGMENT_BYTES, keyframe_interval: float = KEYFRAME_INTERVAL, flush_interval: float = FLUSH_INTERVAL,
+                 on_error: Callable[[str], Any] = print, meta: Optional[Dict[str, Any]] = None):
+        self.directory = directory; self.plane_types = list(plane_types); self.player_table = player_table; self.player_positions = player_positions
+        self.segment_bytes = segment_bytes; self.keyframe_interval = keyframe_interval; self.flush_interval = flush_interval; self.on_error = on_error
+        self._plane_indexes = {plane_type: i for i, plane_type in enumerate(self.plane_types)}
+        self._ids: Dict[str, int] = {}; self._free_ids: List[int] = []; self._next_id = 0; self._versions: Dict[str, int] = {}
+        self._buffer = bytearray(); self._index: List[Tuple[float, int]] = []
+        # chat() may be called from plugin threads; messages wait here until the next capture() on the event loop.
+        self._chat: "collections.deque[Tuple[float, str, str]]" = collections.deque()
+        self._segment = -1; self._segment_records = 0; self._last_keyframe = 0.0; self._last_flush = 0.0; self._new_segment_due = True
+        self._queue: "queue.Queue[Optional[Tuple]]" = queue.Queue(MAX_PENDING_CHUNKS); self._thread: Optional[threading.Thread] = None
+        self.records = 0; self.bytes_written = 0; self.dropped_bytes = 0
+        self.meta = {"Format": FORMAT_VERSION, "RecordSize": RECORD_SIZE, "PlaneTypes": self.plane_types, "Started": time.time(), **(meta or {})}
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "meta.json"), "w", encoding="utf-8") as f: json.dump(self.meta, f, indent=4)
+        self._thread = threading.Thread(target=self._write_loop, name="flight-recorder", daemon=True); self._thread.start()
+
+    def close(self):
+        """Hands over what is buffered and waits for the writer to finish; safe to call from a worker thread."""
+        if self._thread is None: return
+        if self._segment >= 0: self._write_chat()
+        self._flush(force=True); self._queue.put(None); self._thread.join(); self._thread = None
+
+    def _append(self, record: bytes): self._buffer += record; self._segment_records += 1; self.records += 1
+
+    def _player_id(self, username: str) -> int:
+        if self._free_ids: player_id = self._free_ids.pop()
+        else: player_id = self._next_id; self._next_id += 1
+        self._ids[username] = player_id; return player_id
+
+    def _join(self, now: float, username: str, entry: List[Any]) -> int:
+        player_id = self._ids.get(username)
+        if player_id is None: player_id = self._player_id(username)
+        name = username.encode('utf-8')[:MAX_USERNAME_BYTES]
+        self._append(_JOIN.pack(REC_JOIN, 0, player_id, now, self._plane_indexes.get(entry[1], wire.NO_PLANE_TYPE), name)); return player_id
+
+    def _position(self, now: float, player_id: int, username: str, entry: List[Any]):
+        vectors = self.player_table.get_vectors(username)
+        if vectors is None: return
+        state = entry[3]
+        try: record = _POSITION.pack(REC_POSITION, 0, player_id, now, *vectors[0:6], self._plane_indexes.get(entry[1], wire.NO_PLANE_TYPE),
+                                     wire.state_flags(state), _int32(state.get("VTOLAngle", 0)), _int32(state.get("LiveryId", -1)))
+        except (struct.error, OverflowError): return  # a vector float32 cannot hold; skip rather than fail the tick
+        self._append(record)
+
+    def _leaves(self, now: float, versions: Dict[str, int]):
+        for username in [u for u in self._ids if u not in versions]:
+            player_id = self._ids.pop(username); self._free_ids.append(player_id)
+            self._append(_LEAVE.pack(REC_LEAVE, 0, player_id, now))
+
+    def _keyframe(self, now: float, versions: Dict[str, int]):
+        if self._new_segment_due:
+            self._flush(force=True)
+            if not self._queue_chunk(("segment", self._segment + 1)): return
+            self._segment += 1; self._segment_records = 0; self._new_segment_due = False
+            self._append(_SEGMENT.pack(REC_SEGMENT, 0, NO_PLAYER, now, FORMAT_VERSION, self._segment))
+        else: self._leaves(now, versions)
+        self._index.append((now, self._segment_records)); self._last_keyframe = now
+        positions = self.player_positions; present = [u for u in versions if u in positions]
+        self._append(_KEYFRAME.pack(REC_KEYFRAME, 0, NO_PLAYER, now, len(present)))
+        for username in present: entry = positions[username]; self._position(now, self._join(now, username, entry), username, entry)
+        self._versions = versions
+
+    def capture(self, now: Optional[float] = None, versions: Optional[Dict[str, int]] = None):
+        """`versions` is this tick's PlayerTable.versions_snapshot(), if the caller already has it."""
+        now = time.time() if now is None else now
+        versions = self.player_table.versions_snapshot() if versions is None else versions
+        if self._segment_records * RECORD_SIZE >= self.segment_bytes: self._new_segment_due = True
+        if self._new_segment_due or now - self._last_keyframe >= self.keyframe_interval:
+            self._keyframe(now, versions)
+            if self._segment >= 0: self._write_chat()
+        else:
+            self._write_chat()
+            previous, positions = self._versions, self.player_positions
+            self._leaves(now, versions)
+            for username, version in versions.items():
+                if previous.get(username) == version: continue
+                entry = positions.get(username)
+                if entry is None: continue
+                player_id = self._ids.get(username)
+                if player_id is None: player_id = self._join(now, username, entry)
+                self._position(now, player_id, username, entry)
+            self._versions = versions
+        if now - self._last_flush >= self.flush_interval: self._flush()
+
+    def chat(self, sender: str, message: str):
+        self._chat.append((time.time(), sender, message))
+
+    def _write_chat(self):
+        while self._chat:
+            when, sender, message = self._chat.popleft()
+            player_id = self._ids.get(sender, NO_PLAYER); text = f"{sender}\x00{message}".encode('utf-8')
+            for start in range(0, len(text), CHAT_CHUNK_BYTES):
+                chunk = text[start:start + CHAT_CHUNK_BYTES]
+                self._append(_CHAT.pack(REC_CHAT, FLAG_MORE if start + CHAT_CHUNK_BYTES < len(text) else 0, player_id, when, len(chunk), chunk))
+
+    def _flush(self, force: bool = False):
+        self._last_flush = time.time()
+        if not self._buffer and not (force and self._index): return
+        chunk, index = bytes(self._buffer), self._index; self._buffer = bytearray(); self._index = []
+        self._queue_chunk(("data", chunk, index))
+
+    def _queue_chunk(self, item: Tuple) -> bool:
+        try: self._queue.put_nowait(item); return True
+        except queue.Full:
+            if item[0] == "data": self.dropped_bytes += len(item[1])
+            # Whatever follows must not depend on what was lost: restart with a fresh, self-contained segment.
+            self._new_segment_due = True; self._ids.clear(); self._free_ids.clear(); self._next_id = 0; return False
+
+    def _write_loop(self):
+        rec_file = idx_file = None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None: break
+                try:
+                    if item[0] == "segment":
+                        for f in (rec_file, idx_file):
+                            if f: f.close()
+                        base = os.path.join(self.directory, f"{item[1]:05d}")
+                        rec_file = open(base + ".rec", "wb"); idx_file = open(base + ".idx", "wb")
+                    elif rec_file is not None:
+                        rec_file.write(item[1]); rec_file.flush(); self.bytes_written += len(item[1])
+                        if item[2]: idx_file.write(b"".join(_INDEX.pack(t, n) for t, n in item[2])); idx_file.flush()
+                except OSError as e: self.on_error(f"Flight recorder write failed: {e}")
+        finally:
+            for f in (rec_file, idx_file):
+                if f: f.close()
+
+class Segment:
+    """One .rec/.idx pair, both memory-mapped read-only."""
+    def __init__(self, rec_path: str):
+        self.rec_path = rec_path; self.number = int(os.path.basename(rec_path).split(".")[0])
+        self.records = self._map(rec_path); idx = self._map(rec_path[:-4] + ".idx")
+        self.count = len(self.records) // RECORD_SIZE if self.records is not None else 0
+        self.keyframes: List[Tuple[float, int]] = [_INDEX.unpack_from(idx, i) for i in range(0, len(idx) - len(idx) % _INDEX.size, _INDEX.size)] if idx is not None else []
+        self.keyframe_times = [t for t, _ in self.keyframes]
+        if idx is not None: idx.close()
+
+    @staticmethod
+    def _map(path: str) -> Optional[mmap.mmap]:
+        try:
+            with open(path, "rb") as f:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else None
+        except OSError: return None
+
+    @property
+    def start_time(self) -> Optional[float]: return HEADER.unpack_from(self.records, 0)[3] if self.count else None
+    @property
+    def end_time(self) -> Optional[float]: return HEADER.unpack_from(self.records, (self.count - 1) * RECORD_SIZE)[3] if self.count else None
+
+    def keyframe_before(self, when: float) -> int:
+        """Record number of the last keyframe at or before `when` (0, the segment start, if there is none)."""
+        i = bisect.bisect_right(self.keyframe_times, when)
+        return self.keyframes[i - 1][1] if i else 0
+
+    def close(self):
+        if self.records is not None: self.records.close()
+
+class Recording:
+    """Reads a recording directory. records(start, end) yields decoded records with epoch times in [start, end),
+    starting from the nearest keyframe before `start` so the player state at `start` can be rebuilt."""
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f: self.meta = json.load(f)
+        self.plane_types: List[str] = self.meta.get("PlaneTypes", [])
+        self.segments = [s for s in (Segment(os.path.join(directory, name)) for name in sorted(os.listdir(directory)) if name.endswith(".rec")) if s.count]
+
+    @property
+    def start_time(self) -> Optional[float]: return self.segments[0].start_time if self.segments else None
+    @property
+    def end_time(self) -> Optional[float]: return self.segments[-1].end_time if self.segments else None
+
+    def close(self):
+        for segment in self.segments: segment.close()
+
+    def decode(self, buffer: Any, offset: int) -> Dict[str, Any]:
+        kind, flags, player_id, when = HEADER.unpack_from(buffer, offset)
+        record: Dict[str, Any] = {"Type": kind, "Player": player_id, "Time": when}
+        if kind == REC_POSITION:
+            _, _, _, _, px, py, pz, rx, ry, rz, plane, state, vtol_angle, livery_id = _POSITION.unpack_from(buffer, offset)
+            record.update(Position=(px, py, pz), Rotation=(rx, ry, rz), PlaneType=self._plane_name(plane), Flags=state, VTOLAngle=vtol_angle, LiveryId=livery_id)
+        elif kind == REC_JOIN:
+            _, _, _, _, plane, name = _JOIN.unpack_from(buffer, offset)
+            record.update(Username=name.rstrip(b"\x00").decode('utf-8', errors='replace'), PlaneType=self._plane_name(plane))
+        elif kind == REC_CHAT:
+            _, _, _, _, length, chunk = _CHAT.unpack_from(buffer, offset); record.update(Chunk=chunk[:length], More=bool(flags & FLAG_MORE))
+        elif kind == REC_KEYFRAME: record["Players"] = _KEYFRAME.unpack_from(buffer, offset)[4]
+        elif kind == REC_SEGMENT: record["Segment"] = _SEGMENT.unpack_from(buffer, offset)[5]
+        return record
+
+    def _plane_name(self, index: int) -> Optional[str]: return self.plane_types[index] if index < len(self.plane_types) else None
+
+    def records(self, start: Optional[float] = None, end: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Records up to `end`; chat chunks are joined into one record with Sender and Message."""
+        first = 0
+        if start is not None:
+            starts = [s.start_time for s in self.segments]
+            first = max(0, bisect.bisect_right(starts, start) - 1)
+        for number, segment in enumerate(self.segments[first:]):
+            begin = segment.keyframe_before(start) if start is not None and number == 0 else 0
+            chat = b""
+            for offset in range(begin * RECORD_SIZE, segment.count * RECORD_SIZE, RECORD_SIZE):
+                record = self.decode(segment.records, offset)
+                if end is not None and record["Time"] >= end: return
+                if record["Type"] == REC_CHAT:
+                    chat += record.pop("Chunk")
+                    if record.pop("More"): continue
+                    sender, _, message = chat.decode('utf-8', errors='replace').partition("\x00"); chat = b""
+                    record.update(Sender=sender, Message=message)
+                yield record
@@ -0,0 +1,169 @@
+# file: replay.py
+# Reads flight recordings made with recordDirectory and streams them back into a server.
+#   Summary:  python replay.py Recordings/20260101-120000 --info
+#   Records:  python replay.py Recordings/20260101-120000 --dump --start 60 --end 90
+#   Replay:   python replay.py Recordings/20260101-120000 --port 12345 --speed 4 [--protocol binary] [--start 60]
+#   (every recorded player gets its own connection: set connectRate/handshakeRate to 0 on the target server)
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import index
+import recorder
+import wire
+
+MAX_SPEED = 50.0
+MIN_SLEEP = 0.002
+
+class ReplayClient:
+    """One recorded player as a live connection; whatever the server sends back is read and discarded."""
+    def __init__(self, username: str, plane_type: Optional[str], binary: bool, plane_types: List[str]):
+        self.username = username; self.plane_type = plane_type or "None"; self.binary = binary; self.plane_types = plane_types
+        self.writer: Optional[asyncio.StreamWriter] = None; self._drain: Optional[asyncio.Task] = None
+
+    async def connect(self, host: str, port: int) -> bool:
+        try:
+            reader, self.writer = await asyncio.wait_for(asyncio.open_connection(host, port, limit=2 ** 24), timeout=10.0)
+            hello: Dict[str, Any] = {"Username": self.username, "PlaneType": self.plane_type}
+            if self.binary: hello["Protocol"] = wire.PROTOCOL_BINARY
+            self.writer.write(json.dumps(hello).encode('utf-8') + index.PACKET_TERMINATOR); await self.writer.drain()
+            welcome = json.loads((await asyncio.wait_for(reader.readuntil(index.PACKET_TERMINATOR), timeout=10.0))[:-1])
+            if welcome.get("Message") != "Connection validated": self.close(); return False
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError): self.close(); return False
+        self._drain = asyncio.create_task(self._discard(reader)); return True
+
+    @staticmethod
+    async def _discard(reader: asyncio.StreamReader):
+        try:
+            while await reader.read(65536): pass
+        except OSError: pass
+
+    @property
+    def connected(self) -> bool: return self.writer is not None and not self.writer.is_closing()
+
+    def send_position(self, record: Dict[str, Any]):
+        if not self.connected: return
+        block = {"Position": wire.format_vector3(*record["Position"]) or "0,0,0", "PlaneType": record["PlaneType"] or self.plane_type,
+                 "Rotation": wire.format_vector3(*record["Rotation"]) or "0,0,0", "State": wire.state_from_flags(record["Flags"], record["VTOLAngle"], record["LiveryId"], "0,0,0")}
+        self.writer.write(wire.encode_position(block, self.plane_types) if self.binary else json.dumps({"PositionService": block}).encode('utf-8') + index.PACKET_TERMINATOR)
+
+    def send_chat(self, message: str):
+        if not self.connected: return
+        self.writer.write(wire.encode_chat(message) if self.binary else json.dumps({"ChatService": {"Pending": message}}).encode('utf-8') + index.PACKET_TERMINATOR)
+
+    def close(self):
+        if self._drain: self._drain.cancel()
+        if self.writer: self.writer.close()
+
+class Replayer:
+    """Plays records in time order: joins open a connection, leaves close it, positions and chat are sent from the
+    player's own connection. Records before `start` (back to the nearest keyframe) only rebuild who is flying where;
+    each player's latest position is sent when playback reaches `start`."""
+    def __init__(self, recording: recorder.Recording, args: argparse.Namespace):
+        self.recording = recording; self.args = args; self.binary = args.protocol == "binary"
+        self.clients: Dict[str, ReplayClient] = {}; self.names: Dict[int, str] = {}
+        self._keyframe_left: Optional[int] = None; self._keyframe_names: Set[str] = set()  # JOINs still expected in the current keyframe
+        self.positions = 0; self.chats = 0; self.skipped_chats = 0; self.failed = 0
+
+    async def _join(self, record: Dict[str, Any]):
+        username = self.args.prefix + record["Username"]; previous = self.names.get(record["Player"])
+        if previous is not None and previous != username: self._leave(record["Player"])
+        self.names[record["Player"]] = username
+        if self._keyframe_left: self._keyframe_left -= 1; self._keyframe_names.add(username)
+        if username in self.clients: return
+        client = ReplayClient(username, record["PlaneType"], self.binary, self.recording.plane_types)
+        if await client.connect(self.args.host, self.args.port): self.clients[username] = client
+        else: self.failed += 1
+
+    def _leave(self, player_id: int):
+        username = self.names.pop(player_id, None); client = self.clients.pop(username, None) if username else None
+        if client: client.close()
+
+    def _keyframe_done(self):
+        # A keyframe lists everyone present, so anyone it did not mention has left (records may have been dropped).
+        for username in [u for u in self.clients if u not in self._keyframe_names]: self.clients.pop(username).close()
+        self.names = {i: u for i, u in self.names.items() if u in self.clients}; self._keyframe_left = None
+
+    async def run(self, start: float, end: Optional[float]):
+        latest: Optional[Dict[str, Dict[str, Any]]] = {}  # username -> last position seen before `start`
+        wall_start = time.perf_counter()
+        for record in self.recording.records(start, end):
+            kind, when = record["Type"], record["Time"]
+            if latest is not None and when >= start:
+                for username, position in latest.items():
+                    if username in self.clients: self.clients[username].send_position(position); self.positions += 1
+                latest = None; wall_start = time.perf_counter()
+            if latest is None:
+                delay = wall_start + (when - start) / self.args.speed - time.perf_counter()
+                if delay > MIN_SLEEP: await asyncio.sleep(delay)
+            if kind == recorder.REC_KEYFRAME: self._keyframe_left = record["Players"]; self._keyframe_names = set()
+            elif kind == recorder.REC_SEGMENT: self.names = {}
+            elif kind == recorder.REC_JOIN: await self._join(record)
+            elif kind == recorder.REC_LEAVE: self._leave(record["Player"])
+            elif kind == recorder.REC_POSITION:
+                username = self.names.get(record["Player"]); client = self.clients.get(username) if username else None
+                if client is None: continue
+                if latest is not None: latest[username] = record
+                else: client.send_position(record); self.positions += 1
+            elif kind == recorder.REC_CHAT and latest is None:
+                client = self.clients.get(self.args.prefix + record["Sender"])
+                # Server and plugin messages (and players that could not connect) have no connection to send from.
+                if client is None: self.skipped_chats += 1; continue
+                client.send_chat(record["Message"]); self.chats += 1
+            if self._keyframe_left == 0: self._keyframe_done()
+        await asyncio.sleep(0.5)  # let the last writes reach the server before the connections close
+        for client in self.clients.values(): client.close()
+
+def print_info(recording: recorder.Recording):
+    start, end = recording.start_time, recording.end_time
+    if start is None: print("Empty recording."); return
+    counts: Dict[int, int] = {}; players: Set[str] = set(); keyframes = sum(len(s.keyframes) for s in recording.segments)
+    for record in recording.records():
+        counts[record["Type"]] = counts.get(record["Type"], 0) + 1
+        if record["Type"] == recorder.REC_JOIN: players.add(record["Username"])
+    print(f"Started:    {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start))}  ({end - start:.1f}s)")
+    print(f"Segments:   {len(recording.segments)}, {sum(s.count for s in recording.segments)} records, {keyframes} keyframes")
+    print(f"Players:    {len(players)}")
+    print(f"Positions:  {counts.get(recorder.REC_POSITION, 0)}   Chat: {counts.get(recorder.REC_CHAT, 0)}   Joins: {counts.get(recorder.REC_JOIN, 0)}   Leaves: {counts.get(recorder.REC_LEAVE, 0)}")
+
+def dump(recording: recorder.Recording, start: float, end: Optional[float]):
+    names = {value: key[4:].title() for key, value in vars(recorder).items() if key.startswith("REC_")}
+    for record in recording.records(start, end):
+        if record["Time"] < start: continue
+        record["Type"] = names.get(record["Type"], record["Type"]); record["Offset"] = round(record.pop("Time") - recording.start_time, 3)
+        print(json.dumps(record, ensure_ascii=False))
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="TFSMP flight recording replay")
+    parser.add_argument("recording", help="a recording directory (one server run)")
+    parser.add_argument("--info", action="store_true", help="print a summary and exit"); parser.add_argument("--dump", action="store_true", help="print records as JSON lines and exit")
+    parser.add_argument("--start", type=float, default=0.0, help="seconds into the recording to start from")
+    parser.add_argument("--end", type=float, help="seconds into the recording to stop at")
+    parser.add_argument("--host", default="127.0.0.1"); parser.add_argument("--port", type=int, default=12345)
+    parser.add_argument("--speed", type=float, default=1.0, help=f"playback speed, up to {MAX_SPEED:g}x")
+    parser.add_argument("--protocol", choices=("json", "binary"), default="json")
+    parser.add_argument("--prefix", default="replay_", help="prepended to recorded usernames")
+    args = parser.parse_args(argv)
+    if not 0 < args.speed <= MAX_SPEED: parser.error(f"--speed must be greater than 0 and at most {MAX_SPEED:g}")
+
+    try: recording = recorder.Recording(args.recording)
+    except (OSError, ValueError) as e: print(f"Could not open recording: {e}"); sys.exit(1)
+    try:
+        if recording.start_time is None: print("Empty recording."); return
+        start = recording.start_time + args.start; end = None if args.end is None else recording.start_time + args.end
+        if args.info: print_info(recording)
+        elif args.dump: dump(recording, start, end)
+        else:
+            replayer = Replayer(recording, args); began = time.perf_counter()
+            try: asyncio.run(replayer.run(start, end))
+            except KeyboardInterrupt: pass
+            print(f"Replayed {replayer.positions} positions and {replayer.chats} chat lines in {time.perf_counter() - began:.1f}s "
+                  f"({replayer.failed} players could not connect, {replayer.skipped_chats} chat lines without a connection skipped).")
+    finally: recording.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# file: sendqueue.py
+# Per-connection outbound queue with its own writer task, so the tick never waits on a socket.
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Optional
+
+MAX_RELIABLE_FRAMES = 256
+
+class SendQueue:
+    """Holds at most one pending world snapshot (a newer one replaces it) plus an ordered, bounded queue of
+    reliable frames (welcome, chat, popups) that are never dropped and are written before the snapshot.
+
+    `on_failure(reason)` is called once if the peer errors, overflows the reliable queue or has been stuck in
+    one drain for more than `deadline` seconds when the next snapshot arrives; the queue is closed at that point.
+    A frame put with `last=True` (a kick popup) is written after everything queued before it; then the writer
+    task ends and wait_closed() returns."""
+    def __init__(self, writer: asyncio.StreamWriter, on_failure: Callable[[str], None], deadline: float, max_reliable: int = MAX_RELIABLE_FRAMES):
+        self._writer = writer; self._on_failure = on_failure; self.deadline = deadline; self.max_reliable = max_reliable
+        self._reliable: Deque[bytes] = deque(); self._snapshot: Optional[bytes] = None
+        self._wakeup = asyncio.Event(); self._task: Optional[asyncio.Task] = None; self.closed = False
+        self._draining_since: Optional[float] = None; self._last_queued = False
+        # A stream compressor is stateful, so frames go through it in the order they are written, not queued.
+        self.compressor: Optional[Any] = None; self._uncompressed = 0
+        self.pending_bytes = 0; self.frames_sent = 0; self.bytes_sent = 0; self.snapshots_dropped = 0
+
+    def put_snapshot(self, frame: bytes):
+        """Latest-wins: a snapshot still waiting from an earlier tick is dropped."""
+        if self.closed or self._last_queued: return
+        if self._draining_since is not None and time.perf_counter() - self._draining_since > self.deadline:
+            self._fail(f"send backlog not drained within {self.deadline:g}s"); return
+        if self._snapshot is not None: self.pending_bytes -= len(self._snapshot); self.snapshots_dropped += 1
+        self._snapshot = frame; self.pending_bytes += len(frame); self._wake()
+
+    def put(self, frame: bytes, last: bool = False):
+        """Queues a frame that is never dropped. A `last` frame is always accepted, replaces any pending snapshot, and
+        anything put after it is ignored."""
+        if self.closed or self._last_queued: return
+        if last:
+            self._last_queued = True
+            if self._snapshot is not None: self.pending_bytes -= len(self._snapshot); self._snapshot = None
+        elif len(self._reliable) >= self.max_reliable: self._fail(f"reliable queue full ({self.max_reliable} frames)"); return
+        self._reliable.append(frame); self.pending_bytes += len(frame); self._wake()
+
+    async def wait_closed(self, timeout: float):
+        """Waits up to `timeout` seconds for a `last` frame to be written, then closes the queue either way."""
+        if self._task is not None and not self.closed: await asyncio.wait((self._task,), timeout=timeout)
+        self.close()
+
+    def set_compressor(self, compressor: Any):
+        """Frames queued from now on are written through `compressor.compress`; those already queued go out as they are."""
+        self.compressor = compressor; self._uncompressed = len(self._reliable)
+
+    def _wake(self):
+        if self._task is None: self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    def _fail(self, reason: str):
+        if self.closed: return
+        self.close(); self._on_failure(reason)
+
+    def close(self):
+        self.closed = True; self._reliable.clear(); self._snapshot = None; self.pending_bytes = 0
+        if self._task is not None and self._task is not asyncio.current_task(): self._task.cancel()
+
+    async def _run(self):
+        writer = self._writer
+        try:
+            while not self.closed:
+                await self._wakeup.wait(); self._wakeup.clear()
+                while not self.closed and (self._reliable or self._snapshot is not None):
+                    plain = False
+                    if self._reliable:
+                        frame = self._reliable.popleft()
+                        if self._uncompressed: self._uncompressed -= 1; plain = True
+                    else: frame, self._snapshot = self._snapshot, None
+                    self.pending_bytes -= len(frame)
+                    if writer.is_closing(): self._fail("connection closing"); return
+                    if self.compressor is not None and not plain: frame = self.compressor.compress(frame)
+                    writer.write(frame); self.frames_sent += 1; self.bytes_sent += len(frame)
+                    # No per-drain timer: put_snapshot checks how long this drain has been stuck.
+                    self._draining_since = time.perf_counter(); await writer.drain(); self._draining_since = None
+                if self._last_queued and not self._reliable: return
+        except (ConnectionResetError, BrokenPipeError, OSError) as e: self._fail(type(e).__name__)
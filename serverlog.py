@@ -0,0 +1,153 @@
+# file: serverlog.py
+# Log records are queued and written by a background thread, so a slow or stuck stdout never blocks the event loop.
+# Sinks: the colour console (the old print output) and an optional JSON-lines file rotated by size.
+
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from colorama import Fore, Style
+
+DEBUG, INFO, WARN, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {"debug": DEBUG, "info": INFO, "warn": WARN, "warning": WARN, "error": ERROR}
+# kind -> (level, console colour, console tag); log/green/bold are all informational.
+KINDS: Dict[str, Tuple[int, str, str]] = {
+    "debug": (DEBUG, Fore.WHITE, "[DEBUG] "), "log": (INFO, Fore.CYAN, "[LOG] "), "info": (INFO, "", "[INFO] "),
+    "green": (INFO, Fore.GREEN + Style.BRIGHT, ""), "bold": (INFO, Style.BRIGHT, ""),
+    "warn": (WARN, Fore.YELLOW, "[WARN] "), "error": (ERROR, Fore.RED, "[ERROR] "),
+}
+QUEUE_SIZE = 10000
+REPEAT_INTERVAL = 10.0
+MAX_REPEAT_KEYS = 4096
+FILE_MAX_BYTES = 10 * 1024 * 1024
+FILE_BACKUPS = 5
+CLOSE_TIMEOUT = 2.0
+
+Record = Tuple[float, str, str]  # epoch time, kind, message
+
+class ConsoleSink:
+    def __init__(self, stream: Any = None): self.stream = stream
+    def write(self, when: float, kind: str, message: str):
+        _, colour, tag = KINDS[kind]; stream = self.stream or sys.stdout
+        stream.write(f"{colour}{tag}{message}{Style.RESET_ALL if colour else ''}\n"); stream.flush()
+    def close(self): pass
+
+class JsonFileSink:
+    """One JSON object per line; at `max_bytes` the file is renamed to .1 (older copies shift up to .`backups`)."""
+    def __init__(self, path: str, max_bytes: int = FILE_MAX_BYTES, backups: int = FILE_BACKUPS):
+        self.path = path; self.max_bytes = max_bytes; self.backups = backups
+        directory = os.path.dirname(path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8"); self._size = self._file.tell()
+
+    def write(self, when: float, kind: str, message: str):
+        line = json.dumps({"time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(when)) + f".{int(when % 1 * 1000):03d}",
+                           "level": kind, "message": message}, ensure_ascii=False) + "\n"
+        size = len(line.encode("utf-8"))
+        if self.max_bytes > 0 and self._size and self._size + size > self.max_bytes: self._rotate()
+        self._file.write(line); self._file.flush(); self._size += size
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"): os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0: os.replace(self.path, f"{self.path}.1")
+        self._file = open(self.path, "w" if self.backups > 0 else "a", encoding="utf-8"); self._size = self._file.tell()
+
+    def close(self): self._file.close()
+
+class LogPipeline:
+    """emit() filters by level, collapses repeats and queues the record; a daemon thread writes it to every sink.
+    Warnings and errors with the same key (the message itself unless one is given) are written at most once per
+    `repeat_interval` seconds; the next one written says how many were suppressed. If the queue is full the record
+    is dropped and counted rather than waited for."""
+    def __init__(self, level: int = DEBUG, sinks: Optional[List[Any]] = None, repeat_interval: float = REPEAT_INTERVAL, queue_size: int = QUEUE_SIZE):
+        self.level = level; self.sinks = [ConsoleSink()] if sinks is None else sinks; self.repeat_interval = repeat_interval
+        self._queue: "queue.Queue[Optional[Record]]" = queue.Queue(queue_size)
+        self._repeats: Dict[str, List[float]] = {}; self._lock = threading.Lock()  # key -> [last written, suppressed since]
+        self.dropped = 0; self.suppressed = 0; self._reported_dropped = 0
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True); self._thread.start()
+
+    def emit(self, kind: str, message: Any, key: Optional[str] = None):
+        level = KINDS[kind][0]
+        if level < self.level: return
+        message = str(message); now = time.time()
+        if level >= WARN and self.repeat_interval > 0:
+            with self._lock:
+                key = message if key is None else key; seen = self._repeats.get(key)
+                if seen is not None and now - seen[0] < self.repeat_interval: seen[1] += 1; self.suppressed += 1; return
+                if seen is not None and seen[1]: message += f" ({int(seen[1])} similar suppressed)"
+                if seen is None and len(self._repeats) >= MAX_REPEAT_KEYS: self._prune(now)
+                self._repeats[key] = [now, 0]
+        self._put((now, kind, message))
+
+    def _prune(self, now: float):
+        for key in [k for k, (last, _) in self._repeats.items() if now - last >= self.repeat_interval]: del self._repeats[key]
+
+    def _put(self, record: Record):
+        try: self._queue.put_nowait(record)
+        except queue.Full: self.dropped += 1
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None: break
+            if self.dropped != self._reported_dropped:
+                lost = self.dropped - self._reported_dropped; self._reported_dropped = self.dropped
+                self._write((time.time(), "warn", f"{lost} log records dropped: the log output could not keep up."))
+            self._write(record)
+
+    def _write(self, record: Record):
+        for sink in self.sinks:
+            try: sink.write(*record)
+            except Exception: pass  # a broken sink must not take the writer (or the other sinks) down
+
+    def close(self, timeout: float = CLOSE_TIMEOUT):
+        """Writes what is queued, waiting at most `timeout` seconds (the output may be stuck), then closes the sinks."""
+        if not self._thread.is_alive(): return
+        with self._lock:
+            pending = [(k, int(s)) for k, (_, s) in self._repeats.items() if s]; self._repeats.clear()
+        for key, count in pending: self._put((time.time(), "warn", f"{count} more like: {key}"))
+        try: self._queue.put(None, timeout=timeout)
+        except queue.Full: return
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            for sink in self.sinks: sink.close()
+
+_pipeline: Optional[LogPipeline] = None
+_pipeline_lock = threading.Lock()
+
+def pipeline() -> LogPipeline:
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None: _pipeline = LogPipeline()
+    return _pipeline
+
+def configure(level: Any = "debug", console: bool = True, file_path: Optional[str] = None, file_max_bytes: int = FILE_MAX_BYTES,
+              file_backups: int = FILE_BACKUPS, repeat_interval: float = REPEAT_INTERVAL) -> LogPipeline:
+    """Replaces the process-wide pipeline; what the old one still had queued is written first. Raises ValueError for
+    an unknown level and OSError if the log file cannot be opened."""
+    global _pipeline
+    if isinstance(level, str):
+        if level.lower() not in LEVEL_NAMES: raise ValueError(f"Unknown log level '{level}'")
+        level = LEVEL_NAMES[level.lower()]
+    sinks: List[Any] = [ConsoleSink()] if console else []
+    if file_path: sinks.append(JsonFileSink(file_path, file_max_bytes, file_backups))
+    with _pipeline_lock:
+        old, _pipeline = _pipeline, LogPipeline(int(level), sinks, repeat_interval)
+    if old is not None: old.close()
+    return _pipeline
+
+def emit(kind: str, message: Any, key: Optional[str] = None): pipeline().emit(kind, message, key)
+
+def close(timeout: float = CLOSE_TIMEOUT):
+    if _pipeline is not None: _pipeline.close(timeout)
+
+# Scripts that never call close() still get their last lines out, unless the output is stuck.
+atexit.register(close)
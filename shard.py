@@ -0,0 +1,278 @@
+# file: shard.py
+# Sharded mode: K worker processes accept clients on the same host and port (SO_REUSEPORT), each owning the
+# players it accepted. A coordinator process merges their positions once per tick and sends every worker the
+# players owned by the others, serialises chat, keeps usernames unique across workers and runs the plugins
+# against a merged TFSMPAPI view. Frames on the worker sockets are length-prefixed JSON, as in pluginhost.
+# Admission state is not shared. Every worker has its own connect/handshake rate limiters, and the kernel spreads
+# one address's connections over the workers, so a per-IP limit is effectively up to K times the configured one.
+# Every worker loads banned_ips.json when it starts, but a ban added or lifted at runtime changes only that worker's
+# list (and the file); the others pick it up when they restart.
+
+import asyncio
+import itertools
+import multiprocessing
+import socket
+import time
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import codec
+import events
+import playerindex
+from pluginhost import encode_message, _read_messages, reap
+from sendqueue import SendQueue
+from ticker import TickScheduler
+
+CLAIM_TIMEOUT = 5.0
+LINK_DEADLINE = 10.0
+LINK_MAX_FRAMES = 1 << 16
+RESTART_DELAY = 1.0
+
+_CONTEXT = multiprocessing.get_context("spawn")
+
+def supported() -> bool: return hasattr(socket, "SO_REUSEPORT")
+
+# -- worker process side --------------------------------------------------------------------------------
+
+class ShardLink:
+    """A worker's connection to the coordinator. publish() sends the local players whose entries changed since the
+    last tick; World messages are queued as they arrive and applied by apply() at the start of the next tick, so a
+    tick never sees half of one. Chat goes out with chat() and comes back, in the coordinator's order, to every
+    worker (the sender's included) through `state.add_chat_message`."""
+    def __init__(self, sock: socket.socket, worker_id: int):
+        self.sock = sock; self.worker_id = worker_id
+        self.state: Any = None; self.kick: Callable[[str, str], Any] = lambda username, message: None; self.closed: Callable[[], Any] = lambda: None
+        self.forward_data = False; self._writer: Optional[asyncio.StreamWriter] = None; self._sender: Optional[SendQueue] = None; self._reader_task: Optional[asyncio.Task] = None
+        self._claims: Dict[int, asyncio.Future] = {}; self._claim_ids = itertools.count(1)
+        self._world: List[Dict[str, Any]] = []; self._sent: Dict[str, int] = {}
+
+    async def start(self, state: Any, data_received: events.Event, kick: Callable[[str, str], Any], closed: Callable[[], Any]):
+        self.state = state; self.kick = kick; self.closed = closed
+        async def forward(calls):
+            if self.forward_data: self.data_received(calls)
+        data_received.connect(forward, batched=True)
+        reader, self._writer = await asyncio.open_connection(sock=self.sock)
+        self._sender = SendQueue(self._writer, lambda reason: self._lost(f"send queue failed: {reason}"), LINK_DEADLINE, LINK_MAX_FRAMES)
+        self._reader_task = asyncio.create_task(self._read(reader))
+
+    def _send(self, message: Dict[str, Any]):
+        if self._sender is not None: self._sender.put(encode_message(message))
+
+    async def _read(self, reader: asyncio.StreamReader):
+        try: await _read_messages(reader, self._handle)
+        except (ConnectionError, OSError, *codec.DECODE_ERRORS) as e: self._lost(type(e).__name__); return
+        self._lost("coordinator closed the link")
+
+    def _lost(self, reason: str):
+        if self._sender is None: return
+        self._sender.close(); self._sender = None; self._writer.close()
+        for future in self._claims.values():
+            if not future.done(): future.set_result(False)
+        self.closed()
+
+    def close(self):
+        if self._reader_task is not None: self._reader_task.cancel()
+        if self._sender is not None: self._sender.close(); self._sender = None; self._writer.close()
+
+    def _handle(self, message: Dict[str, Any]):
+        kind = message.get("Type")
+        if kind == "World": self._world.append(message)
+        elif kind == "Joined":
+            future = self._claims.pop(message.get("Id"), None)
+            if future is not None and not future.done(): future.set_result(bool(message.get("Ok")))
+        elif kind == "Chat": self.state.add_chat_message(str(message.get("Sender")), str(message.get("Message")))
+        elif kind == "Kick": self.kick(str(message.get("Username")), str(message.get("Message")))
+        elif kind == "Forward": self.forward_data = bool(message.get("DataReceived"))
+
+    async def claim(self, username: str, address: Any, protocol: int) -> bool:
+        """Reserves `username` on every worker; False if someone else has it (or the coordinator does not answer)."""
+        if self._sender is None: return False
+        claim_id = next(self._claim_ids); future = asyncio.get_running_loop().create_future(); self._claims[claim_id] = future
+        self._send({"Type": "Join", "Id": claim_id, "Username": username, "Address": list(address) if address else None, "Protocol": protocol})
+        try: return await asyncio.wait_for(future, CLAIM_TIMEOUT)
+        except asyncio.TimeoutError: self._claims.pop(claim_id, None); return False
+
+    def left(self, username: str): self._send({"Type": "Left", "Username": username})
+    def reaped(self, username: str): self._sent.pop(username, None); self._send({"Type": "Reaped", "Username": username})
+    def chat(self, sender: str, message: str): self._send({"Type": "Chat", "Sender": sender, "Message": message})
+    def data_received(self, calls: List[Any]): self._send({"Type": "Data", "Calls": [[player.Username, entry] for player, entry in calls]})
+
+    def publish(self, versions: Dict[str, int]):
+        players, positions, sent = self.state.players, self.state.player_positions, self._sent
+        changed = {u: positions[u] for u, v in versions.items() if u in players and sent.get(u) != v and u in positions}
+        if not changed: return
+        for username in changed: sent[username] = versions[username]
+        self._send({"Type": "Tick", "Positions": changed})
+
+    def apply(self):
+        world, self._world = self._world, []
+        for message in world:
+            for username in message.get("Removed") or (): self.state.remove_remote_player(username)
+            for username, entry in (message.get("Positions") or {}).items(): self.state.update_remote_player(username, entry)
+
+# -- coordinator side -----------------------------------------------------------------------------------
+
+class ShardPlayer:
+    def __init__(self, username: str, coordinator: 'ShardCoordinator'): self.Username = username; self._coordinator = coordinator
+    def IsConnected(self) -> bool:
+        info = self._coordinator.players.get(self.Username); return bool(info and info["connected"])
+    async def Kick(self, message="Bạn đã bị kick."): self._coordinator.kick(self.Username, message)
+
+class ShardAPI(playerindex.PlayerQueries):
+    """PrimaryAPI for plugins in sharded mode: the same names as TFSMPAPI over the merged world. Players entries
+    carry "address", "protocol", "worker" and "api_player"; Kick and SendChat are routed to the workers."""
+    def __init__(self, coordinator: 'ShardCoordinator', executor: Any = None, callback_timeout: float = events.PLUGIN_CALLBACK_TIMEOUT):
+        self._coordinator = coordinator; self._index = coordinator.index
+        self.PlayerConnected = events.Event("PlayerConnected", executor, callback_timeout); self.PlayerDisconnected = events.Event("PlayerDisconnected", executor, callback_timeout)
+        self.DataReceived = events.CoalescedEvent("DataReceived", executor, callback_timeout)
+    @property
+    def PlayerData(self) -> Dict[str, List[Any]]: return self._coordinator.world
+    @property
+    def Players(self) -> Dict[str, Dict[str, Any]]: return self._coordinator.players
+    def GetAPIPlayer(self, username: str) -> Optional[ShardPlayer]:
+        info = self._coordinator.players.get(username); return info["api_player"] if info else None
+    @property
+    def TickStats(self) -> Dict[str, Any]: return self._coordinator.tick_scheduler.stats()
+    def SendChat(self, message: str, sender: str = "Server"): self._coordinator.chat(str(sender), str(message)[:150])
+
+class ShardWorker:
+    """Coordinator-side handle for one worker process; what it should hear about next tick collects in the outbox."""
+    def __init__(self, worker_id: int):
+        self.worker_id = worker_id; self.process: Optional[multiprocessing.Process] = None
+        self.writer: Optional[asyncio.StreamWriter] = None; self.sender: Optional[SendQueue] = None; self._reader_task: Optional[asyncio.Task] = None
+        self.positions: Dict[str, List[Any]] = {}; self.removed: Set[str] = set(); self.restarts = 0; self.restart_at: Optional[float] = None
+        self._reap_task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool: return self.process is not None
+
+    def send(self, message: Dict[str, Any]):
+        if self.sender is not None: self.sender.put(encode_message(message))
+
+class ShardCoordinator:
+    """Starts `count` workers running `target(config, worker_id, socket)` and merges their worlds every
+    `update_interval` seconds. A worker that exits takes its players with it (the others are told they left) and is
+    restarted after RESTART_DELAY seconds."""
+    def __init__(self, config: Dict[str, Any], count: int, target: Callable[..., Any], update_interval: float, warn: Callable[[str], Any] = print, log: Callable[[str], Any] = print):
+        self.config = config; self.target = target; self.warn = warn; self.log = log
+        self.workers = [ShardWorker(i) for i in range(count)]
+        self.world: Dict[str, List[Any]] = {}; self.players: Dict[str, Dict[str, Any]] = {}
+        self.index = playerindex.entry_index(lambda: self.world, config.get("gridCellSize", playerindex.CELL_SIZE))
+        self.api: Optional[ShardAPI] = None; self.tick_scheduler = TickScheduler(update_interval); self.stopping = False
+        self._forwarding = False; self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        for worker in self.workers: await self._start_worker(worker)
+        self._task = asyncio.create_task(self.tick_scheduler.run(self._tick))
+
+    async def _start_worker(self, worker: ShardWorker):
+        coordinator_socket, worker_socket = socket.socketpair()
+        worker.process = _CONTEXT.Process(target=self.target, args=(self.config, worker.worker_id, worker_socket), name=f"shard-{worker.worker_id}", daemon=True)
+        worker.process.start(); worker_socket.close(); worker.restart_at = None
+        # A restarted worker starts empty: its first World carries everyone the other workers own.
+        worker.positions = {u: entry for u, entry in self.world.items() if self.players[u]["worker"] != worker.worker_id}; worker.removed = set()
+        reader, worker.writer = await asyncio.open_connection(sock=coordinator_socket)
+        worker.sender = SendQueue(worker.writer, lambda reason: self._stopped(worker, f"send queue failed: {reason}"), LINK_DEADLINE, LINK_MAX_FRAMES)
+        worker._reader_task = asyncio.create_task(self._read(worker, reader))
+        if self._forwarding: worker.send({"Type": "Forward", "DataReceived": True})
+        self.log(f"Shard worker {worker.worker_id} started (pid {worker.process.pid}).")
+
+    async def _read(self, worker: ShardWorker, reader: asyncio.StreamReader):
+        try: await _read_messages(reader, lambda message: self._handle(worker, message))
+        except (ConnectionError, OSError, *codec.DECODE_ERRORS) as e: self._stopped(worker, type(e).__name__); return
+        self._stopped(worker, "link closed")
+
+    def _stopped(self, worker: ShardWorker, reason: str):
+        if worker.process is None: return
+        process, worker.process = worker.process, None
+        if worker.sender is not None: worker.sender.close(); worker.sender = None; worker.writer.close()
+        if worker._reader_task is not None and worker._reader_task is not asyncio.current_task(): worker._reader_task.cancel()
+        worker._reap_task = asyncio.create_task(self._reap(worker, process))
+        for username in [u for u, info in self.players.items() if info["worker"] == worker.worker_id]: self._disconnected(username); self._remove(username)
+        if self.stopping: return
+        self.warn(f"Shard worker {worker.worker_id} stopped ({reason}); restarting in {RESTART_DELAY:g}s.")
+        worker.positions.clear(); worker.removed.clear(); worker.restart_at = time.perf_counter() + RESTART_DELAY
+
+    async def _reap(self, worker: ShardWorker, process: multiprocessing.Process):
+        if not await reap(process): self.warn(f"Shard worker {worker.worker_id} (pid {process.pid}) could not be reaped.")
+
+    def _handle(self, worker: ShardWorker, message: Dict[str, Any]):
+        kind = message.get("Type")
+        if kind == "Tick":
+            for username, entry in (message.get("Positions") or {}).items():
+                info = self.players.get(username)
+                if info is None or info["worker"] != worker.worker_id: continue
+                self.world[username] = entry; self.index.track_entry(username, entry)
+                for other in self.workers:
+                    if other is not worker: other.positions[username] = entry; other.removed.discard(username)
+        elif kind == "Data":
+            for username, entry in message.get("Calls") or ():
+                info = self.players.get(username)
+                if info is not None and self.api is not None: self.api.DataReceived.post(username, info["api_player"], entry)
+        elif kind == "Join":
+            username = str(message.get("Username")); ok = username not in self.players
+            if ok:
+                address = message.get("Address")
+                self.players[username] = {"address": tuple(address) if address else None, "protocol": message.get("Protocol"), "worker": worker.worker_id,
+                                          "connected": True, "api_player": ShardPlayer(username, self)}
+                self.index.addresses.set(username, str(address[0]) if address else None)
+            worker.send({"Type": "Joined", "Id": message.get("Id"), "Ok": ok})
+            if ok and self.api is not None: self.api.PlayerConnected.fire(self.players[username]["api_player"])
+        elif kind == "Left": self._disconnected(str(message.get("Username")), worker)
+        elif kind == "Reaped":
+            username = str(message.get("Username")); info = self.players.get(username)
+            if info is not None and info["worker"] == worker.worker_id: self._remove(username)
+        elif kind == "Chat": self.chat(str(message.get("Sender")), str(message.get("Message")))
+
+    async def _restart(self, worker: ShardWorker):
+        # The old process is gone before its replacement binds the port.
+        if worker._reap_task is not None: await worker._reap_task
+        try: await self._start_worker(worker)
+        except OSError as e: self.warn(f"Could not restart shard worker {worker.worker_id}: {e}")
+
+    def _disconnected(self, username: str, worker: Optional[ShardWorker] = None):
+        info = self.players.get(username)
+        if info is None or not info["connected"] or (worker is not None and info["worker"] != worker.worker_id): return
+        info["connected"] = False
+        if self.api is not None: self.api.PlayerDisconnected.fire(info["api_player"])
+
+    def _remove(self, username: str):
+        self.players.pop(username, None); self.world.pop(username, None); self.index.remove(username); self.index.grid.remove(username)
+        for worker in self.workers: worker.positions.pop(username, None); worker.removed.add(username)
+
+    def chat(self, sender: str, message: str):
+        frame_message = {"Type": "Chat", "Sender": sender, "Message": message}
+        for worker in self.workers: worker.send(frame_message)
+
+    def kick(self, username: str, message: str):
+        info = self.players.get(username)
+        if info is not None: self.workers[info["worker"]].send({"Type": "Kick", "Username": username, "Message": message})
+
+    def _tick(self):
+        now = time.perf_counter()
+        for worker in self.workers:
+            if worker.process is not None and not worker.process.is_alive(): self._stopped(worker, f"exit code {worker.process.exitcode}")
+            elif worker.running and (worker.positions or worker.removed):
+                worker.send({"Type": "World", "Positions": worker.positions, "Removed": list(worker.removed)})
+                worker.positions = {}; worker.removed = set()
+            elif worker.restart_at is not None and now >= worker.restart_at:
+                worker.restarts += 1; worker.restart_at = None; asyncio.create_task(self._restart(worker))
+        if self.api is not None:
+            forwarding = self.api.DataReceived.has_subscribers
+            if forwarding != self._forwarding:
+                self._forwarding = forwarding
+                for worker in self.workers: worker.send({"Type": "Forward", "DataReceived": forwarding})
+            self.api.DataReceived.flush()
+
+    async def stop(self):
+        self.stopping = True
+        if self._task is not None: self._task.cancel()
+        # Closing a link is a worker's signal to shut down gracefully; it is killed if it takes too long.
+        for worker in self.workers:
+            if worker.sender is not None: worker.sender.close(); worker.sender = None; worker.writer.close()
+            if worker._reader_task is not None: worker._reader_task.cancel()
+        for worker in self.workers:
+            if worker.process is not None:
+                await asyncio.to_thread(worker.process.join, 10.0)
+                if not await reap(worker.process): self.warn(f"Shard worker {worker.worker_id} (pid {worker.process.pid}) could not be reaped.")
+                worker.process = None
+            if worker._reap_task is not None: await worker._reap_task
@@ -0,0 +1,68 @@
+# file: spatial.py
+# Uniform grid over player positions, used for interest management.
+
+import math
+from typing import Dict, Optional, Set, Tuple
+
+Cell = Tuple[int, int, int]
+Vector3 = Tuple[float, float, float]
+
+def parse_vector3(v3: str) -> Vector3:
+    """Parses an already validated "x,y,z" string."""
+    x, y, z = v3.split(","); return float(x), float(y), float(z)
+
+class SpatialGrid:
+    """Buckets keys into cubic cells so neighbourhood queries cost O(local density) instead of O(players)."""
+    def __init__(self, cell_size: float):
+        self.cell_size = float(cell_size)
+        self._cells: Dict[Cell, Set[str]] = {}
+        self._key_cells: Dict[str, Cell] = {}
+
+    def __len__(self) -> int: return len(self._key_cells)
+    def __contains__(self, key: str) -> bool: return key in self._key_cells
+
+    def cell_at(self, position: Vector3) -> Cell:
+        size = self.cell_size; return (math.floor(position[0] / size), math.floor(position[1] / size), math.floor(position[2] / size))
+
+    def cell_of(self, key: str) -> Optional[Cell]: return self._key_cells.get(key)
+
+    def update(self, key: str, position: Vector3):
+        new_cell = self.cell_at(position); old_cell = self._key_cells.get(key)
+        if old_cell == new_cell: return
+        if old_cell is not None: self._discard(key, old_cell)
+        self._key_cells[key] = new_cell; self._cells.setdefault(new_cell, set()).add(key)
+
+    def remove(self, key: str):
+        cell = self._key_cells.pop(key, None)
+        if cell is not None: self._discard(key, cell)
+
+    def _discard(self, key: str, cell: Cell):
+        bucket = self._cells.get(cell)
+        if bucket is None: return
+        bucket.discard(key)
+        if not bucket: del self._cells[cell]
+
+    def keys_near_cell(self, cell: Cell, reach: int) -> Set[str]:
+        """All keys in the (2*reach+1)^3 block of cells centred on `cell`."""
+        cx, cy, cz = cell; found: Set[str] = set(); cells = self._cells
+        for x in range(cx - reach, cx + reach + 1):
+            for y in range(cy - reach, cy + reach + 1):
+                for z in range(cz - reach, cz + reach + 1):
+                    bucket = cells.get((x, y, z))
+                    if bucket: found |= bucket
+        return found
+
+    def keys_in_box(self, minimum: Vector3, maximum: Vector3) -> Set[str]:
+        """All keys in the cells the box touches (a superset of the keys inside it); walks the occupied cells instead
+        when the box spans more cells than are occupied."""
+        lo, hi = self.cell_at(minimum), self.cell_at(maximum); found: Set[str] = set(); cells = self._cells
+        if (hi[0] - lo[0] + 1) * (hi[1] - lo[1] + 1) * (hi[2] - lo[2] + 1) > len(cells):
+            for (x, y, z), bucket in list(cells.items()):
+                if lo[0] <= x <= hi[0] and lo[1] <= y <= hi[1] and lo[2] <= z <= hi[2]: found |= bucket
+            return found
+        for x in range(lo[0], hi[0] + 1):
+            for y in range(lo[1], hi[1] + 1):
+                for z in range(lo[2], hi[2] + 1):
+                    bucket = cells.get((x, y, z))
+                    if bucket: found |= bucket
+        return found
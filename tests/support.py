@@ -0,0 +1,48 @@
+# file: tests/support.py
+# Shared helpers: a real Server on an ephemeral localhost port and a minimal JSON-protocol client.
+
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import index
+
+TERMINATOR = b'\x1C'
+
+def config(tmp_path, **overrides) -> Dict[str, Any]:
+    """Server settings for a test: port 0, no rate limits, quiet console, nothing written next to the sources."""
+    index.BANNED_IPS_FILE = str(tmp_path / "banned_ips.json"); index.script_directory = tmp_path
+    settings = {"hostAddress": "127.0.0.1", "hostPort": 0, "connectRate": 0, "handshakeRate": 0, "logConsole": False, "tickSummaryInterval": 0}
+    settings.update(overrides); return settings
+
+@contextlib.asynccontextmanager
+async def running_server(settings: Dict[str, Any]):
+    """Yields (server, TCP port) once the server is accepting; shuts it down afterwards."""
+    server = index.Server(settings); task = asyncio.create_task(server.start())
+    try:
+        await wait_for(lambda: server._polling_task is not None)
+        yield server, server._tcp_server.sockets[0].getsockname()[1]
+    finally:
+        task.cancel(); await server.shutdown()
+
+def send(writer: asyncio.StreamWriter, message: Dict[str, Any]): writer.write(json.dumps(message).encode('utf-8') + TERMINATOR)
+
+async def read_frame(reader: asyncio.StreamReader, timeout: float = 5.0) -> Dict[str, Any]:
+    return json.loads((await asyncio.wait_for(reader.readuntil(TERMINATOR), timeout))[:-1])
+
+async def login(port: int, username: str, plane_type: str = "C-400", **hello) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter, Dict[str, Any]]:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    send(writer, {"Username": username, "PlaneType": plane_type, **hello})
+    return reader, writer, await read_frame(reader)
+
+async def wait_for(condition: Callable[[], Any], timeout: float = 5.0, interval: float = 0.01):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline: raise AssertionError("condition not met in time")
+        await asyncio.sleep(interval)
@@ -0,0 +1,52 @@
+# file: tests/test_bans.py
+
+import asyncio
+import json
+
+import pytest
+
+import bans
+import index
+import support
+
+def test_parse_entry_forms():
+    assert str(bans.parse_entry("203.0.113.7")) == "203.0.113.7/32"
+    assert str(bans.parse_entry("203.0.113.9/24")) == "203.0.113.0/24"
+    assert str(bans.parse_entry("10.")) == "10.0.0.0/8" and str(bans.parse_entry("192.168.1.")) == "192.168.1.0/24"
+    for entry in ("not-an-ip", "1.2.3.4.", "300.1.1.1", "10.0.0.0/33"):
+        with pytest.raises(ValueError): bans.parse_entry(entry)
+
+def test_lookup_matches_addresses_ranges_and_prefixes(tmp_path):
+    ban_list = bans.BanList(str(tmp_path / "bans.json"), {"203.0.113.7": "one", "198.51.100.0/24": "range", "10.": "prefix",
+                                                           "2001:db8::/32": "v6", "garbage": "kept"}, on_error=lambda message: None)
+    assert ban_list.lookup("203.0.113.7") == "one" and ban_list.lookup("203.0.113.8") is None
+    assert ban_list.lookup("198.51.100.255") == "range" and ban_list.lookup("198.51.101.0") is None
+    assert ban_list.lookup("10.200.3.4") == "prefix" and ban_list.lookup("11.0.0.1") is None
+    assert ban_list.lookup("2001:db8:1::5") == "v6" and ban_list.lookup("2001:db9::1") is None
+    assert ban_list.lookup("::ffff:198.51.100.3") == "range"  # IPv4-mapped
+    assert ban_list.lookup("garbage") is None and ban_list.lookup("") is None and "garbage" in ban_list.entries
+
+def test_longest_prefix_wins_and_remove(tmp_path):
+    ban_list = bans.BanList(str(tmp_path / "bans.json"), {"10.0.0.0/8": "wide", "10.1.0.0/16": "narrow"})
+    assert ban_list.lookup("10.1.2.3") == "narrow" and ban_list.lookup("10.2.0.1") == "wide"
+    assert ban_list.remove("10.1.0.0/16") and not ban_list.remove("10.1.0.0/16")
+    assert ban_list.lookup("10.1.2.3") == "wide"
+
+def test_ban_ip_rejects_non_ip_input_and_saves(tmp_path):
+    support.config(tmp_path); state = index.ServerState()
+    with pytest.raises(ValueError): state.ban_ip("definitely not an ip", "nope")
+    state.ban_ip("192.0.2.", "test range")  # no running loop: written at once
+    assert state.is_ip_banned("192.0.2.77") == "test range"
+    assert json.loads((tmp_path / "banned_ips.json").read_text(encoding="utf-8")) == {"192.0.2.0/24": "test range"}
+    assert state.unban_ip("192.0.2.0/24") and state.is_ip_banned("192.0.2.77") is None
+
+def test_banned_range_is_refused_at_accept(tmp_path):
+    async def scenario():
+        async with support.running_server(support.config(tmp_path)) as (server, port):
+            server.state.ban_ip("127.0.0.0/8", "testing")
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            popup = await support.read_frame(reader)
+            assert "testing" in popup["!!VoscriptPluginData"][0]
+            assert await asyncio.wait_for(reader.read(), 5) == b""
+            writer.close()
+    asyncio.run(scenario())
@@ -0,0 +1,33 @@
+# file: tests/test_chatfilter.py
+
+import chatfilter
+import support  # noqa: F401 -- puts the sources on sys.path
+
+def shipped_filter(**options) -> chatfilter.ChatFilter:
+    """The shipped word list with the server's default options."""
+    settings = {"whole_word": True, "fold": False, "mask": True, **options}
+    chat = chatfilter.ChatFilter(**settings); assert chat.load(); return chat
+
+def test_defaults_leave_ordinary_vietnamese_alone():
+    chat = shipped_filter()
+    for message in ("chào các bạn", "điểm cao", "Đít", "cho tôi đi"):
+        assert chat.filter(message) == (True, message)
+
+def test_listed_words_are_masked_as_written():
+    chat = shipped_filter()
+    assert chat.filter("đồ địt") == (True, "đồ ***")
+    assert chat.filter("cac gi") == (True, "*** gi")
+
+def test_fold_only_applies_to_the_fold_list(tmp_path):
+    words, folded = tmp_path / "words.txt", tmp_path / "fold.txt"
+    words.write_text("cac\n", encoding="utf-8"); folded.write_text("# không dấu\nbuồi\n", encoding="utf-8")
+    chat = chatfilter.ChatFilter(str(words), whole_word=True, fold=True, mask=True, fold_path=str(folded)); assert chat.load()
+    assert chat.filter("chào các bạn") == (True, "chào các bạn")
+    assert chat.filter("buoi sang") == (True, "**** sang") and chat.filter("Buồi") == (True, "****")
+    chat.configure(fold=False)
+    assert chat.filter("buoi sang") == (True, "buoi sang")
+
+def test_missing_fold_list_is_not_an_error(tmp_path):
+    words = tmp_path / "words.txt"; words.write_text("tucam\n", encoding="utf-8")
+    chat = chatfilter.ChatFilter(str(words), fold=True, mask=True, fold_path=str(tmp_path / "absent.txt"))
+    assert chat.load() and chat.fold_words == frozenset() and chat.filter("một tucam") == (True, "một *****")
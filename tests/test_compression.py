@@ -0,0 +1,59 @@
+# file: tests/test_compression.py
+
+import asyncio
+import json
+import zlib
+
+import pytest
+
+import compression
+import support
+
+FRAMES = [json.dumps({"PositionService": {"Positions": {f"pilot_{n}": [f"{n * 7.5:.3f},2000.000,{n:.3f}", "C-400", "0.000,90.000,0.000"] for n in range(k, k + 12)}}}).encode() + support.TERMINATOR
+          for k in range(0, 60, 6)]
+DICTIONARY = compression.train(FRAMES * 3, 4096)
+
+@pytest.mark.parametrize("algorithm", compression.ALGORITHMS)
+@pytest.mark.parametrize("dictionary", [b"", DICTIONARY], ids=["plain", "dictionary"])
+def test_stream_round_trip_frame_by_frame(algorithm, dictionary):
+    compressor = compression.StreamCompressor(algorithm, dictionary=dictionary); decompressor = compression.StreamDecompressor(algorithm, dictionary)
+    # Every frame is flushed to a boundary, so each one decodes as soon as it arrives.
+    for frame in FRAMES: assert decompressor.decompress(compressor.compress(frame)) == frame
+    assert compressor.bytes_in == sum(map(len, FRAMES)) and compressor.bytes_out < compressor.bytes_in / 3
+
+@pytest.mark.parametrize("algorithm", compression.ALGORITHMS)
+def test_dictionary_shrinks_the_first_frame_and_must_match(algorithm):
+    plain = compression.StreamCompressor(algorithm).compress(FRAMES[0])
+    with_dictionary = compression.StreamCompressor(algorithm, dictionary=DICTIONARY).compress(FRAMES[0])
+    assert 0 < len(DICTIONARY) <= 4096 and len(with_dictionary) < len(plain)
+    if algorithm == "zlib":
+        with pytest.raises(zlib.error): compression.StreamDecompressor(algorithm).decompress(with_dictionary)
+
+def test_negotiate():
+    assert compression.negotiate(["lz4", "zlib"], ["zlib"]) == "zlib"
+    assert compression.negotiate("zlib", []) is None and compression.negotiate(None, ["zlib"]) is None and compression.negotiate({"zlib": 1}, ["zlib"]) is None
+    assert compression.dictionary_id(b"") == 0 and compression.dictionary_id(DICTIONARY) == zlib.adler32(DICTIONARY)
+
+@pytest.mark.parametrize("matching", [True, False])
+def test_compressed_connection(tmp_path, matching):
+    (tmp_path / "compression.dict").write_bytes(DICTIONARY)
+    async def scenario():
+        async with support.running_server(support.config(tmp_path, compression=["zlib"])) as (server, port):
+            offered_id = compression.dictionary_id(DICTIONARY) if matching else 12345
+            reader, writer, welcome = await support.login(port, "pilot1", Compression=["zstd", "zlib"], CompressionDictionary=offered_id)
+            used = DICTIONARY if matching else b""
+            assert welcome["Compression"] == {"Algorithm": "zlib", "Dictionary": compression.dictionary_id(used)}
+            decompressor = compression.StreamDecompressor("zlib", used); pending = b""; messages = []
+            while not any("PositionService" in m for m in messages):
+                pending += decompressor.decompress(await asyncio.wait_for(reader.read(65536), 5.0))
+                *frames, pending = pending.split(support.TERMINATOR); messages += [json.loads(f) for f in frames]
+            assert "pilot1" in next(m for m in messages if "PositionService" in m)["PositionService"]["Positions"]
+            # The kick popup continues the same stream.
+            await server.state.players["pilot1"]["api_player"].Kick("bye")
+            while True:
+                data = await asyncio.wait_for(reader.read(65536), 5.0)
+                if not data: break
+                pending += decompressor.decompress(data)
+            assert "bye" in json.loads(pending.split(support.TERMINATOR)[-2])["!!VoscriptPluginData"][0]
+            writer.close()
+    asyncio.run(scenario())
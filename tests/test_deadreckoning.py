@@ -0,0 +1,71 @@
+# file: tests/test_deadreckoning.py
+
+import pytest
+
+import deadreckoning
+import playertable
+import support  # noqa: F401 -- puts the sources on sys.path
+
+class World:
+    """A PlayerTable plus wire entries, updated the way ServerState.update_player_position does."""
+    def __init__(self, **options):
+        self.table = playertable.PlayerTable(); self.positions = {}
+        self.reckoning = deadreckoning.DeadReckoning(self.table, self.positions, **options)
+
+    def move(self, username: str, now: float, position, rotation=(0.0, 0.0, 0.0), plane_type: str = "C-400", **state):
+        text = lambda v: "%.3f,%.3f,%.3f" % tuple(v)
+        entry = self.positions.get(username)
+        if entry is None:
+            self.table.add(username, position, rotation, now)
+            self.positions[username] = [text(position), plane_type, text(rotation), {"GearDown": True, **state}]
+            return
+        self.table.update(username, position, rotation, now, True)
+        if len(entry) < 8: entry.extend((None, None, None, None))
+        entry[4], entry[5], entry[6], entry[7] = entry[0], entry[2], entry[7] if entry[7] is not None else now, now
+        entry[0], entry[1], entry[2] = text(position), plane_type, text(rotation); entry[3].update(state)
+
+    def update(self, now: float): return self.reckoning.update(self.table.versions_snapshot(), now)
+
+def test_steady_flight_is_held_back_until_the_error_exceeds_the_threshold():
+    world = World(heartbeat=10.0); world.move("pilot", 0.0, (0.0, 0.0, 0.0)); first = world.update(0.0)["pilot"]
+    # Published without history, so clients hold it still: 1 and 2 m of error are within the 2 m threshold, 3 m is not.
+    for step in (1, 2):
+        world.move("pilot", step * 0.1, (float(step), 0.0, 0.0)); assert world.update(step * 0.1)["pilot"] == first
+    world.move("pilot", 0.3, (3.0, 0.0, 0.0)); republished = world.update(0.3)["pilot"]
+    assert republished != first and world.reckoning.entries["pilot"][0] == "3.000,0.000,0.000"
+    # Now published with 10 m/s: staying on that line is never re-sent, however far it goes.
+    for step in range(4, 30):
+        world.move("pilot", step * 0.1, (step * 1.0, 0.0, 0.0)); assert world.update(step * 0.1)["pilot"] == republished
+    assert world.reckoning.suppressed == 2 + 26
+    world.move("pilot", 3.0, (30.0, 2.5, 0.0)); assert world.update(3.0)["pilot"] != republished  # 2.5 m off the line
+
+@pytest.mark.parametrize("plane_type, error, republished", [("InPerson", 0.3, True), ("InPerson", 0.2, False), ("C-400", 0.3, False), ("C-400", 2.1, True)])
+def test_threshold_depends_on_plane_type(plane_type, error, republished):
+    world = World(); world.move("p", 0.0, (0.0, 0.0, 0.0), plane_type=plane_type); first = world.update(0.0)["p"]
+    world.move("p", 0.1, (error, 0.0, 0.0), plane_type=plane_type)
+    assert (world.update(0.1)["p"] != first) is republished
+
+@pytest.mark.parametrize("rotation, republished", [((0.0, 4.0, 0.0), False), ((0.0, 6.0, 0.0), True), ((0.0, -3.0, 0.0), False), ((0.0, 0.0, -6.0), True)])
+def test_rotation_threshold_wraps_around(rotation, republished):
+    world = World(); world.move("p", 0.0, (0.0, 0.0, 0.0), (0.0, 359.0, 0.0)); first = world.update(0.0)["p"]
+    world.move("p", 0.1, (0.0, 0.0, 0.0), (rotation[0], (359.0 + rotation[1]) % 360.0, rotation[2]))
+    assert (world.update(0.1)["p"] != first) is republished
+
+def test_state_and_plane_changes_are_always_sent():
+    world = World(); world.move("p", 0.0, (0.0, 0.0, 0.0)); version = world.update(0.0)["p"]
+    world.move("p", 0.1, (0.0, 0.0, 0.0), GearDown=False); changed = world.update(0.1)["p"]
+    assert changed != version and world.reckoning.entries["p"][3]["GearDown"] is False
+    world.positions["p"][3]["GearDown"] = True  # the published entry keeps its own copy of State
+    assert world.reckoning.entries["p"][3]["GearDown"] is False
+    world.move("p", 0.2, (0.0, 0.0, 0.0), plane_type="RL-72"); assert world.update(0.2)["p"] != changed
+
+def test_held_back_update_goes_out_on_the_heartbeat():
+    world = World(heartbeat=1.0); world.move("p", 0.0, (0.0, 0.0, 0.0)); first = world.update(0.0)["p"]
+    world.move("p", 0.1, (0.5, 0.0, 0.0)); assert world.update(0.1)["p"] == first
+    assert world.update(0.9)["p"] == first  # no new data and not yet due
+    assert world.update(1.0)["p"] != first and world.reckoning.entries["p"][0] == "0.500,0.000,0.000"
+
+def test_removed_players_are_forgotten():
+    world = World(); world.move("a", 0.0, (0.0, 0.0, 0.0)); world.move("b", 0.0, (0.0, 0.0, 0.0)); world.update(0.0)
+    del world.positions["b"]; world.table.remove("b")
+    assert set(world.update(0.1)) == {"a"} and set(world.reckoning.entries) == {"a"}
@@ -0,0 +1,60 @@
+# file: tests/test_delta.py
+
+import asyncio
+
+import support
+
+async def next_positions(reader: asyncio.StreamReader) -> dict:
+    while True:
+        message = await support.read_frame(reader)
+        if "PositionService" in message: return message["PositionService"]
+
+def move(writer: asyncio.StreamWriter, position: str):
+    support.send(writer, {"PositionService": {"Position": position, "PlaneType": "C-400"}})
+
+def test_deltas_follow_the_acked_baseline(tmp_path):
+    async def scenario():
+        async with support.running_server(support.config(tmp_path, deltaKeyframeInterval=60)) as (server, port):
+            _, other, _ = await support.login(port, "pilot2")
+            _, parked, _ = await support.login(port, "pilot3")
+            reader, writer, welcome = await support.login(port, "pilot1", Delta=True)
+            assert welcome.get("Delta") is True
+            # Nothing acked yet: a keyframe with everyone.
+            block = await next_positions(reader)
+            assert block["Keyframe"] is True and set(block["Positions"]) == {"pilot1", "pilot2", "pilot3"}
+            support.send(writer, {"PositionService": {"Ack": block["Seq"]}})
+            await support.wait_for(lambda: server.state.players["pilot1"]["delta"]["acked"] == block["Seq"])
+            move(other, "10,2000,10"); await support.wait_for(lambda: server.state.player_positions["pilot2"][0] == "10,2000,10")
+            parked.close(); await support.wait_for(lambda: "pilot3" not in server.state.player_positions)
+            # Relative to the acked baseline: only the mover, and the player who left.
+            while True:
+                block = await next_positions(reader)
+                if block.get("Removed"): break
+            assert "Keyframe" not in block and block["Base"] == server.state.players["pilot1"]["delta"]["acked"]
+            assert set(block["Positions"]) == {"pilot2"} and block["Positions"]["pilot2"][0] == "10,2000,10" and block["Removed"] == ["pilot3"]
+            # A later ack moves the baseline past both changes.
+            support.send(writer, {"PositionService": {"Ack": block["Seq"]}})
+            await support.wait_for(lambda: server.state.players["pilot1"]["delta"]["acked"] == block["Seq"])
+            while True:
+                block = await next_positions(reader)
+                if block.get("Base") == server.state.players["pilot1"]["delta"]["acked"]: break
+            assert block["Positions"] == {} and block["Removed"] == []
+            writer.close(); other.close()
+    asyncio.run(scenario())
+
+def test_unknown_acks_are_ignored_and_keyframes_repeat(tmp_path):
+    async def scenario():
+        async with support.running_server(support.config(tmp_path, deltaKeyframeInterval=0.3)) as (server, port):
+            reader, writer, _ = await support.login(port, "pilot1", Delta=True)
+            block = await next_positions(reader)
+            support.send(writer, {"PositionService": {"Ack": block["Seq"] + 1000}}); await writer.drain(); await asyncio.sleep(0.2)
+            assert server.state.players["pilot1"]["delta"]["acked"] is None
+            # Without an ack every frame is a keyframe.
+            assert all([(await next_positions(reader)).get("Keyframe") for _ in range(3)])
+            # Acked, the deltas still give way to a keyframe every deltaKeyframeInterval seconds.
+            block = await next_positions(reader); support.send(writer, {"PositionService": {"Ack": block["Seq"]}})
+            kinds = []; loop = asyncio.get_running_loop(); start = loop.time()
+            while loop.time() - start < 1.0: kinds.append(bool((await next_positions(reader)).get("Keyframe")))
+            assert not all(kinds) and kinds.count(True) >= 2
+            writer.close()
+    asyncio.run(scenario())
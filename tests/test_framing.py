@@ -0,0 +1,58 @@
+# file: tests/test_framing.py
+
+import random
+
+import pytest
+
+import framing
+import support  # noqa: F401 -- puts the sources on sys.path
+import wire
+
+def frame(body: bytes) -> bytes: return wire.FRAME_LENGTH.pack(len(body)) + body
+
+def framers():
+    return [(framing.TerminatorFramer(support.TERMINATOR, 64), lambda body: body + support.TERMINATOR),
+            (framing.LengthPrefixedFramer(wire.FRAME_LENGTH, 64), frame)]
+
+@pytest.mark.parametrize("framer, wrap", framers())
+def test_single_packet_reads_skip_the_buffer(framer, wrap):
+    for body in (b"one", b"two", b""):
+        assert [bytes(p) for p in framer.feed(wrap(body))] == [body] and len(framer) == 0
+    # One packet straddling two reads.
+    assert list(framer.feed(wrap(b"straddles")[:4])) == [] and len(framer) == 4
+    assert [bytes(p) for p in framer.feed(wrap(b"straddles")[4:] + wrap(b"next")[:2])] == [b"straddles"] and len(framer) == 2
+    assert [bytes(p) for p in framer.feed(wrap(b"next")[2:])] == [b"next"]
+    assert framer._end == 0  # nothing was ever copied in
+
+@pytest.mark.parametrize("framer, wrap", framers())
+def test_split_and_batched_reads(framer, wrap):
+    stream = b"".join(wrap(body) for body in (b"alpha", b"beta", b"gamma", b"delta"))
+    received = []
+    for chunk in (stream[:3], stream[3:9], stream[9:], wrap(b"whole")):
+        received += [bytes(p) for p in framer.feed(chunk)]
+    assert received == [b"alpha", b"beta", b"gamma", b"delta", b"whole"]
+    # A partial packet left behind a burst stays in the buffer until it completes.
+    assert [bytes(p) for p in framer.feed(wrap(b"one") + wrap(b"two") + wrap(b"partial")[:2])] == [b"one", b"two"]
+    assert [bytes(p) for p in framer.feed(wrap(b"partial")[2:] + wrap(b"next"))] == [b"partial", b"next"]
+
+@pytest.mark.parametrize("framer, wrap", framers())
+def test_random_reads_match_a_plain_split(framer, wrap):
+    rng = random.Random(7); bodies = [bytes(rng.randrange(1, 28) for _ in range(rng.randrange(0, 40))) for _ in range(300)]
+    stream = b"".join(wrap(body) for body in bodies); received = []; offset = 0
+    while offset < len(stream):
+        size = rng.choice((1, 3, 17, 45, 90, 200))
+        received += [bytes(p) for p in framer.feed(stream[offset:offset + size])]; offset += size
+    assert received == bodies and len(framer) == 0
+
+def test_framer_is_abstract():
+    with pytest.raises(TypeError): framing.Framer(64)
+
+@pytest.mark.parametrize("data", [frame(b"x" * 9), frame(b"x" * 9)[:6]])
+def test_oversized_length_is_rejected(data):
+    framer = framing.LengthPrefixedFramer(wire.FRAME_LENGTH, 8)
+    with pytest.raises(ConnectionAbortedError): list(framer.feed(data))
+
+def test_unterminated_data_over_the_limit_is_rejected():
+    framer = framing.TerminatorFramer(support.TERMINATOR, 8)
+    assert list(framer.feed(b"x" * 6)) == [] and len(framer) == 6
+    with pytest.raises(ConnectionAbortedError): list(framer.feed(b"x" * 6))
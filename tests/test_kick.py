@@ -0,0 +1,39 @@
+# file: tests/test_kick.py
+
+import asyncio
+
+import support
+
+def test_kick_popup_follows_queued_frames(tmp_path):
+    async def scenario():
+        async with support.running_server(support.config(tmp_path)) as (server, port):
+            reader, writer, _ = await support.login(port, "pilot1")
+            # Frames already queued for the player go out before the popup, which is the last thing on the connection.
+            for n in range(3): server.queue_frame("pilot1", server.encode_frame({"Custom": n}))
+            await server.state.players["pilot1"]["api_player"].Kick("test")
+            received = []
+            while True:
+                try: message = await support.read_frame(reader)
+                except asyncio.IncompleteReadError: break
+                if "PositionService" not in message: received.append(message)
+            assert [m["Custom"] for m in received if "Custom" in m] == [0, 1, 2]
+            assert "test" in received[-1]["!!VoscriptPluginData"][0]
+            assert server.state.players.get("pilot1", {}).get("sender") is None or server.state.players["pilot1"]["sender"].closed
+            writer.close()
+    asyncio.run(scenario())
+
+def test_kick_ignores_frames_queued_after_it(tmp_path):
+    async def scenario():
+        async with support.running_server(support.config(tmp_path)) as (server, port):
+            reader, writer, _ = await support.login(port, "pilot1")
+            sender = server.state.players["pilot1"]["sender"]
+            sender.put(server.encode_frame({"Last": True}), last=True); sender.put(b"late"); sender.put_snapshot(b"late")
+            await sender.wait_closed(5.0)
+            assert sender.closed
+            frames = []
+            try:
+                while True: frames.append(await support.read_frame(reader, timeout=1.0))
+            except asyncio.TimeoutError: pass
+            assert frames and frames[-1] == {"Last": True}
+            writer.close()
+    asyncio.run(scenario())
@@ -0,0 +1,68 @@
+# file: tests/test_playerindex.py
+# Every indexed query must answer exactly what a pass over PlayerData and Players would.
+
+import asyncio
+import random
+from collections import Counter
+
+import playerindex
+import support
+
+PLANES = ["C-400", "RL-72", "XV-40", "InPerson"]
+
+def scan_near(positions, center, radius):
+    found = [(sum((a - b) ** 2 for a, b in zip(p, center)), u) for u, p in positions.items() if sum((a - b) ** 2 for a, b in zip(p, center)) <= radius * radius]
+    return [u for _, u in sorted(found)]
+
+def scan_box(positions, minimum, maximum):
+    return sorted(u for u, p in positions.items() if all(lo <= v <= hi for lo, v, hi in zip(minimum, p, maximum)))
+
+def check(api, positions, planes, addresses, rng):
+    for ip in set(addresses.values()) | {"198.51.100.99"}:
+        assert api.PlayersByIP(ip) == {u for u, a in addresses.items() if a == ip}
+    for plane in PLANES: assert api.PlayersByPlaneType(plane) == {u for u, p in planes.items() if p == plane}
+    assert api.PlaneTypeCounts() == dict(Counter(planes.values()))
+    for _ in range(10):
+        center = tuple(rng.uniform(-3000, 3000) for _ in range(3)); radius = rng.choice((0.0, 150.0, 900.0, 2500.0, 10000.0))
+        assert api.PlayersNear(center, radius) == scan_near(positions, center, radius)
+        assert api.PlayersNear("%r,%r,%r" % center, radius) == scan_near(positions, center, radius)
+        size = rng.uniform(0, 3000); maximum = tuple(c + size for c in center)
+        assert sorted(api.PlayersInBox(center, maximum)) == scan_box(positions, center, maximum)
+    for username, position in positions.items(): assert api.GetPosition(username) == position
+
+class EntryQueries(playerindex.PlayerQueries):
+    def __init__(self):
+        self.PlayerData = {}; self.Players = {}; self._index = playerindex.entry_index(lambda: self.PlayerData, cell_size=500.0)
+
+def test_random_churn_matches_a_linear_scan():
+    rng = random.Random(5); api = EntryQueries(); positions = {}; planes = {}; addresses = {}
+    for step in range(1500):
+        names = list(positions); op = rng.random()
+        if op < 0.3 or not names:
+            username = f"p{step}"; addresses[username] = f"203.0.113.{rng.randrange(8)}"; api._index.addresses.set(username, addresses[username])
+        elif op < 0.4:
+            username = rng.choice(names); api.PlayerData.pop(username); api._index.remove(username); api._index.grid.remove(username)
+            del positions[username], planes[username], addresses[username]; continue
+        else: username = rng.choice(names)
+        position = tuple(float(round(rng.uniform(-3000, 3000), 3)) for _ in range(3)); plane = rng.choice(PLANES)
+        api.PlayerData[username] = ["%.3f,%.3f,%.3f" % position, plane, "0,0,0", {}]; api._index.track_entry(username, api.PlayerData[username])
+        positions[username] = position; planes[username] = plane
+        if step % 100 == 0: check(api, positions, planes, addresses, rng)
+    check(api, positions, planes, addresses, rng)
+
+def test_server_index_follows_joins_moves_and_leaves(tmp_path):
+    async def scenario():
+        async with support.running_server(support.config(tmp_path)) as (server, port):
+            rng = random.Random(9); writers = {}
+            for n in range(12): _, writers[f"pilot{n}"], _ = await support.login(port, f"pilot{n}", rng.choice(PLANES[:3]))
+            expected = {}
+            for username, writer in writers.items():
+                position = tuple(float(rng.randrange(-3000, 3000)) for _ in range(3)); plane = rng.choice(PLANES); expected[username] = (position, plane)
+                support.send(writer, {"PositionService": {"Position": "%g,%g,%g" % position, "PlaneType": plane}})
+            for username in ("pilot3", "pilot7"): writers.pop(username).close(); expected.pop(username)
+            await support.wait_for(lambda: set(server.state.player_positions) == set(expected)
+                                   and all(server.state.player_table.get_position(u) == p for u, (p, _) in expected.items()))
+            await support.wait_for(lambda: set(server.state.players) == set(expected))
+            check(server.api, {u: p for u, (p, _) in expected.items()}, {u: plane for u, (_, plane) in expected.items()}, {u: "127.0.0.1" for u in expected}, rng)
+            for writer in writers.values(): writer.close()
+    asyncio.run(scenario())
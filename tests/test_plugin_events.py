@@ -0,0 +1,25 @@
+# file: tests/test_plugin_events.py
+
+import asyncio
+import threading
+
+import support
+
+def test_data_received_subscriber_can_keep_previous_entry(tmp_path):
+    received = []; lock = threading.Lock()
+    def on_data(player, entry):  # synchronous, so it runs on the plugin pool
+        with lock: received.append(entry)
+
+    async def scenario():
+        async with support.running_server(support.config(tmp_path)) as (server, port):
+            server.api.DataReceived.connect(on_data)
+            reader, writer, _ = await support.login(port, "pilot1")
+            for i, gear in ((1, True), (2, False)):
+                support.send(writer, {"PositionService": {"Position": f"{i},2000,0", "PlaneType": "C-400", "State": {"GearDown": gear}}})
+                await writer.drain(); await support.wait_for(lambda: len(received) >= i)
+            writer.close()
+    asyncio.run(scenario())
+    previous, current = received[0], received[1]
+    assert previous is not current and previous[3] is not current[3]
+    assert (previous[0], previous[3]["GearDown"]) == ("1,2000,0", True)
+    assert (current[0], current[3]["GearDown"], current[4]) == ("2,2000,0", False, "1,2000,0")
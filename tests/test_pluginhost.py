@@ -0,0 +1,45 @@
+# file: tests/test_pluginhost.py
+
+import asyncio
+import multiprocessing
+import signal
+import time
+
+import pytest
+
+import pluginhost
+import support  # noqa: F401 -- puts the sources on sys.path
+
+def ignore_sigterm():
+    signal.signal(signal.SIGTERM, signal.SIG_IGN); time.sleep(30)
+
+def exit_on_sigterm(): time.sleep(30)
+
+@pytest.mark.parametrize("target, exitcode", [(exit_on_sigterm, -signal.SIGTERM), (ignore_sigterm, -signal.SIGKILL)])
+def test_reap_escalates_to_kill(target, exitcode):
+    async def scenario():
+        process = multiprocessing.get_context("fork").Process(target=target, daemon=True); process.start()
+        await asyncio.sleep(0.2)
+        ticks = 0
+        async def ticker():
+            nonlocal ticks
+            while True: await asyncio.sleep(0.01); ticks += 1
+        task = asyncio.create_task(ticker())
+        assert await pluginhost.reap(process, timeout=0.3)
+        task.cancel()
+        assert process.exitcode == exitcode
+        if exitcode == -signal.SIGKILL: assert ticks >= 5  # the loop kept running through the SIGTERM grace period
+    asyncio.run(scenario())
+
+def test_stopped_worker_is_reaped_off_the_loop(tmp_path):
+    folder = tmp_path / "stubborn"; folder.mkdir()
+    (folder / "main.py").write_text("import signal, time\nsignal.signal(signal.SIGTERM, signal.SIG_IGN)\ntime.sleep(30)\n", encoding="utf-8")
+    async def scenario():
+        warnings = []; supervisor = pluginhost.PluginSupervisor(None, warn=warnings.append)
+        worker = pluginhost.PluginWorker(supervisor, "stubborn", str(folder)); await worker.start(); process = worker.process
+        await asyncio.sleep(1.0)  # let it install its handler
+        start = time.perf_counter(); worker._stopped("test")
+        assert time.perf_counter() - start < 0.1 and worker.process is None
+        await worker._reap_task
+        assert process.exitcode == -signal.SIGKILL and any("restarting" in w for w in warnings)
+    asyncio.run(scenario())
@@ -0,0 +1,84 @@
+# file: tests/test_positions.py
+
+import asyncio
+import json
+
+import codec
+import index
+import metrics
+import support
+
+def test_checked_vector3_bounds():
+    assert codec.checked_vector3("1.5,-2,3") == (1.5, -2.0, 3.0)
+    assert codec.checked_vector3("9" * 400 + ",0,0") is None
+    assert codec.checked_vector3(f"{codec.WORLD_LIMIT * 10:.0f},0,0") is None
+    assert codec.checked_vector3("1,2") is None and codec.checked_vector3(None) is None
+
+def test_overflowing_coordinate_is_ignored(tmp_path):
+    async def scenario():
+        async with support.running_server(support.config(tmp_path)) as (server, port):
+            reader, writer, _ = await support.login(port, "pilot1")
+            support.send(writer, {"PositionService": {"Position": "9" * 400 + ",0,0", "PlaneType": "C-400"}})
+            await writer.drain(); await asyncio.sleep(0.3)
+            assert server.state.player_positions["pilot1"][0] == "0,2000,0"
+            assert server.state.player_table.get_position("pilot1") == (0.0, 2000.0, 0.0)
+            # The connection survived: a valid update still goes through.
+            support.send(writer, {"PositionService": {"Position": "5,6,7", "PlaneType": "C-400"}})
+            await support.wait_for(lambda: server.state.player_positions["pilot1"][0] == "5,6,7")
+            assert server.state.player_table.get_position("pilot1") == (5.0, 6.0, 7.0)
+            writer.close()
+    asyncio.run(scenario())
+
+def test_interest_ticks_send_full_view_clients_everyone(tmp_path):
+    async def scenario():
+        settings = support.config(tmp_path, gridCellSize=100, interestRadius=100, interestFarInterval=60)
+        async with support.running_server(settings) as (server, port):
+            reader, writer, _ = await support.login(port, "pilot1")
+            _, far_writer, _ = await support.login(port, "pilot2")
+            support.send(far_writer, {"PositionService": {"Position": "50000,2000,0", "PlaneType": "C-400"}})
+            await far_writer.drain(); await support.wait_for(lambda: server.state.player_positions["pilot2"][0] == "50000,2000,0")
+            # Every tick but one a minute is near-only; a client without delta must still see the far player in each frame.
+            frames = 0
+            while frames < 10:
+                message = await support.read_frame(reader)
+                if "PositionService" in message: assert set(message["PositionService"]["Positions"]) == {"pilot1", "pilot2"}; frames += 1
+            writer.close(); far_writer.close()
+    asyncio.run(scenario())
+
+def test_position_timeout_is_opt_in(tmp_path):
+    async def scenario():
+        async with support.running_server(support.config(tmp_path)) as (server, port):
+            assert server.position_timeout == 0
+        async with support.running_server(support.config(tmp_path, positionTimeout=0.3)) as (server, port):
+            reader, writer, _ = await support.login(port, "pilot1")
+            # Chat keeps the connection busy but is not a position: the player is still dropped.
+            dropped = lambda: "pilot1" in server.state.disconnecting_players or "pilot1" not in server.state.players
+            try:
+                while not dropped(): support.send(writer, {"ChatService": {"Pending": "hi"}}); await writer.drain(); await asyncio.sleep(0.1)
+            except ConnectionError: pass
+            await support.wait_for(dropped)
+            writer.close()
+    asyncio.run(scenario())
+
+def test_only_position_only_packets_are_coalesced():
+    position = b'{"PositionService":{"Position":"1,2,3","PlaneType":"C-400","State":{"GearDown":true}}}'
+    assert index.Server._is_position_packet(position, False) and index.Server._is_position_packet(memoryview(position), False)
+    for packet in (b'{"PositionService":{"Position":"1,2,3"},"PlayerService":{"Players":[]}}', b'{"PositionService":{"Position":"1,2,3"},"MyPlugin":1}',
+                   b'{"ChatService":{"Pending":"hi"},"PositionService":{"Position":"1,2,3"}}', b'{"PositionService":{"Position":"1,2,3"},"ChatService":{"Pending":"hi"}}'):
+        assert not index.Server._is_position_packet(packet, False), packet
+
+def test_packets_with_other_keys_are_not_coalesced(tmp_path):
+    async def scenario():
+        async with support.running_server(support.config(tmp_path)) as (server, port):
+            reader, writer, _ = await support.login(port, "pilot1")
+            before = metrics.INBOUND_SHED_PACKETS.values.get(("coalesced",), 0.0)
+            # One write, so the three packets arrive in one read: only the first, a plain position, may be dropped.
+            writer.write(b"".join(json.dumps(m).encode() + support.TERMINATOR for m in (
+                {"PositionService": {"Position": "1,2000,0", "PlaneType": "C-400"}},
+                {"PositionService": {"Position": "2,2000,0", "PlaneType": "C-400"}, "MyPlugin": {"Score": 5}},
+                {"PositionService": {"Position": "3,2000,0", "PlaneType": "C-400"}})))
+            await writer.drain()
+            await support.wait_for(lambda: server.state.player_positions["pilot1"][0] == "3,2000,0")
+            assert metrics.INBOUND_SHED_PACKETS.values.get(("coalesced",), 0.0) - before == 1
+            writer.close()
+    asyncio.run(scenario())
@@ -0,0 +1,89 @@
+# file: tests/test_recorder.py
+
+import argparse
+import asyncio
+import os
+import time
+
+import index
+import playertable
+import recorder
+import replay
+import support
+import wire
+
+PLANE_TYPES = list(index.PLANE_TYPES)
+
+def entry(position: str, plane_type: str = "C-400", **state):
+    return [position, plane_type, "0,90,0", {"Eng1": True, "GearDown": True, "VTOLAngle": 30, "LiveryId": 2, "PV40Color": "0,0,0", **state}]
+
+def test_records_read_back_as_written(tmp_path):
+    table = playertable.PlayerTable(); positions = {}; base = time.time()
+    flight = recorder.FlightRecorder(str(tmp_path / "run"), PLANE_TYPES, table, positions, segment_bytes=40 * recorder.RECORD_SIZE, keyframe_interval=1.0)
+    flight.start()
+    def put(username, x, **state):
+        positions[username] = entry(f"{x},2000,0", **state)
+        if username in table: table.update(username, (x, 2000.0, 0.0), (0.0, 90.0, 0.0), 0.0, True)
+        else: table.add(username, (x, 2000.0, 0.0), (0.0, 90.0, 0.0), 0.0)
+    put("alpha", 1.0); put("bravo", 2.0)
+    flight.capture(base)
+    put("alpha", 1.5, GearDown=False)
+    long_message = "xin chào " * 12  # spans several chat records
+    flight.chat("alpha", long_message)
+    flight.capture(base + 0.05)
+    del positions["bravo"]; table.remove("bravo"); put("charlie", 3.0)
+    flight.capture(base + 0.1)
+    for n in range(1, 40): put("alpha", 1.5 + n); flight.capture(base + 0.1 + n * 0.05)  # enough to roll over to a new segment
+    flight.close()
+
+    recording = recorder.Recording(str(tmp_path / "run"))
+    try:
+        assert len(recording.segments) >= 2 and recording.meta["PlaneTypes"] == PLANE_TYPES
+        records = list(recording.records()); kinds = [r["Type"] for r in records]
+        assert kinds[:2] == [recorder.REC_SEGMENT, recorder.REC_KEYFRAME] and records[1]["Players"] == 2
+        joins = {r["Username"]: r["Player"] for r in records if r["Type"] == recorder.REC_JOIN}
+        assert set(joins) == {"alpha", "bravo", "charlie"} and joins["charlie"] == joins["bravo"]  # a free id is reused
+        alpha = [r for r in records if r["Type"] == recorder.REC_POSITION and r["Player"] == joins["alpha"]]
+        assert alpha[1]["Position"] == (1.5, 2000.0, 0.0) and alpha[1]["Rotation"] == (0.0, 90.0, 0.0) and alpha[1]["PlaneType"] == "C-400"
+        assert (alpha[1]["Flags"], alpha[1]["VTOLAngle"], alpha[1]["LiveryId"]) == (wire.state_flags(entry("", GearDown=False)[3]), 30, 2)
+        assert alpha[0]["Flags"] == wire.state_flags(entry("")[3])  # GearDown went up between the two
+        assert [r["Message"] for r in records if r["Type"] == recorder.REC_CHAT] == [long_message]
+        assert any(r["Type"] == recorder.REC_LEAVE and r["Player"] == joins["bravo"] for r in records)
+        # Every segment replays on its own: it opens with a keyframe of everyone present.
+        second = recording.segments[1]; first_records = [recording.decode(second.records, i * recorder.RECORD_SIZE)["Type"] for i in range(2)]
+        assert first_records == [recorder.REC_SEGMENT, recorder.REC_KEYFRAME]
+        # A time-range query starts from the keyframe before `start` and stops before `end`.
+        start, end = base + 1.2, base + 1.6
+        ranged = list(recording.records(start, end))
+        assert ranged[0]["Type"] in (recorder.REC_SEGMENT, recorder.REC_KEYFRAME) and ranged[0]["Time"] <= start and all(r["Time"] < end for r in ranged)
+        assert [r for r in records if start <= r["Time"] < end] == [r for r in ranged if r["Time"] >= start]
+    finally: recording.close()
+
+def test_recording_replays_into_another_server(tmp_path):
+    async def scenario():
+        async with support.running_server(support.config(tmp_path, recordDirectory="rec", recordKeyframeInterval=0.5)) as (server, port):
+            directory = server.recorder.directory
+            reader, writer, _ = await support.login(port, "pilot1")
+            for x in range(5):
+                support.send(writer, {"PositionService": {"Position": f"{x * 10},2000,5", "PlaneType": "C-400", "Rotation": "0,45,0"}})
+                await writer.drain(); await asyncio.sleep(0.1)
+            support.send(writer, {"ChatService": {"Pending": "hello from the recording"}}); await writer.drain(); await asyncio.sleep(0.3)
+            writer.close()
+        assert os.path.exists(os.path.join(directory, "meta.json"))
+        recording = recorder.Recording(directory)
+        try:
+            (tmp_path / "target").mkdir()
+            async with support.running_server(support.config(tmp_path / "target")) as (target, target_port):
+                args = argparse.Namespace(host="127.0.0.1", port=target_port, speed=20.0, protocol="json", prefix="replay_")
+                replayer = replay.Replayer(recording, args); seen = []
+                async def watch():
+                    while True:
+                        if "replay_pilot1" in target.state.player_positions: seen.append(target.state.player_positions["replay_pilot1"][0])
+                        await asyncio.sleep(0.005)
+                watcher = asyncio.create_task(watch())
+                await replayer.run(recording.start_time, None); watcher.cancel()
+                assert replayer.failed == 0 and replayer.chats == 1 and replayer.positions >= 5
+                assert "40.000,2000.000,5.000" in seen
+                assert "hello from the recording" in target.state.get_chat_string()
+        finally: recording.close()
+    asyncio.run(scenario())
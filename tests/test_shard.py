@@ -0,0 +1,30 @@
+# file: tests/test_shard.py
+
+import asyncio
+import signal
+import time
+
+import support  # noqa: F401 -- puts the sources on sys.path
+import shard
+
+def stubborn_worker(config, worker_id, sock):
+    # The first one ignores SIGTERM; its replacement exits when the coordinator closes the link, as a real worker does.
+    if config["ready"].is_set(): sock.recv(1); return
+    signal.signal(signal.SIGTERM, signal.SIG_IGN); config["ready"].set(); time.sleep(30)
+
+def test_stopped_worker_is_reaped_and_restarted_after(tmp_path):
+    async def scenario():
+        ready = shard._CONTEXT.Event(); warnings = []
+        coordinator = shard.ShardCoordinator({"ready": ready}, 1, stubborn_worker, 0.05, warn=warnings.append, log=lambda message: None)
+        await coordinator.start(); worker = coordinator.workers[0]; process = worker.process
+        assert await asyncio.to_thread(ready.wait, 10.0)
+        start = time.perf_counter(); coordinator._stopped(worker, "test")
+        assert time.perf_counter() - start < 0.1 and worker.process is None and any("restarting" in w for w in warnings)
+        await worker._reap_task
+        assert process.exitcode == -signal.SIGKILL
+        # The replacement only starts once the old process is gone.
+        await support.wait_for(lambda: worker.process is not None)
+        assert worker.restarts == 1 and worker.process.pid != process.pid
+        await coordinator.stop()
+        assert worker.process is None
+    asyncio.run(scenario())
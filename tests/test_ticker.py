@@ -0,0 +1,44 @@
+# file: tests/test_ticker.py
+# TickScheduler against a fake clock: sleeping and tick work only advance `now`, so tick times are exact.
+
+import asyncio
+import types
+
+import pytest
+
+import support  # noqa: F401 -- puts the sources on sys.path
+import ticker
+
+class Stop(Exception): pass
+
+def run_ticks(monkeypatch, interval: float, work, ticks: int, oversleep: float = 0.0):
+    """Runs `ticks` ticks where tick n takes work(n) seconds and every sleep overshoots by `oversleep`; returns
+    (scheduler, tick start times relative to the start)."""
+    clock = types.SimpleNamespace(now=1000.0)
+    async def sleep(delay: float): clock.now += delay + oversleep
+    monkeypatch.setattr(ticker, "time", types.SimpleNamespace(perf_counter=lambda: clock.now))
+    monkeypatch.setattr(ticker, "asyncio", types.SimpleNamespace(sleep=sleep))
+    scheduler = ticker.TickScheduler(interval); starts = []
+    def on_tick():
+        starts.append(clock.now - 1000.0); clock.now += work(len(starts))
+        if len(starts) == ticks: raise Stop
+    with pytest.raises(Stop): asyncio.run(scheduler.run(on_tick))
+    return scheduler, starts
+
+def test_work_time_does_not_push_ticks_back(monkeypatch):
+    scheduler, starts = run_ticks(monkeypatch, 0.05, lambda n: 0.03, 200)
+    # A fixed sleep(interval) after each tick would have drifted by 200 * 30 ms by now.
+    assert starts == pytest.approx([n * 0.05 for n in range(1, 201)])
+    assert scheduler.overruns == 0 and scheduler.skipped == 0 and scheduler.last_lateness == pytest.approx(0.0)
+
+def test_sleep_overshoot_does_not_accumulate(monkeypatch):
+    scheduler, starts = run_ticks(monkeypatch, 0.05, lambda n: 0.01, 100, oversleep=0.004)
+    assert starts == pytest.approx([n * 0.05 + 0.004 for n in range(1, 101)])
+    assert scheduler.last_lateness == pytest.approx(0.004)
+
+def test_overrun_skips_missed_deadlines(monkeypatch):
+    # Tick 3 takes 2.4 intervals: the deadlines at 0.20 and 0.25 are merged into the tick at 0.30, not run back to back.
+    scheduler, starts = run_ticks(monkeypatch, 0.05, lambda n: 0.12 if n == 3 else 0.01, 6)
+    assert starts == pytest.approx([0.05, 0.10, 0.15, 0.30, 0.35, 0.40])
+    assert scheduler.overruns == 1 and scheduler.skipped == 2 and scheduler.stats()["Tick"] == 6
+    assert "1 overruns, 2 skipped" in scheduler.summary() and "0 overruns, 0 skipped" in scheduler.summary()
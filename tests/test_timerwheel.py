@@ -0,0 +1,49 @@
+# file: tests/test_timerwheel.py
+
+import math
+import random
+import types
+
+import pytest
+
+import support  # noqa: F401 -- puts the sources on sys.path
+import timerwheel
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=0.0); monkeypatch.setattr(timerwheel, "time", types.SimpleNamespace(perf_counter=lambda: clock.now))
+    return clock
+
+def test_fires_within_one_tick_never_early(clock):
+    wheel = timerwheel.TimerWheel(0.05); fired = []
+    timer = wheel.schedule(0.12, fired.append, "a")
+    assert wheel.advance(0.10) == 0 and fired == [] and timer.active
+    assert wheel.advance(0.15) == 1 and fired == ["a"] and timer.fired and not timer.active and len(wheel) == 0
+
+def test_cancel(clock):
+    wheel = timerwheel.TimerWheel(0.05); fired = []
+    kept, cancelled = wheel.schedule(1.0, fired.append, "kept"), wheel.schedule(1.0, fired.append, "cancelled")
+    cancelled.cancel(); cancelled.cancel()
+    assert not cancelled.active and len(wheel) == 1
+    wheel.advance(2.0)
+    assert fired == ["kept"] and not cancelled.fired
+
+def test_timer_scheduled_from_a_callback_waits_for_a_later_tick(clock):
+    wheel = timerwheel.TimerWheel(0.05); fired = []
+    wheel.schedule(0.05, lambda: (fired.append(("first", wheel._current)), wheel.schedule(0.0, lambda: fired.append(("second", wheel._current)))))
+    assert wheel.advance(0.05) == 1 and wheel.advance(0.10) == 1
+    assert fired == [("first", 1), ("second", 2)]
+
+def test_random_timers_across_levels_fire_on_their_tick(clock):
+    # Delays up to ~2 hours reach the third level; cancels are mixed in and the wheel is advanced in uneven steps.
+    rng = random.Random(11); resolution = 0.05; wheel = timerwheel.TimerWheel(resolution)
+    fired = {}; expected = {}; timers = {}
+    for n in range(3000):
+        clock.now += rng.uniform(0, 0.01); wheel.advance(clock.now)
+        delay = rng.choice((rng.uniform(0, 10), rng.uniform(10, 600), rng.uniform(600, 7200)))
+        timers[n] = wheel.schedule(delay, lambda n: fired.__setitem__(n, wheel._current), n)
+        expected[n] = max(math.ceil((clock.now + delay) / resolution - 1e-9), wheel._current)
+        if rng.random() < 0.2: timers[n].cancel(); del expected[n]
+    now = clock.now
+    while now < 7300: now += rng.uniform(0.01, 40.0); wheel.advance(now)
+    assert fired == expected and len(wheel) == 0
@@ -0,0 +1,71 @@
+# file: tests/test_udp.py
+
+import asyncio
+import json
+import socket
+
+import support
+import udp
+
+def free_udp_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s: s.bind(("127.0.0.1", 0)); return s.getsockname()[1]
+
+def position_frame(position: str) -> bytes: return json.dumps({"PositionService": {"Position": position, "PlaneType": "C-400"}}).encode() + support.TERMINATOR
+
+def test_newer_wraps():
+    assert udp.newer(1, None) and udp.newer(2, 1) and not udp.newer(1, 1) and not udp.newer(1, 2)
+    assert udp.newer(3, udp.SEQ_MASK) and not udp.newer(udp.SEQ_MASK, 3)
+
+def test_endpoint_handshake_and_stale_datagrams():
+    async def scenario():
+        frames = []; loop = asyncio.get_running_loop()
+        transport, endpoint = await loop.create_datagram_endpoint(lambda: udp.DatagramEndpoint(lambda session, frame: frames.append(bytes(frame))), local_addr=("127.0.0.1", 0))
+        session = endpoint.open("pilot1")
+        assert not endpoint.send(session, b"early")  # nothing bound yet: the caller falls back to TCP
+        received = []
+        channel = await udp.ClientChannel.open("127.0.0.1", endpoint.port, session.token, lambda frame: received.append(bytes(frame)))
+        assert session.address is not None
+        raw = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            # Datagrams arriving out of order: anything not newer than the last accepted is dropped.
+            for seq, payload in ((10, b"ten"), (8, b"eight"), (10, b"ten again"), (11, b"eleven")):
+                raw.sendto(udp.HEADER.pack(udp.UDP_FRAME, session.token, seq) + payload, ("127.0.0.1", endpoint.port))
+            raw.sendto(udp.HEADER.pack(udp.UDP_FRAME, session.token ^ 1, 99) + b"stranger", ("127.0.0.1", endpoint.port))
+            await support.wait_for(lambda: len(frames) >= 2 and endpoint.unknown >= 1)
+            await asyncio.sleep(0.05)
+            assert frames == [b"ten", b"eleven"] and endpoint.discarded == 2
+            # The raw datagrams rebound the session to their address, as after a NAT change; point it back at the channel.
+            assert session.address[1] == raw.getsockname()[1]
+            session.address = channel.transport.get_extra_info('sockname')
+            # Server to client: stale datagrams are dropped on the client too.
+            assert endpoint.send(session, b"first") and endpoint.send(session, b"second")
+            channel.datagram_received(udp.HEADER.pack(udp.UDP_FRAME, session.token, 1) + b"replayed", ("127.0.0.1", endpoint.port))
+            await support.wait_for(lambda: received[-1:] == [b"second"])
+            assert b"replayed" not in received and channel.discarded == 1
+            endpoint.max_datagram = udp.HEADER.size + 4
+            assert not endpoint.send(session, b"too large") and endpoint.oversized == 1
+        finally: raw.close(); channel.close(); transport.close()
+    asyncio.run(scenario())
+
+def test_server_udp_channel_and_tcp_fallback(tmp_path):
+    async def scenario():
+        async with support.running_server(support.config(tmp_path, udpPort=free_udp_port())) as (server, port):
+            reader, writer, welcome = await support.login(port, "pilot1", Udp=True)
+            token, udp_port = welcome["Udp"]["Token"], welcome["Udp"]["Port"]
+            # Until the client's first datagram, snapshots keep coming over TCP.
+            while "PositionService" not in await support.read_frame(reader): pass
+            snapshots = []
+            channel = await udp.ClientChannel.open("127.0.0.1", udp_port, token, lambda frame: snapshots.append(json.loads(bytes(frame)[:-1])))
+            await support.wait_for(lambda: any("PositionService" in s for s in snapshots))
+            channel.send(position_frame("10,20,30"))
+            await support.wait_for(lambda: server.state.player_positions["pilot1"][0] == "10,20,30")
+            # With the channel up, TCP goes quiet: drain what was sent before it was.
+            try:
+                while True: await support.read_frame(reader, timeout=0.3)
+            except asyncio.TimeoutError: pass
+            # Snapshots too large for one datagram fall back to TCP.
+            server.udp.max_datagram = 32; oversized = server.udp.oversized
+            await support.wait_for(lambda: server.udp.oversized > oversized)
+            while "PositionService" not in await support.read_frame(reader): pass
+            channel.close(); writer.close()
+    asyncio.run(scenario())
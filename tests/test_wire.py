@@ -0,0 +1,105 @@
+# file: tests/test_wire.py
+# The binary protocol must decode to exactly what the JSON protocol carries. Vectors use values float32 holds
+# exactly, written the way format_vector3 writes them, so both sides compare as equal strings.
+
+import struct
+
+import pytest
+
+import codec
+import support  # noqa: F401 -- puts the sources on sys.path
+import wire
+from index import PLANE_TYPES
+
+PLANE_TYPES = list(PLANE_TYPES)
+
+def state(**changes):
+    base = {"Eng1": True, "Eng2": True, "Eng3": False, "Eng4": True, "GearDown": False, "SigL": True, "MainL": False, "VTOLAngle": 45, "PV40Color": "12,34,56", "LiveryId": 3}
+    base.update(changes); return base
+
+def json_round_trip(message: dict) -> dict: return codec.loads(codec.dumps(message))
+
+def body(frame: bytes) -> memoryview:
+    (length,) = wire.FRAME_LENGTH.unpack_from(frame); assert length == len(frame) - wire.FRAME_LENGTH.size
+    return memoryview(frame)[wire.FRAME_LENGTH.size:]
+
+@pytest.mark.parametrize("block", [
+    {"Position": "123.500,2000.000,-55.250", "Rotation": "1.500,-90.000,0.000", "PlaneType": "C-400", "State": state()},
+    {"Position": "0.000,0.000,0.000", "Rotation": "0.000,0.000,0.000", "PlaneType": "XV-40", "State": state(MainL=True, LiveryId=-1), "Ack": 77},
+])
+def test_position_matches_json(block):
+    message = {"PositionService": block}
+    assert wire.decode_client_message(body(wire.encode_position(block, PLANE_TYPES)), PLANE_TYPES) == json_round_trip(message)
+
+def test_chat_matches_json():
+    message = {"ChatService": {"Pending": "xin chào, tất cả!"}}
+    frame = wire.encode_chat(message["ChatService"]["Pending"])
+    assert body(frame)[0] == wire.MSG_CHAT
+    assert wire.decode_client_message(body(frame), PLANE_TYPES) == json_round_trip(message)
+
+def test_json_frame_matches_json():
+    message = {"PositionService": {"Position": "1.000,2.000,3.000", "PlaneType": "C-400"}, "ChatService": {"Pending": "hi"}}
+    frame = wire.encode_json(message)
+    assert body(frame)[0] == wire.MSG_JSON
+    assert wire.decode_client_message(body(frame), PLANE_TYPES) == json_round_trip(message)
+
+@pytest.mark.parametrize("keyframe", [False, True])
+def test_snapshot_matches_json(keyframe):
+    positions = {
+        "pilot_one": ["100.000,2000.000,-50.500", "C-400", "0.000,90.000,0.000", state()],
+        "pilot_two": ["-8.250,1500.125,3.000", "RL-72", "10.000,0.000,-5.000", state(GearDown=True, PV40Color="0,0,0"),
+                      "-9.250,1500.000,3.000", "10.000,0.000,-4.000", 1234.5, 1234.55],
+        "pilot_three": ["1.000,2.000,3.000", "None", "0.000,0.000,0.000", state(LiveryId=-1)],
+    }
+    players = list(positions) + ["remote_only"]
+    frame = wire.SnapshotEncoder(PLANE_TYPES).encode(players, positions, ["gone_away"], 42, 40, keyframe, 9876.25, 1700000000.0)
+    assert body(frame)[0] == wire.MSG_SNAPSHOT
+    decoded = wire.decode_snapshot(body(frame)[1:], PLANE_TYPES)
+    expected = json_round_trip({"PlayerService": {"Players": players},
+                                "PositionService": {"Positions": positions, "Seq": 42, "Base": 40, "Keyframe": keyframe, "Removed": ["gone_away"],
+                                                    "CurrentServerTime": 9876.25, "TimestampEpoch": 1700000000.0}})
+    assert decoded == expected
+
+def test_snapshot_record_cache_follows_updates():
+    entry = ["1.000,2.000,3.000", "C-400", "0.000,0.000,0.000", state(), "1.000,2.000,3.000", "0.000,0.000,0.000", 1.0, 2.0]
+    encoder = wire.SnapshotEncoder(PLANE_TYPES); first = encoder.encode(["a_b"], {"a_b": entry})
+    assert encoder.encode(["a_b"], {"a_b": entry}) == first
+    entry[0], entry[-1] = "4.000,5.000,6.000", 3.0
+    assert wire.decode_snapshot(body(encoder.encode(["a_b"], {"a_b": entry}))[1:], PLANE_TYPES)["PositionService"]["Positions"]["a_b"][0] == "4.000,5.000,6.000"
+    # State is updated in place too; its packed part must not outlive a change.
+    entry[3]["GearDown"], entry[3]["PV40Color"], entry[1], entry[-1] = True, "9,9,9", "RL-72", 4.0
+    decoded = wire.decode_snapshot(body(encoder.encode(["a_b"], {"a_b": entry}))[1:], PLANE_TYPES)["PositionService"]["Positions"]["a_b"]
+    assert decoded[1] == "RL-72" and decoded[3]["GearDown"] is True and decoded[3]["PV40Color"] == "9,9,9"
+
+def test_snapshot_positions_outside_player_list():
+    # Dead-reckoned or remote entries need not be in Players; their names travel in the extra names table.
+    positions = {"ghost": ["1.000,2.000,3.000", "C-400", "0.000,0.000,0.000", state(PV40Color="1,2,3")], "pilot": ["4.000,5.000,6.000", "C-400", "0.000,0.000,0.000", state()]}
+    decoded = wire.decode_snapshot(body(wire.SnapshotEncoder(PLANE_TYPES).encode(["pilot"], positions))[1:], PLANE_TYPES)
+    assert decoded["PlayerService"]["Players"] == ["pilot"] and decoded["PositionService"]["Positions"] == json_round_trip(positions)
+
+def test_snapshot_bad_record_index_raises():
+    payload = bytearray(body(wire.SnapshotEncoder(PLANE_TYPES).encode(["a_b"], {"a_b": ["1.000,2.000,3.000", "C-400", "0.000,0.000,0.000", state()]}))[1:])
+    # header, "a_b" player list, empty extra names, one color, then the plain group's count and its first name index
+    index_offset = wire._SNAPSHOT_HEADER.size + 2 + 4 + 2 + 2 + 1 + len(b"12,34,56") + 2
+    payload[index_offset:index_offset + 2] = b"\x05\x00"
+    with pytest.raises(wire.ProtocolError): wire.decode_snapshot(memoryview(payload), PLANE_TYPES)
+    with pytest.raises((wire.ProtocolError, struct.error)): wire.decode_snapshot(memoryview(payload)[:-20], PLANE_TYPES)
+
+def test_pack_clamps_to_float32_and_int32():
+    layout = struct.Struct('<3fi')
+    x, y, z, n = layout.unpack(wire._pack(layout, 1e300, -1e300, 1.5, 2**40))
+    assert (x, y, z, n) == (wire._FLOAT32_MAX, -wire._FLOAT32_MAX, 1.5, wire._INT32_MAX)
+    assert layout.unpack(wire._pack(layout, 0.0, 0.0, 0.0, -2**40))[3] == wire._INT32_MIN
+
+def test_oversized_values_still_encode():
+    block = {"Position": "1" * 50 + ",0,0", "Rotation": "0,0,0", "PlaneType": "C-400", "State": state(VTOLAngle=2**40)}
+    decoded = wire.decode_client_message(body(wire.encode_position(block, PLANE_TYPES)), PLANE_TYPES)["PositionService"]
+    assert decoded["State"]["VTOLAngle"] == wire._INT32_MAX and decoded["Position"].startswith("340282346638528859811704183484516925440.000,")
+
+def test_format_vector3_rejects_non_finite():
+    assert wire.format_vector3(1.0, 2.0, 3.0) == "1.000,2.000,3.000"
+    assert wire.format_vector3(float("inf"), 0.0, 0.0) is None and wire.format_vector3(0.0, float("nan"), 0.0) is None
+
+@pytest.mark.parametrize("raw", [b"", b"\x7f", bytes((wire.MSG_POSITION,)) + b"\x00" * 4, bytes((wire.MSG_JSON,)) + b"[1]"])
+def test_malformed_client_messages_raise(raw):
+    with pytest.raises((wire.ProtocolError, *codec.DECODE_ERRORS, struct.error)): wire.decode_client_message(memoryview(raw), PLANE_TYPES)
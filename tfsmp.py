@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
 
+from playerindex import PlayerQueries, entry_index
+
 class Event():
     _callbacks = []
 
@@ -73,15 +75,32 @@ class TFSMPAPIPlayer(APIPlayer):
         self.Connection.shutdown()
 
 
-class TFSMPAPI:
+class TFSMPAPI(PlayerQueries):
     def __init__(self):
         #todo: make all of this work
         self.PlayerConnected = Event()
         self.PlayerDisconnected = Event()
         self.PlayerData = {}
         self.Players = {}
+        # Same queries as the server's TFSMPAPI; keep players in through AddPlayer/UpdatePlayer/RemovePlayer.
+        self._index = entry_index(lambda: self.PlayerData)
 
     def GetAPIPlayer(self, username:str):
         if username in self.Players:
             return self.Players[username][2]
         return None
+
+    def AddPlayer(self, username: str, connection, address, entry: list):
+        self.Players[username] = [connection, address, TFSMPAPIPlayer(username, connection)]
+        self._index.addresses.set(username, address[0] if address else None)
+        self.UpdatePlayer(username, entry)
+
+    def UpdatePlayer(self, username: str, entry: list):
+        self.PlayerData[username] = entry
+        self._index.track_entry(username, entry)
+
+    def RemovePlayer(self, username: str):
+        self.Players.pop(username, None)
+        self.PlayerData.pop(username, None)
+        self._index.remove(username)
+        self._index.grid.remove(username)
@@ -0,0 +1,53 @@
+# file: ticker.py
+# Fixed-rate tick scheduler that targets absolute perf_counter() deadlines instead of sleeping a fixed interval.
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, Optional
+
+class TickScheduler:
+    """Runs `on_tick` at tick_number * interval from the start, so work time never pushes later ticks back.
+
+    If a tick finishes past the next deadline the missed deadlines are skipped (merged into the next tick)
+    rather than run back to back. lateness = how long after its deadline a tick started; an overrun is a
+    tick whose duration exceeded the interval. `observe`, if given, is called with each tick's duration."""
+    def __init__(self, interval: float, observe: Optional[Callable[[float], Any]] = None):
+        self.interval = interval; self.observe = observe
+        self.tick_number = 0; self.last_duration = 0.0; self.last_lateness = 0.0; self.overruns = 0; self.skipped = 0
+        self._reset_window()
+
+    def _reset_window(self):
+        self._window_start = time.perf_counter(); self._window_ticks = 0; self._window_duration = 0.0
+        self._window_max_duration = 0.0; self._window_max_lateness = 0.0; self._window_overruns = 0; self._window_skipped = 0
+
+    async def run(self, on_tick: Callable[[], Any]):
+        interval = self.interval; deadline = time.perf_counter() + interval
+        while True:
+            delay = deadline - time.perf_counter()
+            if delay > 0: await asyncio.sleep(delay)
+            start = time.perf_counter()
+            self.tick_number += 1; self.last_lateness = start - deadline
+            on_tick()
+            end = time.perf_counter(); self.last_duration = duration = end - start
+            if self.observe is not None: self.observe(duration)
+            self._window_ticks += 1; self._window_duration += duration
+            if duration > self._window_max_duration: self._window_max_duration = duration
+            if self.last_lateness > self._window_max_lateness: self._window_max_lateness = self.last_lateness
+            if duration > interval: self.overruns += 1; self._window_overruns += 1
+            deadline += interval
+            if end > deadline:
+                missed = int((end - deadline) // interval) + 1
+                deadline += missed * interval; self.skipped += missed; self._window_skipped += missed
+
+    def stats(self) -> Dict[str, Any]:
+        return {"Tick": self.tick_number, "Interval": self.interval, "Duration": self.last_duration, "Lateness": self.last_lateness,
+                "Overruns": self.overruns, "Skipped": self.skipped}
+
+    def summary(self) -> str:
+        """One line covering the ticks since the previous summary; resets the window."""
+        ticks = self._window_ticks; elapsed = time.perf_counter() - self._window_start
+        average = self._window_duration / ticks if ticks else 0.0
+        line = (f"Tick summary: {ticks} ticks in {elapsed:.0f}s ({ticks / elapsed if elapsed else 0:.1f}/s), "
+                f"avg {average * 1000:.2f} ms, max {self._window_max_duration * 1000:.2f} ms, max lateness {self._window_max_lateness * 1000:.2f} ms, "
+                f"{self._window_overruns} overruns, {self._window_skipped} skipped")
+        self._reset_window(); return line
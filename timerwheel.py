@@ -0,0 +1,77 @@
+# file: timerwheel.py
+# Hierarchical timing wheel: O(1) schedule and cancel, advanced from the server tick instead of one
+# event-loop timer per connection.
+
+import math
+import time
+from typing import Any, Callable, List, Optional, Set
+
+LEVEL_BITS = (8, 6, 6, 6)  # 256 slots of one tick, then three levels of 64 slots, each 2^bits times coarser
+_EPSILON = 1e-9  # keeps float error in now / resolution from moving a timer a whole tick
+
+class Timer:
+    __slots__ = ("expires", "callback", "args", "_slot", "fired")
+    def __init__(self, expires: int, callback: Callable[..., Any], args: tuple):
+        self.expires = expires; self.callback = callback; self.args = args; self._slot: Optional[Set['Timer']] = None; self.fired = False
+
+    @property
+    def active(self) -> bool: return self._slot is not None
+
+    def cancel(self):
+        if self._slot is not None: self._slot.discard(self); self._slot = None
+
+class TimerWheel:
+    """Timers are kept in slots of `resolution` seconds: the first level holds the next 256 ticks, each higher
+    level covers 64 slots of the one below and is cascaded down one slot at a time as the wheel turns. Timers
+    beyond the last level are clamped to it and re-filed when they come round. advance() fires due timers; with
+    the default 0.05 s tick a timer fires up to one tick late, never early."""
+    def __init__(self, resolution: float, now: Optional[float] = None):
+        self.resolution = resolution; self.origin = time.perf_counter() if now is None else now
+        self._current = 0  # next tick to be processed
+        self._levels: List[List[Set[Timer]]] = [[set() for _ in range(1 << bits)] for bits in LEVEL_BITS]
+        self._shifts = [sum(LEVEL_BITS[:i]) for i in range(len(LEVEL_BITS) + 1)]
+        self._processing = False
+
+    def __len__(self) -> int: return sum(len(slot) for level in self._levels for slot in level)
+
+    def schedule(self, delay: float, callback: Callable[..., Any], *args) -> Timer:
+        """Calls callback(*args) from advance() once `delay` seconds have passed."""
+        expires = math.ceil((time.perf_counter() - self.origin + delay) / self.resolution - _EPSILON)
+        # A timer scheduled from a callback never fires in the tick that is being processed.
+        timer = Timer(max(expires, self._current + self._processing), callback, args); self._file(timer); return timer
+
+    def _file(self, timer: Timer):
+        shifts, ticks = self._shifts, timer.expires - self._current
+        if ticks < 0: ticks = 0; timer.expires = self._current
+        for level, slots in enumerate(self._levels):
+            if ticks < 1 << shifts[level + 1] or level == len(self._levels) - 1:
+                # The last level clamps; such a timer is re-filed, not fired, when its slot is cascaded.
+                expires = min(timer.expires, self._current + (1 << shifts[level + 1]) - 1)
+                slot = slots[(expires >> shifts[level]) & (len(slots) - 1)]
+                slot.add(timer); timer._slot = slot; return
+
+    def advance(self, now: Optional[float] = None) -> int:
+        """Processes every tick up to `now`; returns how many timers fired."""
+        target = math.floor(((time.perf_counter() if now is None else now) - self.origin) / self.resolution + _EPSILON)
+        fired, first = 0, self._levels[0]; mask = len(first) - 1
+        self._processing = True
+        try:
+            while self._current <= target:
+                index = self._current & mask
+                if index == 0: self._cascade(1)
+                slot = first[index]
+                while slot:
+                    timer = slot.pop(); timer._slot = None
+                    if timer.expires > self._current: self._file(timer); continue
+                    timer.fired = True; fired += 1
+                    timer.callback(*timer.args)
+                self._current += 1
+        finally: self._processing = False
+        return fired
+
+    def _cascade(self, level: int):
+        if level >= len(self._levels): return
+        slots = self._levels[level]; index = (self._current >> self._shifts[level]) & (len(slots) - 1)
+        if index == 0: self._cascade(level + 1)
+        moving = list(slots[index]); slots[index].clear()
+        for timer in moving: timer._slot = None; self._file(timer)
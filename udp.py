@@ -0,0 +1,119 @@
+# file: udp.py
+# Optional datagram channel for position traffic. A client that asks for it at login is given a session token in the
+# welcome; its PositionService uploads and the world snapshots then travel as datagrams, so one lost packet delays
+# nothing behind it, while the handshake, chat and kicks stay on TCP. A datagram is HEADER (kind, token, sequence
+# number) followed by exactly one frame as it would appear on the TCP stream for the session's protocol. Each side
+# discards anything not newer than the last sequence number it accepted from the other.
+
+import asyncio
+import secrets
+import struct
+from typing import Any, Callable, Dict, Optional, Tuple
+
+HEADER = struct.Struct('<BQI')
+UDP_HELLO = 1  # client -> server with no frame: binds (or rebinds, after a NAT change) the session's address; echoed back
+UDP_FRAME = 2  # one frame, either direction
+MAX_DATAGRAM = 16384  # larger snapshots go over TCP instead; lower it on paths that fragment badly
+HELLO_INTERVAL = 0.25
+SEQ_MASK = 0xFFFFFFFF
+SEQ_HALF = 1 << 31
+
+def newer(seq: int, last: Optional[int]) -> bool:
+    """Serial-number comparison, so the 32-bit sequence can wrap."""
+    return last is None or 0 < (seq - last) & SEQ_MASK < SEQ_HALF
+
+class UdpSession:
+    __slots__ = ("username", "token", "address", "recv_seq", "send_seq", "received", "discarded")
+    def __init__(self, username: str, token: int):
+        self.username = username; self.token = token; self.address: Optional[Tuple[str, int]] = None
+        self.recv_seq: Optional[int] = None; self.send_seq = 0; self.received = 0; self.discarded = 0
+
+class DatagramEndpoint(asyncio.DatagramProtocol):
+    """The server's UDP socket. open() issues a session for a logged-in player; a datagram carrying its token that is
+    newer than the last one accepted binds the session to its source address, and its frame is passed to
+    `on_frame(session, frame)`. Datagrams with an unknown token are counted and ignored."""
+    def __init__(self, on_frame: Callable[[UdpSession, memoryview], Any], max_datagram: int = MAX_DATAGRAM):
+        self.on_frame = on_frame; self.max_datagram = max_datagram
+        self.transport: Optional[asyncio.DatagramTransport] = None; self.sessions: Dict[int, UdpSession] = {}
+        self.received = 0; self.discarded = 0; self.unknown = 0; self.sent = 0; self.oversized = 0
+
+    def connection_made(self, transport: asyncio.DatagramTransport): self.transport = transport
+
+    @property
+    def port(self) -> Optional[int]: return self.transport.get_extra_info('sockname')[1] if self.transport else None
+
+    def open(self, username: str) -> UdpSession:
+        token = 0
+        while not token or token in self.sessions: token = secrets.randbits(64)
+        session = self.sessions[token] = UdpSession(username, token); return session
+
+    def close_session(self, session: UdpSession): self.sessions.pop(session.token, None)
+
+    def datagram_received(self, data: bytes, address: Tuple[str, int]):
+        if len(data) < HEADER.size: self.unknown += 1; return
+        kind, token, seq = HEADER.unpack_from(data); session = self.sessions.get(token)
+        if session is None: self.unknown += 1; return
+        if not newer(seq, session.recv_seq): session.discarded += 1; self.discarded += 1; return
+        session.recv_seq = seq; session.address = address; session.received += 1; self.received += 1
+        if kind == UDP_HELLO: self._send(session, UDP_HELLO, b"")
+        elif kind == UDP_FRAME: self.on_frame(session, memoryview(data)[HEADER.size:])
+
+    # ICMP errors (a client that went away) are left to the TCP session to notice.
+    def error_received(self, exc: Exception): pass
+
+    def send(self, session: UdpSession, frame: bytes) -> bool:
+        """False, with nothing sent, until the client's first datagram arrives or if `frame` does not fit in one
+        datagram; the caller sends it over TCP instead."""
+        if session.address is None or self.transport is None: return False
+        if len(frame) + HEADER.size > self.max_datagram: self.oversized += 1; return False
+        self._send(session, UDP_FRAME, frame); return True
+
+    def _send(self, session: UdpSession, kind: int, frame: bytes):
+        session.send_seq = (session.send_seq + 1) & SEQ_MASK
+        self.transport.sendto(HEADER.pack(kind, session.token, session.send_seq) + frame, session.address); self.sent += 1
+
+    def close(self):
+        if self.transport is not None: self.transport.close()
+
+class ClientChannel(asyncio.DatagramProtocol):
+    """Client side of the channel, for tools and tests: open() it with the Port and Token from the welcome, then
+    send() frames; frames from the server reach `on_frame(frame)` in order, stale ones discarded."""
+    def __init__(self, token: int, on_frame: Callable[[memoryview], Any]):
+        self.token = token; self.on_frame = on_frame; self.transport: Optional[asyncio.DatagramTransport] = None
+        self.send_seq = 0; self.recv_seq: Optional[int] = None; self.discarded = 0; self._bound = asyncio.Event()
+
+    @classmethod
+    async def open(cls, host: str, port: int, token: int, on_frame: Callable[[memoryview], Any], timeout: float = 5.0) -> 'ClientChannel':
+        """Connects and repeats UDP_HELLO until the server echoes it; asyncio.TimeoutError if it never does."""
+        _, channel = await asyncio.get_running_loop().create_datagram_endpoint(lambda: cls(token, on_frame), remote_addr=(host, port))
+        try:
+            deadline = asyncio.get_running_loop().time() + timeout
+            while not channel._bound.is_set():
+                if asyncio.get_running_loop().time() >= deadline: raise asyncio.TimeoutError("no UDP_HELLO reply")
+                channel._send(UDP_HELLO, b"")
+                try: await asyncio.wait_for(channel._bound.wait(), HELLO_INTERVAL)
+                except asyncio.TimeoutError: pass
+        except BaseException: channel.close(); raise
+        return channel
+
+    def connection_made(self, transport: asyncio.DatagramTransport): self.transport = transport
+
+    def datagram_received(self, data: bytes, address: Tuple[str, int]):
+        if len(data) < HEADER.size: return
+        kind, token, seq = HEADER.unpack_from(data)
+        if token != self.token: return
+        if not newer(seq, self.recv_seq): self.discarded += 1; return
+        self.recv_seq = seq
+        if kind == UDP_HELLO: self._bound.set()
+        elif kind == UDP_FRAME: self.on_frame(memoryview(data)[HEADER.size:])
+
+    def error_received(self, exc: Exception): pass
+
+    def send(self, frame: bytes): self._send(UDP_FRAME, frame)
+
+    def _send(self, kind: int, frame: bytes):
+        if self.transport is None or self.transport.is_closing(): return
+        self.send_seq = (self.send_seq + 1) & SEQ_MASK; self.transport.sendto(HEADER.pack(kind, self.token, self.send_seq) + frame)
+
+    def close(self):
+        if self.transport is not None: self.transport.close()
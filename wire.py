@@ -0,0 +1,220 @@
+# file: wire.py
+# Compact binary protocol (version 2). A client asks for it with "Protocol": 2 in its first JSON packet;
+# once the JSON welcome confirms it, both directions switch to length-prefixed frames:
+#   u32 body length | u8 message type | payload
+# Vectors are float32 triples, plane types an index into ServerState.PlaneTypes and the boolean
+# State keys a bitfield. Anything without a fixed layout (popups, kicks) travels as MSG_JSON.
+# Snapshot records are fixed-size: usernames and PV40Colors are u16 indexes into per-frame string tables, so
+# the encoder joins cached record bodies and the decoder walks each record group with one iter_unpack.
+
+import math
+import struct
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import codec
+from spatial import parse_vector3
+
+PROTOCOL_JSON = 1
+PROTOCOL_BINARY = 2
+
+MSG_POSITION = 0x01  # client -> server
+MSG_CHAT = 0x02      # both directions: client chat line / server chat block
+MSG_JSON = 0x03      # both directions: any JSON service block
+MSG_SNAPSHOT = 0x10  # server -> client world state
+
+FRAME_LENGTH = struct.Struct('<I')
+STATE_FLAGS = ("Eng1", "Eng2", "Eng3", "Eng4", "GearDown", "SigL", "MainL")
+KEYFRAME_FLAG = 0x01
+NO_PLANE_TYPE = 0xFF
+
+_POSITION = struct.Struct('<3f3fBBiiI')  # position, rotation, plane type, state flags, VTOLAngle, LiveryId, snapshot ack
+_RECORD_STATE = struct.Struct('<BBii')   # plane type, state flags, VTOLAngle, LiveryId
+_VECTORS = struct.Struct('<3f3f')        # position, rotation
+_VECTORS_HISTORY = struct.Struct('<3f3f3f3fdd')  # then previous position, previous rotation, previous and current receive time
+_RECORD = struct.Struct('<BBii3f3f')     # _RECORD_STATE then _VECTORS, unpacked in one call
+_RECORD_HISTORY = struct.Struct('<BBii3f3f3f3fdd')  # _RECORD_STATE then _VECTORS_HISTORY
+_SNAPSHOT_HEADER = struct.Struct('<IIBdd')  # Seq, Base, flags, CurrentServerTime, TimestampEpoch
+_COUNT = struct.Struct('<H')
+_FLOAT32_MAX = 3.4028234663852886e38
+_INT32_MIN, _INT32_MAX = -2**31, 2**31 - 1
+
+class ProtocolError(ValueError): pass
+
+def encode_frame(msg_type: int, payload: bytes) -> bytes: return FRAME_LENGTH.pack(len(payload) + 1) + bytes((msg_type,)) + payload
+
+def encode_json(data_dict: dict) -> bytes: return encode_frame(MSG_JSON, codec.dumps(data_dict))
+def encode_chat(text: str) -> bytes: return encode_frame(MSG_CHAT, text.encode('utf-8'))
+
+def _clamp_f32(value: float) -> float: return min(max(value, -_FLOAT32_MAX), _FLOAT32_MAX)
+def _int32(value: Any) -> int: return min(max(int(value), _INT32_MIN), _INT32_MAX)
+
+def _pack(layout: struct.Struct, *values) -> bytes:
+    # The JSON side only regex-checks vectors, so clamp anything float32/int32 cannot hold instead of failing the tick.
+    try: return layout.pack(*values)
+    except (struct.error, OverflowError):
+        return layout.pack(*(_clamp_f32(v) if isinstance(v, float) else _int32(v) for v in values))
+
+def format_vector3(x: float, y: float, z: float) -> Optional[str]:
+    """Back to the "x,y,z" form the JSON protocol and plugins use; None for NaN/inf."""
+    # v - v is 0.0 only for finite v (NaN otherwise), one chained comparison instead of three isfinite() calls.
+    if not (x - x == y - y == z - z == 0.0): return None
+    return "%.3f,%.3f,%.3f" % (x, y, z)
+
+def _pack_str(text: str) -> bytes:
+    raw = text.encode('utf-8')
+    if len(raw) > 255: raw = raw[:255].decode('utf-8', errors='ignore').encode('utf-8')
+    return bytes((len(raw),)) + raw
+
+def _unpack_str(buf: memoryview, offset: int) -> Tuple[str, int]:
+    length = buf[offset]; end = offset + 1 + length
+    if end > len(buf): raise ProtocolError("Truncated string.")
+    return bytes(buf[offset + 1:end]).decode('utf-8'), end
+
+# Both unrolled over STATE_FLAGS (bit i is STATE_FLAGS[i]): they run once per record on every snapshot.
+def state_flags(state: Dict[str, Any]) -> int:
+    get = state.get
+    return ((1 if get("Eng1") else 0) | (2 if get("Eng2") else 0) | (4 if get("Eng3") else 0) | (8 if get("Eng4") else 0)
+            | (16 if get("GearDown") else 0) | (32 if get("SigL") else 0) | (64 if get("MainL") else 0))
+
+def state_from_flags(flags: int, vtol_angle: int, livery_id: int, pv40_color: str) -> Dict[str, Any]:
+    return {"Eng1": bool(flags & 1), "Eng2": bool(flags & 2), "Eng3": bool(flags & 4), "Eng4": bool(flags & 8), "GearDown": bool(flags & 16),
+            "SigL": bool(flags & 32), "MainL": bool(flags & 64), "VTOLAngle": vtol_angle, "PV40Color": pv40_color, "LiveryId": livery_id}
+
+def _plane_index(plane_types: Sequence[str], plane_type: str) -> int:
+    try: return plane_types.index(plane_type)
+    except ValueError: return NO_PLANE_TYPE
+
+def _plane_name(plane_types: Sequence[str], index: int) -> Optional[str]: return plane_types[index] if index < len(plane_types) else None
+
+def encode_position(position_block: Dict[str, Any], plane_types: Sequence[str]) -> bytes:
+    """Client side: a PositionService block as a MSG_POSITION frame."""
+    state = position_block.get("State", {})
+    payload = _pack(_POSITION, *parse_vector3(position_block["Position"]), *parse_vector3(position_block.get("Rotation", "0,0,0")),
+                    _plane_index(plane_types, position_block["PlaneType"]), state_flags(state),
+                    int(state.get("VTOLAngle", 0)), int(state.get("LiveryId", -1)), int(position_block.get("Ack", 0)))
+    return encode_frame(MSG_POSITION, payload + _pack_str(str(state.get("PV40Color", "0,0,0"))))
+
+def decode_position(payload: memoryview, plane_types: Sequence[str]) -> Dict[str, Any]:
+    """Server side: a MSG_POSITION payload as the same dict a JSON client would have sent."""
+    if len(payload) < _POSITION.size + 1: raise ProtocolError("Truncated position packet.")
+    px, py, pz, rx, ry, rz, plane, flags, vtol_angle, livery_id, ack = _POSITION.unpack_from(payload)
+    pv40_color, _ = _unpack_str(payload, _POSITION.size)
+    position_block: Dict[str, Any] = {"Position": format_vector3(px, py, pz), "PlaneType": _plane_name(plane_types, plane),
+                                      "State": state_from_flags(flags, vtol_angle, livery_id, pv40_color)}
+    rotation = format_vector3(rx, ry, rz)
+    if rotation is not None: position_block["Rotation"] = rotation
+    if ack: position_block["Ack"] = ack
+    return {"PositionService": position_block}
+
+def decode_client_message(body: memoryview, plane_types: Sequence[str]) -> Dict[str, Any]:
+    """Server side: one frame body (type byte + payload) as a JSON-shaped dict."""
+    if not body: raise ProtocolError("Empty frame.")
+    msg_type, payload = body[0], body[1:]
+    if msg_type == MSG_POSITION: return decode_position(payload, plane_types)
+    if msg_type == MSG_CHAT: return {"ChatService": {"Pending": bytes(payload).decode('utf-8')}}
+    if msg_type == MSG_JSON:
+        data = codec.loads(payload)
+        if not isinstance(data, dict): raise ProtocolError("JSON frame is not an object.")
+        return data
+    raise ProtocolError(f"Unknown message type {msg_type}.")
+
+class SnapshotEncoder:
+    """Builds MSG_SNAPSHOT frames, reusing each player's packed record until their entry is updated.
+
+    Payload: header | Players | extra names | colors | plain records | history records | Removed. Names and
+    colors are u16-counted string lists; each record group is a u16 count, that many u16 name indexes (into
+    Players then extra names), as many u16 color indexes, then the fixed-size records back to back. With a
+    PlayerTable the vectors come from its float columns instead of re-parsing the entry strings."""
+    def __init__(self, plane_types: Sequence[str], player_table: Any = None):
+        self.plane_types = plane_types; self.player_table = player_table
+        self._plane_indexes = {plane_type: i for i, plane_type in enumerate(plane_types)}
+        self._records: Dict[str, Tuple[Any, ...]] = {}  # entry, receive time, body, color, has history, state key, packed state
+        self._strings: Dict[str, bytes] = {}
+        # Every frame of a tick carries the same Players list, so its packed form and index are kept until it changes.
+        self._players: List[str] = []; self._players_packed = self._names(()); self._slots: Dict[str, int] = {}
+
+    def _str(self, text: str) -> bytes:
+        packed = self._strings.get(text)
+        if packed is None:
+            if len(self._strings) >= 4096: self._strings.clear()
+            packed = self._strings[text] = _pack_str(text)
+        return packed
+
+    def _names(self, names: Sequence[str]) -> bytes:
+        packed = self._str; return _COUNT.pack(len(names)) + b"".join([packed(name) for name in names])
+
+    def _record(self, username: str, entry: List[Any]) -> Tuple[Any, ...]:
+        # Entries are updated in place; the receive time (last element) changes with every update.
+        state = entry[3]; has_history = len(entry) >= 8
+        vectors = self.player_table.get_vectors(username) if self.player_table is not None else None
+        if vectors is None:
+            vectors = parse_vector3(entry[0]) + parse_vector3(entry[2])
+            if has_history: vectors += parse_vector3(entry[4]) + parse_vector3(entry[5]) + (float(entry[6]), float(entry[7]))
+        # Most updates only move the aircraft, so the packed state part is reused while plane type and State are unchanged.
+        key = (entry[1], *state.values()); previous = self._records.get(username)
+        if previous is not None and previous[5] == key: head, color = previous[6], previous[3]
+        else:
+            get = state.get; color = get("PV40Color", "0,0,0"); color = color if type(color) is str else str(color)
+            head = _pack(_RECORD_STATE, self._plane_indexes.get(entry[1], NO_PLANE_TYPE), state_flags(state), get("VTOLAngle", 0), get("LiveryId", -1))
+        body = head + (_pack(_VECTORS_HISTORY, *vectors) if has_history else _pack(_VECTORS, *vectors[0:6]))
+        record = self._records[username] = (entry, entry[-1], body, color, has_history, key, head)
+        return record
+
+    def encode(self, players: Sequence[str], positions: Dict[str, List[Any]], removed: Sequence[str] = (), seq: int = 0, base: int = 0,
+               keyframe: bool = False, server_time: float = 0.0, epoch: float = 0.0) -> bytes:
+        records, build = self._records, self._record
+        if players != self._players:
+            self._players = list(players); self._players_packed = self._names(players); self._slots = {name: i for i, name in enumerate(players)}
+        slots = self._slots; extra: List[str] = []; colors: Dict[str, int] = {}; color_index = colors.setdefault
+        groups: Tuple[List[Tuple[int, int, bytes]], List[Tuple[int, int, bytes]]] = ([], [])  # plain records, records with history
+        for username, entry in positions.items():
+            record = records.get(username)
+            if record is None or record[0] is not entry or record[1] != entry[-1]: record = build(username, entry)
+            slot = slots.get(username)
+            if slot is None:
+                if not extra: slots = dict(slots)
+                slot = slots[username] = len(slots); extra.append(username)
+            groups[record[4]].append((slot, color_index(record[3], len(colors)), record[2]))
+        parts = [_SNAPSHOT_HEADER.pack(seq, base, KEYFRAME_FLAG if keyframe else 0, server_time, epoch), self._players_packed, self._names(extra), self._names(list(colors))]
+        for group in groups:
+            parts.append(_COUNT.pack(len(group)))
+            if group:
+                names, color_indexes, bodies = zip(*group)
+                parts.append(struct.pack('<%dH' % (2 * len(group)), *names, *color_indexes)); parts.extend(bodies)
+        parts.append(self._names(removed))
+        if len(records) > 2 * len(positions) + 64: self._records = {u: r for u, r in records.items() if u in positions}
+        return encode_frame(MSG_SNAPSHOT, b"".join(parts))
+
+def decode_snapshot(payload: memoryview, plane_types: Sequence[str]) -> Dict[str, Any]:
+    """Client side: a MSG_SNAPSHOT payload as the JSON protocol's PlayerService/PositionService blocks."""
+    buf = bytes(payload)  # slicing bytes is cheaper than memoryview slices that then need copying anyway
+    def names(offset: int) -> Tuple[List[str], int]:
+        (count,) = _COUNT.unpack_from(buf, offset); offset += _COUNT.size; found = []
+        for _ in range(count):
+            end = offset + 1 + buf[offset]
+            if end > len(buf): raise ProtocolError("Truncated string.")
+            found.append(buf[offset + 1:end].decode('utf-8')); offset = end
+        return found, offset
+    seq, base, flags, server_time, epoch = _SNAPSHOT_HEADER.unpack_from(buf); players, offset = names(_SNAPSHOT_HEADER.size)
+    extra, offset = names(offset); colors, offset = names(offset); table = players + extra
+    positions: Dict[str, List[Any]] = {}; plane_count = len(plane_types)
+    for layout in (_RECORD, _RECORD_HISTORY):
+        (count,) = _COUNT.unpack_from(buf, offset); offset += _COUNT.size
+        indexes = struct.unpack_from('<%dH' % (2 * count), buf, offset); offset += 4 * count
+        end = offset + count * layout.size
+        if end > len(buf): raise ProtocolError("Truncated record block.")
+        if count and (max(indexes[:count]) >= len(table) or max(indexes[count:]) >= len(colors)): raise ProtocolError("Record index out of range.")
+        if layout is _RECORD:
+            for slot, color, (plane, flags_byte, vtol_angle, livery_id, px, py, pz, rx, ry, rz) in zip(indexes, indexes[count:], layout.iter_unpack(buf[offset:end])):
+                positions[table[slot]] = [format_vector3(px, py, pz), plane_types[plane] if plane < plane_count else None, format_vector3(rx, ry, rz),
+                                          state_from_flags(flags_byte, vtol_angle, livery_id, colors[color])]
+        else:
+            for slot, color, (plane, flags_byte, vtol_angle, livery_id, px, py, pz, rx, ry, rz, hx, hy, hz, hrx, hry, hrz, previous_time, recv_time) in zip(indexes, indexes[count:], layout.iter_unpack(buf[offset:end])):
+                positions[table[slot]] = [format_vector3(px, py, pz), plane_types[plane] if plane < plane_count else None, format_vector3(rx, ry, rz),
+                                          state_from_flags(flags_byte, vtol_angle, livery_id, colors[color]),
+                                          format_vector3(hx, hy, hz), format_vector3(hrx, hry, hrz), previous_time, recv_time]
+        offset = end
+    removed, offset = names(offset)
+    position_block = {"Positions": positions, "Seq": seq, "Base": base, "Keyframe": bool(flags & KEYFRAME_FLAG), "Removed": removed,
+                      "CurrentServerTime": server_time, "TimestampEpoch": epoch}
+    return {"PlayerService": {"Players": players}, "PositionService": position_block}